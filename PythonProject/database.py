@@ -1,10 +1,31 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from metrics import instrument_engine, pool_class_for
 
-SQ_DB_URL = 'sqlite:///database.db'
-engine = create_engine(SQ_DB_URL, connect_args={"check_same_thread": False})
+# DATABASE_URL lets benchmarks and tests point the app at another database
+SQ_DB_URL = os.getenv("DATABASE_URL", 'sqlite:///database.db')
+engine = create_engine(
+    SQ_DB_URL,
+    connect_args={"check_same_thread": False} if SQ_DB_URL.startswith("sqlite") else {},
+    poolclass=pool_class_for(SQ_DB_URL)  # times pool checkouts for /metrics
+)
+instrument_engine(engine)
 
 session_local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# Connections opened when a worker starts so the first requests don't wait for them
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "2"))
+
+
+def warm_up_pool(connections: int = DB_POOL_WARMUP):
+    """Open pool connections ahead of time (blocking, run it in a thread)."""
+    if SQ_DB_URL.startswith("sqlite"):
+        connections = 1
+    opened = [engine.connect() for _ in range(connections)]
+    for conn in opened:
+        conn.execute(text("SELECT 1"))
+        conn.close()
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""Production server: several uvicorn workers managed by gunicorn.
+
+    python init_db.py               # schema first, as a separate step
+    gunicorn -c gunicorn.conf.py
+
+Importing main.py opens no connections and starts no processes, so the master
+imports the app once (preload_app) and the forked workers only warm up the
+connection pool and the hashing processes (the lifespan in main.py). Startup
+time then barely depends on the number of workers.
+
+Restarts keep every connection: the master owns the listening socket and old
+workers finish in-flight requests (up to GRACEFUL_TIMEOUT seconds).
+- ``kill -HUP <master pid>``: fresh workers running the same code
+- new code: ``kill -USR2 <master pid>`` starts a second master with the new
+  code; once it is up, ``kill -QUIT <old master pid>``. With PRELOAD_APP=false
+  HUP picks up new code too, at the cost of every worker importing the app
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = "main:app"
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Recycle a worker after N requests (0 disables it); jitter spreads the restarts
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "0"))
+
+accesslog = os.getenv("ACCESS_LOG")  # "-" for stdout
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+# The Argon2 pool defaults to half the cores per worker; split the cores
+# between workers instead of starting workers * cpu / 2 hashing processes
+os.environ.setdefault("HASH_WORKERS", str(max(1, multiprocessing.cpu_count() // 2 // workers)))
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""Create the database tables.
+
+Run once before starting the server (and after model changes); the app
+itself no longer touches the schema on import or startup.
+"""
+
+from database import Base, engine
+import models  # noqa: F401  registers the tables on Base.metadata
+
+
+def init_db():
+    Base.metadata.create_all(bind=engine)
+
+
+if __name__ == "__main__":
+    init_db()
+    print("Tables created")
@@ -1,18 +1,53 @@
+import time
+IMPORT_STARTED = time.perf_counter()  # before the other imports: import-to-ready time of the worker
+
 from fastapi import FastAPI, HTTPException, Path, Query, Body, Depends, Response, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
 from typing import Optional, List, Dict, Annotated
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
 from datetime import timedelta, datetime, timezone
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
 
 from fastapi.middleware.cors import CORSMiddleware
-from models import Base, User, Post
-from database import engine, session_local
+from models import User, Post
+from database import session_local, warm_up_pool
 from schemas import UserCreate, User as DbUser, PostCreate, PostResponse, UserAuth, Token, TokenData
-from security import hash_password, verify_password, create_access_token, verify_token, encrypt_cookie, decrypt_cookie
+from security import hashing_service, create_access_token, verify_token, encrypt_cookie, decrypt_cookie
+from metrics import MetricsMiddleware, TimedRoute, registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from responses import ModelResponse
+
+
+logger = logging.getLogger("uvicorn.error")
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up the connection pool and the hashing processes.
+
+    Tables are created by init_db.py as a separate step, not by every worker.
+    """
+    warm_up_started = time.perf_counter()
+    await asyncio.gather(asyncio.to_thread(warm_up_pool), hashing_service.warm_up())
+    ready = time.perf_counter()
+    logger.info(
+        "Worker %s ready: %.0f ms since import, warm-up %.0f ms",
+        os.getpid(), (ready - IMPORT_STARTED) * 1000, (ready - warm_up_started) * 1000
+    )
+    yield
+    hashing_service.shutdown()
+
+
+# Schema responses go through ModelResponse (responses.py), everything else is encoded by orjson
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+# Routes time their phases (dependencies, endpoint, serialization); set before declaring routes
+app.router.route_class = TimedRoute
 
 origins = [
     "http://localhost:8080",
@@ -32,7 +67,15 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
-Base.metadata.create_all(bind=engine)
+# Request metrics, added last so the timing includes CORS handling
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics for requests and database access."""
+    return Response(content=registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 
 def get_db():
     db = session_local()
@@ -91,50 +134,37 @@ def get_current_user_optional(credentials: Optional[HTTPAuthorizationCredentials
         return None
 
 
-@app.post("/users", response_model=DbUser)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)) -> DbUser:
-    # Check uniqueness by email/login
-    existing = db.query(User).filter(User.email == user.email).first()
-    if existing is not None:
-        raise HTTPException(status_code=400, detail="Email is already registered")
-
-    hashed = hash_password(user.password)
+def insert_user(db: Session, user: UserCreate, password_hash: str):
+    """Create the user with a single INSERT ... RETURNING.
 
-    db_user = User(name=user.name, age=user.age, email=user.email)
+    The unique index on email rejects duplicates, so there is no SELECT before
+    the insert and no race between two registrations with the same email.
+    """
+    try:
+        row = db.execute(
+            insert(User)
+            .values(name=user.name, age=user.age, email=user.email, password_hash=password_hash)
+            .returning(User.id, User.name, User.age, User.email)
+        ).one()
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        if "email" not in str(e.orig):
+            raise
+        raise HTTPException(status_code=400, detail="Email is already registered")
+    return row
 
-    if hasattr(User, 'password_hash'):
-        setattr(db_user, 'password_hash', hashed)
-    elif hasattr(User, 'password'):
-        setattr(db_user, 'password', hashed)
-    else:
-        raise HTTPException(status_code=500, detail="User model has no password field")
 
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+@app.post("/users", response_model=DbUser)
+async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+    hashed = await hashing_service.hash(user.password)
+    return ModelResponse(DbUser, insert_user(db, user, hashed))
 
 
 @app.post("/register", response_model=DbUser)
-async def register(user: UserCreate, db: Session = Depends(get_db)) -> DbUser:
-    existing = db.query(User).filter(User.email == user.email).first()
-    if existing is not None:
-        raise HTTPException(status_code=400, detail="Email is already registered")
-
-    hashed = hash_password(user.password)
-
-    db_user = User(name=user.name, age=user.age, email=user.email)
-    if hasattr(User, 'password_hash'):
-        setattr(db_user, 'password_hash', hashed)
-    elif hasattr(User, 'password'):
-        setattr(db_user, 'password', hashed)
-    else:
-        raise HTTPException(status_code=500, detail="User model has no password field")
-
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    hashed = await hashing_service.hash(user.password)
+    return ModelResponse(DbUser, insert_user(db, user, hashed))
 
 @app.post("/login", response_model=Token)
 async def login(auth: UserAuth, response: Response, db: Session = Depends(get_db)) -> Token:
@@ -149,9 +179,18 @@ async def login(auth: UserAuth, response: Response, db: Session = Depends(get_db
     elif hasattr(User, 'password'):
         stored_hash = getattr(db_user, 'password', None)
 
-    if not stored_hash or not verify_password(auth.password, stored_hash):
+    if not stored_hash:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    password_ok, new_hash = await hashing_service.verify(auth.password, stored_hash)
+    if not password_ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    # Upgrade hashes created with outdated Argon2 parameters
+    if new_hash and hasattr(User, 'password_hash'):
+        db_user.password_hash = new_hash
+        db.commit()
+
     # Create JWT token
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
@@ -184,7 +223,7 @@ async def login(auth: UserAuth, response: Response, db: Session = Depends(get_db
 @app.get("/me", response_model=DbUser)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Get current user information."""
-    return current_user
+    return ModelResponse(DbUser, current_user)
 
 
 @app.post("/logout")
@@ -212,13 +251,13 @@ async def check_auth(request: Request, db: Session = Depends(get_db)):
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         
-        return user
+        return ModelResponse(DbUser, user)
     except Exception as e:
         raise HTTPException(status_code=401, detail="Invalid authentication data")
 
 
 @app.post("/posts/", response_model=PostResponse)
-async def create_post(post: PostCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)) -> PostResponse:
+async def create_post(post: PostCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     from datetime import datetime, timezone
     
     # Создаем пост с явным указанием времени в UTC
@@ -230,30 +269,34 @@ async def create_post(post: PostCreate, current_user: User = Depends(get_current
     db.add(db_post)
     db.commit()
     db.refresh(db_post)
-    return db_post
+    return ModelResponse(PostResponse, db_post)
 
 
 @app.get("/posts/", response_model=List[PostResponse])
 async def get_posts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Post).all()
+    # Authors in one extra SELECT ... IN instead of one lazy load per author
+    return ModelResponse(List[PostResponse], db.query(Post).options(selectinload(Post.author)).all())
 
 
 @app.get("/posts/my", response_model=List[PostResponse])
 async def get_my_posts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return db.query(Post).filter(Post.author_id == current_user.id).order_by(Post.created_at.desc()).all()
+    posts = db.query(Post).filter(Post.author_id == current_user.id).order_by(Post.created_at.desc()).all()
+    return ModelResponse(List[PostResponse], posts)
 
 
 @app.delete("/posts/{post_id}")
 async def delete_post(post_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
-    
-    # Проверяем, что пользователь может удалить только свои посты
-    if post.author_id != current_user.id:
+    # One DELETE with the ownership check in WHERE; the extra SELECT only runs
+    # when nothing was deleted, to tell a missing post from someone else's
+    deleted = db.execute(
+        delete(Post).where(Post.id == post_id, Post.author_id == current_user.id).returning(Post.id)
+    ).first()
+    if deleted is None:
+        db.rollback()
+        if db.query(Post.id).filter(Post.id == post_id).first() is None:
+            raise HTTPException(status_code=404, detail="Post not found")
         raise HTTPException(status_code=403, detail="You can only delete your own posts")
-    
-    db.delete(post)
+
     db.commit()
     return {"message": "Post deleted successfully"}
 
@@ -263,7 +306,7 @@ async def post(name: str, db: Session = Depends(get_db)):
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return db_user
+    return ModelResponse(DbUser, db_user)
 
 
 # @app.get("/items/")
@@ -0,0 +1,369 @@
+"""
+Request and database metrics in Prometheus text format.
+
+MetricsMiddleware attaches a RequestStats object to every HTTP request and
+SQLAlchemy engine events add the statement count, statement time and pool
+checkout wait to it. When the response is done the numbers are recorded in
+per-route histograms that are served on /metrics.
+
+Application routes are built by TimedRoute, which splits the route time into
+phases (http_request_phase_seconds):
+
+* dependencies - body parsing and dependencies (get_db, get_current_user)
+* handler - the endpoint itself, minus serialization
+* serialization - ModelResponse or response_model and response encoding
+
+Metrics live in process memory, so every worker reports its own.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from starlette.routing import request_response
+
+from profiler import profiler as default_profiler
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # slower statements are logged
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"  # add Server-Timing headers
+
+logger = logging.getLogger("sql.slow")
+
+UNMATCHED_ROUTE = "<unmatched>"
+PHASES = ("dependencies", "handler", "serialization")
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_time: float = 0.0
+    pool_wait: float = 0.0
+    # Route phases (TimedRoute), perf_counter seconds
+    route_started: float = 0.0
+    route_time: float = 0.0
+    handler_started: float = 0.0
+    handler_time: float = 0.0
+    serialization_time: float = 0.0  # serialization inside the endpoint (ModelResponse)
+
+    def phases(self) -> Optional[Tuple[float, float, float]]:
+        """(dependencies, handler, serialization), or None if the route did not return a response"""
+        if not self.route_time or not self.handler_started:
+            return None
+        dependencies = self.handler_started - self.route_started
+        after_handler = self.route_time - dependencies - self.handler_time
+        return (
+            dependencies,
+            max(self.handler_time - self.serialization_time, 0.0),
+            after_handler + self.serialization_time,
+        )
+
+
+current_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_stats", default=None)
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # per-bucket counts (not cumulative, the last one is above every bound), sum, count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            # bump a single bucket; render() turns the counts into cumulative ones
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, accumulate(counts)):
+                    bucket_labels = _format_labels(self.labelnames + ("le",), labels + (_format_value(bound),))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+                inf_labels = _format_labels(self.labelnames + ("le",), labels + ("+Inf",))
+                lines.append(f"{self.name}_bucket{inf_labels} {count}")
+                series_labels = _format_labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{series_labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{series_labels} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {_format_value(self.value)}",
+        ]
+
+
+class Gauge:
+    """A value read from a callback when /metrics is scraped"""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float], kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {_format_value(self.read())}",
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request duration", TIME_BUCKETS, ("method", "route")
+))
+request_statements = registry.register(Histogram(
+    "db_statements_per_request", "SQL statements issued per HTTP request", COUNT_BUCKETS, ("method", "route")
+))
+request_db_time = registry.register(Histogram(
+    "db_time_per_request_seconds", "Total SQL statement time per HTTP request", TIME_BUCKETS, ("method", "route")
+))
+request_pool_wait = registry.register(Histogram(
+    "db_pool_wait_per_request_seconds", "Connection pool checkout wait per HTTP request", TIME_BUCKETS, ("method", "route")
+))
+request_phase = registry.register(Histogram(
+    "http_request_phase_seconds", "Route phase duration: dependencies, handler, serialization",
+    TIME_BUCKETS, ("method", "route", "phase")
+))
+slow_queries = registry.register(Counter(
+    "db_slow_queries_total", f"SQL statements slower than {SLOW_QUERY_MS} ms"
+))
+
+
+def timed_pool_class(base):
+    """Pool subclass that measures how long a checkout waits for a connection"""
+
+    class TimedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                stats = current_stats.get()
+                if stats is not None:
+                    stats.pool_wait += time.perf_counter() - started
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def pool_class_for(url: str):
+    """The pool class SQLAlchemy would pick for url, with checkout timing"""
+    url = make_url(url)
+    return timed_pool_class(url.get_dialect().get_pool_class(url))
+
+
+def instrument_engine(engine: Engine):
+    """Attach the statement timing hooks to an engine"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = current_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_time += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_queries.inc()
+            logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:1000])
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # after_cursor_execute is not called on errors, drop the start time
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+
+def timed_endpoint(call: Callable) -> Callable:
+    """Wrap an endpoint so that its run time is recorded in RequestStats"""
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(**values):
+            stats = current_stats.get()
+            if stats is None:
+                return await call(**values)
+            stats.handler_started = time.perf_counter()
+            try:
+                return await call(**values)
+            finally:
+                stats.handler_time = time.perf_counter() - stats.handler_started
+    else:
+        # FastAPI runs sync endpoints in the thread pool, the ContextVar is copied there
+        @functools.wraps(call)
+        def endpoint(**values):
+            stats = current_stats.get()
+            if stats is None:
+                return call(**values)
+            stats.handler_started = time.perf_counter()
+            try:
+                return call(**values)
+            finally:
+                stats.handler_time = time.perf_counter() - stats.handler_started
+    return endpoint
+
+
+class TimedRoute(APIRoute):
+    """Route that records phase timings; set ``app.router.route_class = TimedRoute``
+    before declaring routes. FastAPI inspects the original endpoint for its
+    signature and dependencies but calls the timing wrapper.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        self.dependant.call = timed_endpoint(self.dependant.call)
+        self.app = request_response(self.get_route_handler())
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            stats = current_stats.get()
+            if stats is None:
+                return await handler(request)
+            stats.route_started = time.perf_counter()
+            response = await handler(request)
+            stats.route_time = time.perf_counter() - stats.route_started
+            return response
+
+        return timed_handler
+
+
+def record_serialization(started: float):
+    """Add the serialization that began at ``started`` to the current request"""
+    stats = current_stats.get()
+    if stats is not None:
+        stats.serialization_time += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records request metrics, optionally adds Server-Timing
+    and profiles selected requests (profiler.py)
+    """
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING, profiler=default_profiler):
+        self.app = app
+        self.server_timing = server_timing
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        profiling = self.profiler.start(scope) if self.profiler.enabled else None
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and (self.server_timing or profiling):
+                headers = list(message.get("headers", []))
+                if self.server_timing:
+                    headers.append((b"server-timing", self._server_timing(stats, started).encode()))
+                if profiling:
+                    headers.append((b"x-profile-file", profiling[1].encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_stats.reset(token)
+            elapsed = time.perf_counter() - started
+            if profiling:
+                await self.profiler.finish(*profiling)
+            labels = (scope["method"], getattr(scope.get("route"), "path", UNMATCHED_ROUTE))
+            request_duration.observe(elapsed, *labels)
+            request_statements.observe(stats.statements, *labels)
+            request_db_time.observe(stats.db_time, *labels)
+            request_pool_wait.observe(stats.pool_wait, *labels)
+            phases = stats.phases()
+            if phases is not None:
+                for phase, seconds in zip(PHASES, phases):
+                    request_phase.observe(seconds, *labels, phase)
+
+    @staticmethod
+    def _server_timing(stats: RequestStats, started: float) -> str:
+        value = (
+            f"db;dur={stats.db_time * 1000:.2f};desc=\"{stats.statements} queries\", "
+            f"pool;dur={stats.pool_wait * 1000:.2f}, "
+            f"app;dur={(time.perf_counter() - started) * 1000:.2f}"
+        )
+        phases = stats.phases()
+        if phases is not None:
+            value += "".join(f", {phase};dur={seconds * 1000:.2f}" for phase, seconds in zip(PHASES, phases))
+        return value
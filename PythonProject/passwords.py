@@ -0,0 +1,53 @@
+"""Argon2 password hashing.
+
+These functions run inside the PasswordHashingService pool (security.py), and
+every pool process imports this module from scratch. It therefore depends on
+argon2 only, not on FastAPI, so a pool process starts in tens of
+milliseconds instead of a second.
+"""
+
+import os
+from typing import Optional, Tuple
+
+from argon2 import PasswordHasher, exceptions
+
+# Argon2 cost parameters (outdated hashes are upgraded on the next successful login)
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+ph = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM
+)
+
+
+def hash_password(plain_password: str) -> str:
+    """Return a secure Argon2 hash for the given plain text password."""
+    return ph.hash(plain_password)
+
+
+def verify_password(plain_password: str, password_hash: str) -> bool:
+    """Verify plain password against stored Argon2 hash."""
+    try:
+        return ph.verify(password_hash, plain_password)
+    except exceptions.VerifyMismatchError:
+        return False
+    except Exception:
+        # Any unexpected verification error should be treated as a failure
+        return False
+
+
+def worker_ready() -> int:
+    """No-op task used to start the pool processes ahead of time."""
+    return os.getpid()
+
+
+def verify_and_rehash(plain_password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a fresh hash if the stored one uses outdated parameters."""
+    if not verify_password(plain_password, password_hash):
+        return False, None
+    if ph.check_needs_rehash(password_hash):
+        return True, ph.hash(plain_password)
+    return True, None
@@ -0,0 +1,73 @@
+"""On-demand cProfile profiling of individual requests.
+
+A request is profiled when:
+
+* it carries an ``X-Profile`` header equal to ``PROFILER_TOKEN`` (an empty token
+  disables the header), or
+* it falls into the ``PROFILER_SAMPLE_RATE`` sample (fraction of requests, 0 by default).
+
+The profile is written to ``PROFILER_DIR`` as a ``.prof`` file and its name is
+returned in the ``X-Profile-File`` response header. Inspect it with
+``python -m pstats profiles/<file>`` or snakeviz.
+
+cProfile sees everything that runs on the event loop thread while it is
+enabled, including other requests handled at the same time, but not code in
+the thread pool (sync dependencies such as ``get_db``). So at most one request
+per process is profiled at a time; prefer a lightly loaded worker.
+
+With profiling off, MetricsMiddleware only checks ``profiler.enabled``.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import os
+import random
+import re
+import time
+from typing import Optional, Tuple
+
+PROFILER_DIR = os.getenv("PROFILER_DIR", "profiles")
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+
+PROFILE_HEADER = b"x-profile"
+UNSAFE_CHARS_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class RequestProfiler:
+    def __init__(self, directory: str, sample_rate: float, token: str):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token.encode()
+        self.enabled = bool(token) or sample_rate > 0
+        self.active = False
+        self.count = 0  # keeps file names unique within a second
+
+    def _requested(self, scope) -> bool:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, scope) -> Optional[Tuple[cProfile.Profile, str]]:
+        """Start profiling if the request asks for it; returns (profile, file name)."""
+        if self.active or not self._requested(scope):
+            return None
+        self.active = True
+        self.count += 1
+        path = UNSAFE_CHARS_RE.sub("_", scope["path"]).strip("_")[:80] or "root"
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{path}-{os.getpid()}-{self.count}.prof"
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile, filename
+
+    async def finish(self, profile: cProfile.Profile, filename: str):
+        profile.disable()
+        self.active = False
+        os.makedirs(self.directory, exist_ok=True)
+        await asyncio.to_thread(profile.dump_stats, os.path.join(self.directory, filename))
+
+
+profiler = RequestProfiler(PROFILER_DIR, PROFILER_SAMPLE_RATE, PROFILER_TOKEN)
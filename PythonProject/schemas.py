@@ -1,7 +1,6 @@
 from pydantic import BaseModel, EmailStr, conint, constr, Field
 from typing import Optional
 from datetime import datetime
-import json
 
 
 class UserBase(BaseModel):
@@ -19,11 +18,16 @@ class UserAuth(BaseModel):
     password: constr(min_length=6)
 
 
-class User(UserBase):
+class User(BaseModel):
+    # Response schema: the email was validated on registration, and EmailStr
+    # here would run email_validator again for every author of every post
     id: int
+    name: str
+    age: int
+    email: str
 
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 
 class Token(BaseModel):
@@ -47,7 +51,4 @@ class PostResponse(BaseModel):
     author: User
 
     class Config:
-        orm_mode = True
-        json_encoders = {
-            datetime: lambda v: v.isoformat() if v else None
-        }
\ No newline at end of file
+        from_attributes = True
\ No newline at end of file
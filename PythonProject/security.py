@@ -1,12 +1,22 @@
-from argon2 import PasswordHasher, exceptions
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+import asyncio
+import multiprocessing
 import os
 from cryptography.fernet import Fernet
 import base64
 
-ph = PasswordHasher()
+# The hashing functions run inside the pool processes, which import them by
+# module; they live in the lightweight passwords module so a pool process
+# does not have to import FastAPI
+from passwords import hash_password, verify_and_rehash, worker_ready
+
+# Process pool used for hashing
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "64"))
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
@@ -20,20 +30,65 @@ key = base64.urlsafe_b64encode(COOKIE_SECRET_KEY.encode()[:32].ljust(32, b'0'))
 fernet = Fernet(key)
 
 
-def hash_password(plain_password: str) -> str:
-    """Return a secure Argon2 hash for the given plain text password."""
-    return ph.hash(plain_password)
+class PasswordHashingService:
+    """Run Argon2 in a process pool so hashing never blocks the event loop.
 
+    Requests beyond the pool size plus the queue size are rejected with 503
+    instead of piling up.
+    """
 
-def verify_password(plain_password: str, password_hash: str) -> bool:
-    """Verify plain password against stored Argon2 hash."""
-    try:
-        return ph.verify(password_hash, plain_password)
-    except exceptions.VerifyMismatchError:
-        return False
-    except Exception:
-        # Any unexpected verification error should be treated as a failure
-        return False
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.pending >= self.workers + self.queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+
+    async def warm_up(self):
+        """Start every pool process when the worker boots instead of on the first logins.
+
+        Each spawned process imports Python and argon2 from scratch. The pool
+        starts a new process per submitted task while none is idle, so one
+        task per process is enough.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, worker_ready) for _ in range(self.workers)))
+
+    async def hash(self, plain_password: str) -> str:
+        return await self._run(hash_password, plain_password)
+
+    async def verify(self, plain_password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(verify_and_rehash, plain_password, password_hash)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_service = PasswordHashingService(HASH_WORKERS, HASH_QUEUE_SIZE)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
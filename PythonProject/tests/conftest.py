@@ -0,0 +1,90 @@
+"""Shared fixtures: the app on a temporary SQLite database and a statement counter.
+
+Run from PythonProject:
+    python -m pytest tests
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="pythonproject-tests-"), "test.db")
+
+# Before importing the app: its modules read the settings on import
+os.environ["DATABASE_URL"] = "sqlite:///" + DATABASE_PATH
+os.environ.setdefault("HASH_WORKERS", "1")
+sys.path.insert(0, PROJECT_DIR)
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from database import engine  # noqa: E402
+
+PASSWORD = "secret-password"
+_numbers = itertools.count(1)
+
+
+class StatementCounter:
+    """SQL statements and COMMITs sent to the database inside a with block."""
+
+    def __init__(self):
+        self.statements = []
+        self._active = False
+
+    def _execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._active:
+            self.statements.append(statement)
+
+    def _commit(self, conn):
+        if self._active:
+            self.statements.append("COMMIT")
+
+    def __enter__(self):
+        self.statements = []
+        self._active = True
+        return self
+
+    def __exit__(self, *exc):
+        self._active = False
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture(scope="session")
+def client():
+    import init_db
+    init_db.init_db()
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def statements():
+    counter = StatementCounter()
+    event.listen(engine, "before_cursor_execute", counter._execute)
+    event.listen(engine, "commit", counter._commit)
+    yield counter
+    event.remove(engine, "before_cursor_execute", counter._execute)
+    event.remove(engine, "commit", counter._commit)
+
+
+@pytest.fixture
+def login(client):
+    """Register a new user and return their Authorization header."""
+
+    def register_and_login():
+        email = f"user{next(_numbers)}@tests.example.com"
+        response = client.post("/register", json={"name": "Test", "age": 30, "email": email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        response = client.post("/login", json={"email": email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    return register_and_login
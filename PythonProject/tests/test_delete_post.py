@@ -0,0 +1,51 @@
+"""DELETE /posts/{post_id}: one DELETE ... RETURNING with the ownership check.
+
+The SELECT that tells a missing post from someone else's only runs when
+nothing was deleted. Every request also loads the token's user first.
+"""
+
+import pytest
+
+
+@pytest.fixture
+def post(client, login):
+    headers = login()
+    response = client.post("/posts/", json={"content": "Hello"}, headers=headers)
+    assert response.status_code == 200, response.text
+    return headers, response.json()["id"]
+
+
+def test_delete_own_post(client, post, statements):
+    headers, post_id = post
+    with statements:
+        response = client.delete(f"/posts/{post_id}", headers=headers)
+    assert response.status_code == 200
+    load_user, delete, commit = statements.statements
+    assert load_user.startswith("SELECT") and "FROM users" in load_user
+    assert delete.startswith("DELETE FROM posts") and "RETURNING" in delete
+    assert commit == "COMMIT"
+
+
+def test_delete_someone_elses_post(client, login, post, statements):
+    owner, post_id = post
+    stranger = login()
+    with statements:
+        response = client.delete(f"/posts/{post_id}", headers=stranger)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "You can only delete your own posts"
+    load_user, delete, lookup = statements.statements
+    assert delete.startswith("DELETE FROM posts")
+    assert lookup.startswith("SELECT") and "FROM posts" in lookup
+
+    # the post is still there for its author
+    assert client.delete(f"/posts/{post_id}", headers=owner).status_code == 200
+
+
+def test_delete_missing_post(client, post, statements):
+    headers, post_id = post
+    with statements:
+        response = client.delete(f"/posts/{post_id + 10 ** 6}", headers=headers)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Post not found"
+    assert len(statements) == 3, statements.statements
+    assert "COMMIT" not in statements.statements
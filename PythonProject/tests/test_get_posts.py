@@ -0,0 +1,16 @@
+"""GET /posts/: post authors are loaded in one batch, not one query per author."""
+
+
+def test_authors_are_loaded_in_one_query(client, login, statements):
+    authors = [login() for _ in range(3)]
+    for headers in authors:
+        response = client.post("/posts/", json={"content": "Hello"}, headers=headers)
+        assert response.status_code == 200, response.text
+
+    with statements:
+        response = client.get("/posts/", headers=authors[0])
+    assert response.status_code == 200
+    assert len({post["author_id"] for post in response.json()}) >= 3
+    load_user, load_posts, load_authors = statements.statements
+    assert "FROM posts" in load_posts
+    assert "FROM users" in load_authors and " IN (" in load_authors
@@ -0,0 +1,115 @@
+"""
+Загрузка аватара файлом (POST /api/users/avatar).
+
+Тело multipart читается потоком: заранее отклоняется слишком большой
+Content-Length, а при чтении считаются байты, и запрос обрывается, как только
+их больше AVATAR_MAX_UPLOAD_BYTES. Файл копится в SpooledTemporaryFile
+Starlette (до 1 МБ в памяти, дальше на диске), так что загрузка не держит
+в памяти воркера ни всё тело, ни его base64.
+
+Картинка декодируется и уменьшается (avatars.make_thumbnails) в отдельном пуле
+потоков: Pillow отпускает GIL при декодировании и масштабировании. Пул ограничен,
+поэтому одновременно в памяти не больше AVATAR_WORKERS декодированных картинок,
+а при переполнении очереди запрос сразу получает 503.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, BinaryIO, List, Tuple
+
+from fastapi import HTTPException, Request, status
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from avatars import make_thumbnails
+from config import AVATAR_MAX_UPLOAD_BYTES, AVATAR_WORKERS, AVATAR_QUEUE_SIZE
+
+AVATAR_FIELD = "file"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+async def limited_stream(request: Request, limit: int) -> AsyncIterator[bytes]:
+    """Тело запроса по частям, не больше limit байт"""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise UploadTooLarge()
+        yield chunk
+
+
+def too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Файл больше {AVATAR_MAX_UPLOAD_BYTES // (1024 * 1024)} МБ"
+    )
+
+
+async def read_avatar_upload(request: Request) -> UploadFile:
+    """Разбирает multipart с единственным файлом в поле file"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > AVATAR_MAX_UPLOAD_BYTES:
+        raise too_large()
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Ожидается multipart/form-data"
+        )
+
+    parser = MultiPartParser(
+        request.headers, limited_stream(request, AVATAR_MAX_UPLOAD_BYTES), max_files=1, max_fields=0
+    )
+    try:
+        form = await parser.parse()
+    except UploadTooLarge:
+        raise too_large()
+    except MultiPartException as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.message)
+
+    upload = form.get(AVATAR_FIELD)
+    if not isinstance(upload, UploadFile):
+        await form.close()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Файл аватара не передан (поле file)"
+        )
+    return upload
+
+
+class AvatarProcessor:
+    """
+    Пул потоков для make_thumbnails. Как и PasswordHashingService, при занятых
+    потоках и полной очереди отвечает 503, а не копит загрузки
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="avatar")
+
+    def check_capacity(self):
+        if self.pending >= self.workers + self.queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, попробуйте позже",
+                headers={"Retry-After": "1"},
+            )
+
+    async def thumbnails(self, source: BinaryIO) -> List[Tuple[str, bytes]]:
+        self.check_capacity()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, make_thumbnails, source)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+avatar_processor = AvatarProcessor(AVATAR_WORKERS, AVATAR_QUEUE_SIZE)
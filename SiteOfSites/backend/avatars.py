@@ -0,0 +1,117 @@
+"""
+Контентно-адресуемое хранилище аватаров.
+Картинка хранится один раз в таблице avatars под ключом sha256 от её байтов,
+а пользователь ссылается на неё через users.avatar_hash.
+
+Оригинал загруженной картинки не хранится: сохраняются только квадратные
+превью AVATAR_SIZE (users.avatar_hash) и AVATAR_THUMB_SIZE (users.avatar_thumb_hash) в WEBP.
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import re
+from typing import BinaryIO, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.dml import Insert
+
+from config import AVATAR_MAX_PIXELS, AVATAR_SIZE, AVATAR_THUMB_SIZE
+from models import Avatar
+
+AVATAR_HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+AVATAR_URL_PREFIX = "/api/avatars/"  # ссылки в ответах API (User.avatar)
+DATA_URL_RE = re.compile(r'^data:(?P<type>[^;,]*)(;[^,]*)?;base64,(?P<data>.*)$', re.DOTALL)
+
+AVATAR_FORMAT, AVATAR_CONTENT_TYPE = "WEBP", "image/webp"
+AVATAR_QUALITY = 85
+PILLOW_FORMATS = ["PNG", "JPEG", "GIF", "WEBP"]
+
+# Сигнатуры поддерживаемых форматов
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+
+
+def sniff_content_type(data: bytes) -> Optional[str]:
+    """Определяет тип картинки по первым байтам"""
+    for signature, content_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def decode_avatar(value: str) -> Tuple[str, bytes]:
+    """Разбирает data URL (или голый base64) и возвращает (content_type, байты)"""
+    match = DATA_URL_RE.match(value)
+    encoded = match.group('data') if match else value
+    try:
+        data = base64.b64decode(encoded, validate=False)
+    except (binascii.Error, ValueError):
+        raise ValueError('Некорректный формат изображения')
+
+    content_type = sniff_content_type(data)
+    if content_type is None:
+        raise ValueError('Некорректный формат изображения')
+    return content_type, data
+
+
+def make_thumbnails(source: BinaryIO) -> List[Tuple[str, bytes]]:
+    """
+    Декодирует картинку и возвращает (content_type, данные) превью
+    размеров AVATAR_SIZE и AVATAR_THUMB_SIZE. В приложении выполняется
+    в пуле потоков (avatar_upload.py)
+    """
+    if sniff_content_type(source.read(16)) is None:
+        raise ValueError("Некорректный формат изображения")
+    source.seek(0)
+    try:
+        with Image.open(source, formats=PILLOW_FORMATS) as image:
+            # Image.open читает только заголовок: "бомба" (маленький файл с огромным
+            # разрешением) отклоняется до декодирования
+            if image.width * image.height > AVATAR_MAX_PIXELS:
+                raise ValueError("Слишком большое разрешение изображения")
+            # JPEG сразу декодируется в уменьшенном масштабе (1/2 .. 1/8), это в разы меньше памяти
+            image.draft("RGB", (AVATAR_SIZE, AVATAR_SIZE))
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+            variants = []
+            for size in (AVATAR_SIZE, AVATAR_THUMB_SIZE):
+                image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, AVATAR_FORMAT, quality=AVATAR_QUALITY)
+                variants.append((AVATAR_CONTENT_TYPE, buffer.getvalue()))
+            return variants
+    except Image.DecompressionBombError:
+        raise ValueError("Слишком большое разрешение изображения")
+    except (OSError, SyntaxError):
+        raise ValueError("Некорректный формат изображения")
+
+
+def avatar_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def avatar_insert(dialect_name: str, content_type: str, data: bytes) -> Tuple[str, Insert]:
+    """Возвращает хеш картинки и INSERT, который ничего не делает, если она уже есть"""
+    digest = avatar_hash(data)
+    insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = insert(Avatar).values(
+        hash=digest, content_type=content_type, data=data
+    ).on_conflict_do_nothing(index_elements=["hash"])
+    return digest, statement
+
+
+async def store_avatar(db: AsyncSession, content_type: str, data: bytes) -> str:
+    """Сохраняет картинку (если такой ещё нет) и возвращает её хеш"""
+    digest, statement = avatar_insert(db.bind.dialect.name, content_type, data)
+    await db.execute(statement)
+    return digest
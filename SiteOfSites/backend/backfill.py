@@ -0,0 +1,161 @@
+"""
+Пакетное заполнение данных (backfill) для миграций.
+
+Строки читаются порциями по ключу (id > последнего обработанного), каждая порция
+обрабатывается и фиксируется в своей транзакции вместе с отметкой прогресса
+в таблице backfill_checkpoints. Поэтому:
+- в памяти одновременно только одна порция
+- блокировки держатся не дольше одной порции
+- после сбоя или Ctrl+C повторный запуск продолжает с места остановки
+
+Между порциями делается пауза, а в PostgreSQL дополнительно ждем,
+пока реплики догонят (pg_stat_replication.replay_lag).
+
+Пример новой миграции:
+
+    def fill_titles(conn, rows):
+        conn.execute(text("UPDATE projects SET title = :title WHERE id = :id"),
+                     [{"id": row.id, "title": row.title.strip()} for row in rows])
+        return len(rows)
+
+    run_backfill(Backfill(
+        name="projects_strip_titles",
+        query="SELECT id, title FROM projects WHERE id > :last_id ORDER BY id LIMIT :limit",
+        process=fill_titles,
+    ))
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine, Row
+
+from config import BACKFILL_CHUNK_SIZE, BACKFILL_MAX_CHUNK_SECONDS, BACKFILL_MAX_REPLICA_LAG, BACKFILL_PAUSE
+from database import engine as default_engine
+
+MIN_CHUNK_SIZE = 10
+REPLICA_LAG_POLL = 1.0  # секунды между проверками отставания реплик
+
+
+@dataclass
+class Backfill:
+    """
+    name    - ключ отметки прогресса, у каждой миграции свой
+    query   - SELECT с параметрами :last_id и :limit, первая колонка id,
+              ORDER BY id (порядок должен совпадать с условием id > :last_id)
+    process - обрабатывает порцию в переданной транзакции и возвращает
+              число измененных строк
+    """
+    name: str
+    query: str
+    process: Callable[[Connection, List[Row]], int]
+
+
+@dataclass
+class BackfillResult:
+    scanned: int = 0
+    changed: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    resumed_from: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.scanned / self.seconds if self.seconds else 0.0
+
+
+def load_checkpoint(conn: Connection, name: str) -> int:
+    last_id = conn.execute(
+        text("SELECT last_id FROM backfill_checkpoints WHERE name = :name"), {"name": name}
+    ).scalar()
+    return last_id or 0
+
+
+def save_checkpoint(conn: Connection, name: str, last_id: int, rows: int, finished: bool = False):
+    updated = conn.execute(
+        text("UPDATE backfill_checkpoints SET last_id = :last_id, rows_done = rows_done + :rows, "
+             "finished = :finished, updated_at = CURRENT_TIMESTAMP WHERE name = :name"),
+        {"name": name, "last_id": last_id, "rows": rows, "finished": finished}
+    )
+    if updated.rowcount == 0:
+        conn.execute(
+            text("INSERT INTO backfill_checkpoints (name, last_id, rows_done, finished, updated_at) "
+                 "VALUES (:name, :last_id, :rows, :finished, CURRENT_TIMESTAMP)"),
+            {"name": name, "last_id": last_id, "rows": rows, "finished": finished}
+        )
+
+
+def replica_lag(engine: Engine) -> float:
+    """Наибольшее отставание реплик в секундах (0, если реплик нет или это не PostgreSQL)"""
+    if engine.dialect.name != "postgresql":
+        return 0.0
+    with engine.connect() as conn:
+        lag = conn.execute(
+            text("SELECT EXTRACT(EPOCH FROM MAX(replay_lag)) FROM pg_stat_replication")
+        ).scalar()
+    return float(lag or 0.0)
+
+
+def wait_for_replicas(engine: Engine, max_lag: float):
+    lag = replica_lag(engine)
+    while lag > max_lag:
+        print(f"  Реплики отстают на {lag:.1f} с, ждем...")
+        time.sleep(REPLICA_LAG_POLL)
+        lag = replica_lag(engine)
+
+
+def run_backfill(
+    backfill: Backfill,
+    engine: Engine = default_engine,
+    chunk_size: int = BACKFILL_CHUNK_SIZE,
+    pause: float = BACKFILL_PAUSE,
+    max_chunk_seconds: float = BACKFILL_MAX_CHUNK_SECONDS,
+    max_replica_lag: float = BACKFILL_MAX_REPLICA_LAG,
+    restart: bool = False,
+    log: Optional[Callable[[str], None]] = print,
+) -> BackfillResult:
+    """Выполняет backfill порциями до конца таблицы и возвращает статистику"""
+    with engine.begin() as conn:
+        if restart:
+            conn.execute(text("DELETE FROM backfill_checkpoints WHERE name = :name"), {"name": backfill.name})
+        last_id = load_checkpoint(conn, backfill.name)
+
+    result = BackfillResult(resumed_from=last_id)
+    if last_id and log:
+        log(f"  {backfill.name}: продолжаем после id {last_id}")
+
+    started = time.monotonic()
+    while True:
+        chunk_started = time.monotonic()
+        with engine.begin() as conn:
+            rows = conn.execute(text(backfill.query), {"last_id": last_id, "limit": chunk_size}).fetchall()
+            if not rows:
+                save_checkpoint(conn, backfill.name, last_id, 0, finished=True)
+                break
+            changed = backfill.process(conn, rows)
+            last_id = rows[-1][0]
+            save_checkpoint(conn, backfill.name, last_id, len(rows))
+        chunk_seconds = time.monotonic() - chunk_started
+
+        result.scanned += len(rows)
+        result.changed += changed
+        result.chunks += 1
+        result.seconds = time.monotonic() - started
+        if log:
+            log(f"  {backfill.name}: {result.scanned} строк, изменено {result.changed}, "
+                f"{result.rows_per_second:.0f} строк/с, последний id {last_id}")
+
+        # Порция держала блокировки слишком долго - уменьшаем следующую
+        if chunk_seconds > max_chunk_seconds and chunk_size > MIN_CHUNK_SIZE:
+            chunk_size = max(MIN_CHUNK_SIZE, chunk_size // 2)
+            if log:
+                log(f"  {backfill.name}: порция заняла {chunk_seconds:.1f} с, размер порции уменьшен до {chunk_size}")
+
+        if pause:
+            time.sleep(pause)
+        wait_for_replicas(engine, max_replica_lag)
+
+    result.seconds = time.monotonic() - started
+    return result
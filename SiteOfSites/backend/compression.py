@@ -0,0 +1,174 @@
+"""
+Сжатие ответов (gzip, brotli) по заголовку Accept-Encoding.
+
+CompressionMiddleware сжимает ответы в JSON и текстовых форматах размером от
+COMPRESSION_MIN_SIZE байт: маленькие тела почти не уменьшаются, а время на
+сжатие тратится. Картинки (уже сжаты) и text/event-stream (события должны
+уходить сразу, events.py) не трогаются, как и потоковые ответы - сжимается
+только тело, отданное целиком.
+
+Ответ с ETag (профили, profiles.py) каждый раз один и тот же, пока не изменится
+ETag, поэтому его сжатое тело хранится в кэше по (ETag, кодировка) и сжимается
+один раз, а не на каждый запрос. Такие тела сжимаются сильнее
+(COMPRESSION_CACHED_BROTLI_QUALITY), раз это происходит редко.
+
+Сжатое представление - другие байты, поэтому ETag становится слабым (W/"..."),
+как делает nginx; etag_matches в main.py сравнивает ETag без учета W/.
+
+Время сжатия и байты до и после сжатия - в метриках http_compression_*.
+"""
+
+import gzip
+import time
+from functools import lru_cache
+from typing import Optional
+
+import brotli
+
+from cache import TTLCache
+from config import (
+    COMPRESSION_MIN_SIZE, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY, COMPRESSION_CACHED_BROTLI_QUALITY,
+    COMPRESSION_CACHE_SIZE, COMPRESSION_CACHE_TTL
+)
+from metrics import Counter, Gauge, registry
+
+# В порядке предпочтения сервера при равном q
+ENCODINGS = ("br", "gzip")
+COMPRESSIBLE_TYPES = {"application/json", "application/javascript", "application/xml", "image/svg+xml"}
+SKIPPED_TYPES = {"text/event-stream"}
+
+compressed_responses = registry.register(Counter(
+    "http_compressed_responses_total", "Сжатые ответы, включая взятые из кэша"
+))
+compression_seconds = registry.register(Counter(
+    "http_compression_seconds_total", "Время сжатия ответов (без кэша), секунды"
+))
+input_bytes = registry.register(Counter(
+    "http_compression_input_bytes_total", "Размер сжатых ответов до сжатия"
+))
+output_bytes = registry.register(Counter(
+    "http_compression_output_bytes_total", "Размер сжатых ответов после сжатия"
+))
+
+# Сжатые тела ответов с ETag: (ETag, кодировка, размер) -> байты
+compressed_cache = TTLCache(maxsize=COMPRESSION_CACHE_SIZE, ttl=COMPRESSION_CACHE_TTL)
+registry.register(Gauge("http_compression_cache_hits_total", "Сжатые тела, взятые из кэша",
+                        lambda: compressed_cache.hits, kind="counter"))
+
+
+@lru_cache(maxsize=256)
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Кодировка из ENCODINGS с наибольшим q или None (заголовков немного, поэтому кэш)"""
+    weights = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                continue
+        if coding == "*":
+            for encoding in ENCODINGS:
+                weights.setdefault(encoding, q)
+        elif coding in ENCODINGS:
+            weights[coding] = q
+    best = max(ENCODINGS, key=lambda encoding: weights.get(encoding, 0))
+    return best if weights.get(best, 0) > 0 else None
+
+
+def is_compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in SKIPPED_TYPES:
+        return False
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def compress(body: bytes, encoding: str, brotli_quality: int = COMPRESSION_BROTLI_QUALITY) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def weak_etag(etag: str) -> str:
+    return etag if etag.startswith("W/") else "W/" + etag
+
+
+def compressed_body(start: dict, body: bytes, encoding: str) -> bytes:
+    """Сжатое тело; для ответа с ETag - из кэша, если оно уже сжималось"""
+    etag = next((value for name, value in start["headers"] if name == b"etag"), None)
+    key = (etag, encoding, len(body))
+    compressed = compressed_cache.get(key) if etag else None
+    if compressed is None:
+        started = time.perf_counter()
+        compressed = compress(body, encoding, COMPRESSION_CACHED_BROTLI_QUALITY if etag else COMPRESSION_BROTLI_QUALITY)
+        compression_seconds.inc(time.perf_counter() - started)
+        if etag:
+            compressed_cache.set(key, compressed)
+    compressed_responses.inc()
+    input_bytes.inc(len(body))
+    output_bytes.inc(len(compressed))
+    return compressed
+
+
+def compressed_start(start: dict, encoding: str, size: int) -> dict:
+    headers = []
+    for name, value in start["headers"]:
+        if name == b"content-length":
+            value = str(size).encode()
+        elif name == b"etag":
+            value = weak_etag(value.decode("latin-1")).encode("latin-1")
+        headers.append((name, value))
+    headers.append((b"content-encoding", encoding.encode()))
+    return {**start, "headers": headers}
+
+
+class CompressionMiddleware:
+    """ASGI middleware: сжимает ответ, если клиент это поддерживает и ответ того стоит"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept_encoding) if accept_encoding else None
+
+        start = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                if b"content-encoding" in headers or not is_compressible(headers.get(b"content-type", b"").decode("latin-1")):
+                    passthrough = True
+                    await send(message)
+                    return
+                # Ответ зависит от Accept-Encoding, даже если этот не сжимается
+                start = {**message, "headers": [*message.get("headers", []), (b"vary", b"Accept-Encoding")]}
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or encoding is None or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            compressed = compressed_body(start, body, encoding)
+            await send(compressed_start(start, encoding, len(compressed)))
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
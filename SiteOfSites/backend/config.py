@@ -12,13 +12,116 @@ DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "Sctorlorn25565")
 DB_NAME = os.getenv("DB_NAME", "siteofsites")
 
-# URL для подключения к PostgreSQL
-DATABASE_URL = f"postgresql://{DB_USER}:{quote_plus(DB_PASSWORD)}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# URL для подключения к PostgreSQL (DATABASE_URL позволяет указать другую БД, например SQLite для тестов)
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql://{DB_USER}:{quote_plus(DB_PASSWORD)}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+
+# URL для асинхронного драйвера (asyncpg для PostgreSQL, aiosqlite для SQLite)
+def to_async_url(url: str) -> str:
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+# Реплики только для чтения (через запятую, в том же формате, что DATABASE_URL).
+# Без них всё читается и пишется в основную БД
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+ASYNC_DATABASE_REPLICA_URLS = [to_async_url(url) for url in DATABASE_REPLICA_URLS]
+# Сколько секунд после записи клиент читает из основной БД (read-your-writes).
+# Должно быть больше обычного отставания реплик
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", "5"))
+
+# Настройки пула соединений
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "2"))  # соединений, открываемых при старте воркера
+
+# Метрики и журнал медленных запросов
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # запросы дольше этого пишутся в лог
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"  # заголовок Server-Timing в ответах
+
+# Профилирование запросов (profiler.py)
+PROFILER_DIR = os.getenv("PROFILER_DIR", "profiles")  # куда пишутся файлы .prof
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))  # доля профилируемых запросов, 0 - выключено
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")  # значение заголовка X-Profile, пустое - заголовок не работает
 
 # JWT настройки
 SECRET_KEY = os.getenv("SECRET_KEY", "@37!34Hif77+UIfgE22&&1#eee2EC1#$")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Ключ перестановки для unique_id. Менять нельзя: новые ID начнут совпадать со старыми
+UNIQUE_ID_KEY = os.getenv("UNIQUE_ID_KEY", SECRET_KEY)
+UNIQUE_ID_BLOCK_SIZE = int(os.getenv("UNIQUE_ID_BLOCK_SIZE", "100"))  # сколько номеров резервировать за раз
+
+# Параметры Argon2 (при изменении старые хеши пересчитываются при следующем входе)
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))  # в КиБ
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+# Пул процессов для хеширования паролей
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "64"))  # сколько запросов может ждать свободный процесс
+
+# Загрузка аватаров (avatar_upload.py)
+AVATAR_MAX_UPLOAD_BYTES = int(os.getenv("AVATAR_MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))  # размер файла
+AVATAR_MAX_PIXELS = int(os.getenv("AVATAR_MAX_PIXELS", "25000000"))  # ширина x высота исходной картинки
+AVATAR_SIZE = int(os.getenv("AVATAR_SIZE", "256"))  # сторона квадрата для профиля, px
+AVATAR_THUMB_SIZE = int(os.getenv("AVATAR_THUMB_SIZE", "64"))  # сторона превью для поиска и списков, px
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", "2"))  # потоков Pillow в воркере
+AVATAR_QUEUE_SIZE = int(os.getenv("AVATAR_QUEUE_SIZE", "32"))  # сколько загрузок может ждать поток
+
+# Кэш аутентифицированных пользователей
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "60"))  # секунды
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+# Кэш готовых ответов публичных профилей
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "30"))  # секунды
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+
+# Кэш результатов поиска пользователей
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "10"))  # секунды
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "5000"))
+
+# Постраничная выдача проектов
+PROJECTS_PAGE_SIZE = int(os.getenv("PROJECTS_PAGE_SIZE", "20"))  # проектов в профиле и на странице по умолчанию
+PROJECTS_MAX_PAGE_SIZE = int(os.getenv("PROJECTS_MAX_PAGE_SIZE", "100"))
+PROJECTS_BATCH_MAX_SIZE = int(os.getenv("PROJECTS_BATCH_MAX_SIZE", "500"))  # операций в POST /api/projects/batch
+USERS_LOOKUP_MAX_IDS = int(os.getenv("USERS_LOOKUP_MAX_IDS", "300"))  # пользователей в одном GET /api/users
+
+# События об изменениях (events.py, GET /api/events)
+EVENTS_POLL_INTERVAL = float(os.getenv("EVENTS_POLL_INTERVAL", "0.5"))  # секунды между чтениями outbox
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))  # пинг простаивающих соединений
+EVENTS_CLIENT_BUFFER = int(os.getenv("EVENTS_CLIENT_BUFFER", "100"))  # неотправленных событий на клиента
+EVENTS_MAX_USERS = int(os.getenv("EVENTS_MAX_USERS", "100"))  # пользователей в одной подписке
+EVENTS_GAP_TIMEOUT = float(os.getenv("EVENTS_GAP_TIMEOUT", "5"))  # ожидание незафиксированных id
+EVENTS_RETENTION = float(os.getenv("EVENTS_RETENTION", "3600"))  # сколько секунд хранить события
+EVENTS_PRUNE_INTERVAL = float(os.getenv("EVENTS_PRUNE_INTERVAL", "300"))
+
+# Сжатие ответов (compression.py)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # меньшие ответы не сжимаются, байты
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))  # ответы, сжимаемые каждый раз
+COMPRESSION_CACHED_BROTLI_QUALITY = int(os.getenv("COMPRESSION_CACHED_BROTLI_QUALITY", "9"))  # ответы с ETag
+COMPRESSION_CACHE_SIZE = int(os.getenv("COMPRESSION_CACHE_SIZE", "10000"))  # сжатых тел в кэше
+COMPRESSION_CACHE_TTL = float(os.getenv("COMPRESSION_CACHE_TTL", "300"))  # секунды
+
+# Поиск проектов с sort=recent ранжирует совпадения окнами такого размера, от новых к старым (project_search.py)
+PROJECT_SEARCH_MAX_CANDIDATES = int(os.getenv("PROJECT_SEARCH_MAX_CANDIDATES", "500"))
+
+# Пакетные миграции (backfill.py)
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "1000"))  # строк в одной транзакции
+BACKFILL_PAUSE = float(os.getenv("BACKFILL_PAUSE", "0.1"))  # пауза между порциями, секунды
+BACKFILL_MAX_CHUNK_SECONDS = float(os.getenv("BACKFILL_MAX_CHUNK_SECONDS", "2"))  # дольше - порция уменьшается
+BACKFILL_MAX_REPLICA_LAG = float(os.getenv("BACKFILL_MAX_REPLICA_LAG", "5"))  # секунды
+
 # CORS настройки
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
@@ -1,9 +1,94 @@
-from sqlalchemy import create_engine
+import asyncio
+import itertools
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+from metrics import instrument_engine, pool_class_for
+from config import (
+    DATABASE_URL, ASYNC_DATABASE_URL, ASYNC_DATABASE_REPLICA_URLS,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_POOL_WARMUP
+)
 
+# Синхронный движок для скриптов (init_db.py, migrate_db.py)
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок для API, чтобы запросы к БД не блокировали event loop
+pool_options = {}
+if not ASYNC_DATABASE_URL.startswith("sqlite"):
+    pool_options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+# Пул с замером ожидания соединения и события для метрик (см. metrics.py)
+def create_api_engine(url: str):
+    api_engine = create_async_engine(url, poolclass=pool_class_for(url), **pool_options)
+    instrument_engine(api_engine.sync_engine)
+    return api_engine
+
+async_engine = create_api_engine(ASYNC_DATABASE_URL)
+
+# Реплики для чтения, сессии по очереди берут следующую
+replica_engines = [create_api_engine(url) for url in ASYNC_DATABASE_REPLICA_URLS]
+_next_replica = itertools.cycle(replica_engines)
+
+
+class RoutingSession(Session):
+    """
+    Сессия, которая читает с реплики, если она ей выдана (info["replica"]).
+    Запись (flush, INSERT/UPDATE/DELETE) всегда идет в основную БД, и после
+    первой записи сессия читает оттуда же, чтобы видеть свои изменения
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get("replica")
+        if replica is None:
+            return async_engine.sync_engine
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["replica"] = None
+            return async_engine.sync_engine
+        return replica.sync_engine
+
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False
+)
+
+
+def read_session() -> AsyncSession:
+    """Сессия для запроса, который только читает: с репликой, если они настроены"""
+    if not replica_engines:
+        return AsyncSessionLocal()
+    return AsyncSessionLocal(info={"replica": next(_next_replica)})
+
+
+def reads_from_replica(db: AsyncSession) -> bool:
+    return db.info.get("replica") is not None
+
 Base = declarative_base()
+
+
+async def warm_up_pool(connections: int = DB_POOL_WARMUP):
+    """Открывает соединения пулов (основной БД и реплик) заранее, чтобы первые запросы воркера не ждали подключения"""
+    if ASYNC_DATABASE_URL.startswith("sqlite"):
+        connections = 1  # у SQLite пула нет, только проверяем, что файл БД открывается
+
+    async def ping(api_engine):
+        async with api_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(
+        ping(api_engine) for api_engine in [async_engine, *replica_engines] for _ in range(connections)
+    ))
+
+
+async def dispose_engines():
+    for api_engine in [async_engine, *replica_engines]:
+        await api_engine.dispose()
@@ -0,0 +1,329 @@
+"""
+События об изменении профилей и проектов (GET /api/events, Server-Sent Events).
+
+Обработчики пишут событие в таблицу events (outbox) в той же транзакции, что и
+само изменение (record_event), поэтому событие есть тогда и только тогда, когда
+изменение сохранено. Каждый воркер читает новые строки outbox одним фоновым
+циклом (EventBroker) и раздает их своим подписчикам, так что события видны
+клиентам всех воркеров. Запись в этом же воркере будит цикл сразу, иначе он
+опрашивает БД раз в EVENTS_POLL_INTERVAL.
+
+Те же события сбрасывают кэши воркера (профили, поиск, пользователи токенов):
+main.py регистрирует обработчик через add_listener, и цикл работает все время
+жизни воркера (start в lifespan), а не только пока есть подписчики. Так запись
+в одном воркере видна в кэшах остальных не позже чем через EVENTS_POLL_INTERVAL.
+
+Каждое событие форматируется в кадр SSE один раз и раздается по индексу
+подписчиков по user_id, поэтому стоимость раздачи не зависит от числа
+подписчиков на других пользователей. Подписчик - это очередь ограниченного
+размера (EVENTS_CLIENT_BUFFER) и asyncio.Event, без таймеров и задач на
+каждое соединение: комментарии-пинги рассылает тот же цикл.
+
+Медленный клиент, у которого переполнилась очередь, отключается. EventSource
+переподключается с Last-Event-ID и получает пропущенные события из outbox, а
+если их больше EVENTS_CLIENT_BUFFER - событие reset (перезагрузить данные).
+
+В PostgreSQL id выдаются до фиксации транзакций, и строка с меньшим id может
+стать видна позже. Пропущенные id ждут до EVENTS_GAP_TIMEOUT секунд, прежде
+чем считаться откатанными. Подписчикам события выше незакрытого разрыва не
+отправляются, пока он не закроется или не истечет: клиент получает события
+в порядке id, и его Last-Event-ID не перескакивает через запоздавшую строку.
+Восстановление по Last-Event-ID отдает события только до этой же границы
+(published_id). Обработчики add_listener получают события сразу, порядок
+для сброса кэшей не важен.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from pydantic import BaseModel
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import (
+    EVENTS_POLL_INTERVAL, EVENTS_HEARTBEAT, EVENTS_CLIENT_BUFFER, EVENTS_RETENTION, EVENTS_GAP_TIMEOUT,
+    EVENTS_PRUNE_INTERVAL
+)
+from database import AsyncSessionLocal
+from metrics import Gauge, registry
+from models import Event, User
+from schemas import UserResponse
+
+POLL_BATCH = 1000
+MAX_GAP = 1000  # больший разрыв id - не ожидающие транзакции, а, например, сдвиг последовательности
+PING = b": ping\n\n"
+RESET = b"event: reset\ndata: {}\n\n"
+
+logger = logging.getLogger("events")
+
+
+def record_event(db: AsyncSession, kind: str, user_id: int, data: Union[BaseModel, dict]):
+    """Добавляет событие в текущую транзакцию, оно будет разослано после commit"""
+    payload = data.model_dump_json() if isinstance(data, BaseModel) else json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    db.add(Event(kind=kind, user_id=user_id, payload=payload))
+
+
+def record_user_event(db: AsyncSession, kind: str, user: User, previous_nickname: Optional[str] = None):
+    """
+    Событие о регистрации (user.created) или изменении профиля (user.updated).
+    Поток публичный, поэтому без email. previous_nickname нужен другим воркерам,
+    чтобы сбросить результаты поиска по старому никнейму
+    """
+    data = UserResponse.model_validate(user).model_dump(mode="json", exclude={"email"})
+    if previous_nickname and previous_nickname != user.nickname:
+        data["previous_nickname"] = previous_nickname
+    record_event(db, kind, user.id, data)
+
+
+def sse_frame(event: Event) -> bytes:
+    data = f'{{"type":"{event.kind}","user_id":{event.user_id},"data":{event.payload}}}'
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n".encode()
+
+
+class Subscriber:
+    def __init__(self, user_ids: Set[int], buffer: int):
+        self.user_ids = user_ids
+        self.buffer = buffer
+        self.frames: Deque[Tuple[int, bytes]] = deque()  # (id события, кадр), у пинга id 0
+        self.ready = asyncio.Event()
+        self.overflowed = False
+        self.last_id = 0  # события до него уже отправлены при восстановлении по Last-Event-ID
+
+    def push(self, event_id: int, frame: bytes):
+        if len(self.frames) >= self.buffer:
+            self.overflowed = True
+        else:
+            self.frames.append((event_id, frame))
+        self.ready.set()
+
+    def ping(self):
+        if not self.frames:
+            self.frames.append((0, PING))
+            self.ready.set()
+
+    def take(self) -> bytes:
+        """Все накопленные кадры одним куском"""
+        frames = [frame for event_id, frame in self.frames if not 0 < event_id <= self.last_id]
+        self.frames.clear()
+        self.ready.clear()
+        return b"".join(frames)
+
+
+class EventBroker:
+    def __init__(self, poll_interval: float, heartbeat: float, buffer: int, gap_timeout: float):
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.buffer = buffer
+        self.gap_timeout = gap_timeout
+        self._all: Set[Subscriber] = set()
+        self._by_user: Dict[int, Set[Subscriber]] = defaultdict(set)
+        self._everything: Set[Subscriber] = set()  # подписчики без фильтра по пользователям
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._last_id: Optional[int] = None  # None - позиция в outbox еще не прочитана
+        self._published_id: Optional[int] = None  # все id до него отправлены подписчикам или истекли
+        self._gaps: Dict[int, float] = {}  # id, которого еще нет -> когда перестать его ждать
+        self._held: Dict[int, Event] = {}  # прочитанные события выше незакрытого разрыва
+        self._listeners: List[Callable[[Event], None]] = []
+        self.delivered = 0
+        self.dropped = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._all)
+
+    @property
+    def last_id(self) -> Optional[int]:
+        """id последнего прочитанного события"""
+        return self._last_id
+
+    @property
+    def published_id(self) -> Optional[int]:
+        """Граница отправленных подписчикам событий: ниже нее разрывов нет"""
+        return self._published_id
+
+    def subscribe(self, user_ids: Iterable[int]) -> Subscriber:
+        subscriber = Subscriber(set(user_ids), self.buffer)
+        self._all.add(subscriber)
+        if subscriber.user_ids:
+            for user_id in subscriber.user_ids:
+                self._by_user[user_id].add(subscriber)
+        else:
+            self._everything.add(subscriber)
+        self.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber not in self._all:
+            return
+        self._all.discard(subscriber)
+        self._everything.discard(subscriber)
+        for user_id in subscriber.user_ids:
+            subscribers = self._by_user.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_user[user_id]
+
+    def add_listener(self, listener: Callable[[Event], None]):
+        """Обработчик каждого события, в том числе записанного другими воркерами"""
+        self._listeners.append(listener)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def wake(self):
+        """Вызывается после commit с событиями, чтобы не ждать следующего опроса"""
+        if self._all or self._listeners:
+            self._wake.set()
+
+    def notify(self, event: Event):
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Ошибка обработки события %s", event.id)
+
+    def publish(self, event: Event):
+        frame = sse_frame(event)
+        for subscriber in (*self._by_user.get(event.user_id, ()), *self._everything):
+            subscriber.push(event.id, frame)
+            if subscriber.overflowed:
+                self.dropped += 1
+                self.unsubscribe(subscriber)
+            else:
+                self.delivered += 1
+
+    async def _run(self):
+        self._last_id = self._published_id = None
+        self._gaps.clear()
+        self._held.clear()
+        next_heartbeat = time.monotonic() + self.heartbeat
+        while self._all or self._listeners:
+            if self._last_id is not None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+            try:
+                if self._last_id is None:
+                    # События до запуска цикла не нужны: кэши воркера еще пусты
+                    async with AsyncSessionLocal() as db:
+                        self._last_id = await db.scalar(select(func.coalesce(func.max(Event.id), 0)))
+                        self._published_id = self._last_id
+                else:
+                    await self._poll()
+            except Exception:
+                # БД недоступна - подписчики остаются, повторим на следующем опросе
+                logger.exception("Ошибка чтения событий")
+                if self._last_id is None:
+                    await asyncio.sleep(self.poll_interval)
+            if time.monotonic() >= next_heartbeat:
+                next_heartbeat = time.monotonic() + self.heartbeat
+                for subscriber in self._all:
+                    subscriber.ping()
+
+    async def _poll(self):
+        now = time.monotonic()
+        self._gaps = {event_id: until for event_id, until in self._gaps.items() if until > now}
+        pending = sorted(self._gaps)
+        async with AsyncSessionLocal() as db:
+            # Запоздавшие строки из ожидаемых разрывов - отдельным запросом по id,
+            # чтобы незакрытый разрыв не сдвигал окно чтения новых строк назад
+            late = []
+            for start in range(0, len(pending), POLL_BATCH):
+                result = await db.execute(
+                    select(Event).where(Event.id.in_(pending[start:start + POLL_BATCH])).order_by(Event.id)
+                )
+                late.extend(result.scalars())
+            result = await db.execute(
+                select(Event).where(Event.id > self._last_id).order_by(Event.id).limit(POLL_BATCH)
+            )
+            events = list(result.scalars())
+        for event in late:
+            del self._gaps[event.id]
+            self.notify(event)
+            self._held[event.id] = event
+        for event in events:
+            if event.id - self._last_id <= MAX_GAP:
+                for missing in range(self._last_id + 1, event.id):
+                    self._gaps[missing] = now + self.gap_timeout
+            self._last_id = event.id
+            self.notify(event)
+            self._held[event.id] = event
+        self._release()
+        if len(events) == POLL_BATCH:
+            self._wake.set()
+
+    def _release(self):
+        """Отправляет подписчикам придержанные события ниже первого незакрытого разрыва"""
+        first_gap = min(self._gaps, default=None)
+        for event_id in sorted(self._held):
+            if first_gap is not None and event_id > first_gap:
+                break
+            self.publish(self._held.pop(event_id))
+        self._published_id = self._last_id if first_gap is None else first_gap - 1
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+async def replay(db: AsyncSession, after_id: int, user_ids: Set[int], limit: int,
+                 up_to: Optional[int] = None) -> Optional[List[Event]]:
+    """
+    События после after_id (и не выше up_to - границы отправленных событий
+    EventBroker.published_id) для восстановления. None - если их больше limit
+    или часть из них уже удалена очисткой outbox (prune_events)
+    """
+    min_id = await db.scalar(select(func.min(Event.id)))
+    if min_id is not None and after_id < min_id - 1:
+        return None
+    statement = select(Event).where(Event.id > after_id)
+    if up_to is not None:
+        statement = statement.where(Event.id <= up_to)
+    if user_ids:
+        statement = statement.where(Event.user_id.in_(user_ids))
+    result = await db.execute(statement.order_by(Event.id).limit(limit + 1))
+    events = list(result.scalars())
+    return None if len(events) > limit else events
+
+
+async def prune_events(db: AsyncSession, retention: float = EVENTS_RETENTION) -> int:
+    """Удаляет события старше retention секунд, возвращает число удаленных"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=retention)
+    result = await db.execute(delete(Event).where(Event.created_at < cutoff))
+    await db.commit()
+    return result.rowcount
+
+
+async def prune_events_periodically(interval: float = EVENTS_PRUNE_INTERVAL):
+    """Фоновая очистка outbox в каждом воркере (lifespan), повторное удаление безвредно"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                await prune_events(db)
+        except Exception:
+            logger.exception("Ошибка очистки событий")
+
+
+event_broker = EventBroker(EVENTS_POLL_INTERVAL, EVENTS_HEARTBEAT, EVENTS_CLIENT_BUFFER, EVENTS_GAP_TIMEOUT)
+
+registry.register(Gauge("events_subscribers", "Открытые соединения GET /api/events",
+                        lambda: event_broker.subscribers))
+registry.register(Gauge("events_delivered_total", "События, поставленные в очереди подписчиков",
+                        lambda: event_broker.delivered, kind="counter"))
+registry.register(Gauge("events_dropped_subscribers_total", "Подписчики, отключенные из-за переполнения очереди",
+                        lambda: event_broker.dropped, kind="counter"))
@@ -0,0 +1,44 @@
+"""
+Запуск в продакшене: несколько процессов uvicorn под управлением gunicorn.
+
+    python migrate_db.py            # схема БД - отдельным шагом, до запуска воркеров
+    gunicorn -c gunicorn.conf.py
+
+Импорт main.py не создает соединений и процессов, поэтому мастер импортирует
+приложение один раз (preload_app), а воркеры получают его через fork и только
+прогревают пул соединений и процессы хеширования (lifespan в main.py).
+Время старта от числа воркеров почти не зависит.
+
+Перезапуск без потери соединений (слушающий сокет принадлежит мастеру,
+старые воркеры завершают начатые запросы до GRACEFUL_TIMEOUT секунд):
+- kill -HUP <pid мастера> - новые воркеры с тем же кодом (например, после утечки памяти)
+- новый код: kill -USR2 <pid мастера> запускает второй мастер с новым кодом,
+  после его старта kill -QUIT <pid старого мастера>.
+  С PRELOAD_APP=false новый код подхватывает и HUP, но каждый воркер импортирует приложение сам
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = "main:app"
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Плановый перезапуск воркера после N запросов (0 - выключено), jitter разводит воркеры по времени
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "0"))
+
+accesslog = os.getenv("ACCESS_LOG")  # "-" - в stdout
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+# Пул Argon2 по умолчанию занимает половину ядер в каждом воркере.
+# С несколькими воркерами делим ядра между ними, иначе процессов хеширования будет workers * cpu / 2
+os.environ.setdefault("HASH_WORKERS", str(max(1, multiprocessing.cpu_count() // 2 // workers)))
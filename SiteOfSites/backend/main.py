@@ -1,25 +1,87 @@
-from fastapi import FastAPI, HTTPException, Depends, Response, status, Request
+import time
+IMPORT_STARTED = time.perf_counter()  # до остальных импортов: время от импорта до готовности воркера
+
+from fastapi import FastAPI, HTTPException, Depends, Query, Response, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
 from datetime import timedelta
-from typing import List
+from typing import List, Literal, Optional, Union
+import asyncio
+import io
+import json
+import logging
+import os
 import re
-import string
-import random
 
-from database import SessionLocal, engine
-from models import Base, User, Project
+from database import (
+    AsyncSessionLocal, async_engine, dispose_engines, read_session, reads_from_replica, replica_engines,
+    warm_up_pool
+)
+from models import User, Project, Avatar, Event
 from schemas import (
     UserCreate, UserLogin, UserResponse, UserProfileUpdate, 
-    ProjectCreate, ProjectResponse, UserWithProjects, UserSearchResult, Token
+    ProjectCreate, ProjectResponse, ProjectPage, ProjectBatchRequest, ProjectBatchResponse, ProjectSearchPage,
+    UserWithProjects, UserSearchResult, UserLookupLite, UserLookupFull, Token
+)
+from security import hashing_service, create_access_token, verify_token
+from config import (
+    ALLOWED_ORIGINS, PROJECTS_PAGE_SIZE, PROJECTS_MAX_PAGE_SIZE, EVENTS_CLIENT_BUFFER, EVENTS_MAX_USERS,
+    USERS_LOOKUP_MAX_IDS
 )
-from security import hash_password, verify_password, create_access_token, verify_token
-from config import ALLOWED_ORIGINS
+from avatars import AVATAR_HASH_RE, AVATAR_URL_PREFIX, decode_avatar, store_avatar
+from avatar_upload import avatar_processor, read_avatar_upload
+from principals import Principal, load_principal, invalidate_principal
+from unique_ids import unique_id_allocator
+from metrics import MetricsMiddleware, TimedRoute, registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from pagination import fetch_page
+from profiles import load_profile, lookup_users, profile_cache
+from responses import ModelResponse
+from project_batch import apply_project_batch
+from project_search import search_projects
+from events import (
+    RESET, event_broker, prune_events_periodically, record_event, record_user_event, replay, sse_frame
+)
+from replicas import PrimaryPinMiddleware, use_replica
+from compression import CompressionMiddleware
+import search
 
-# Создаем таблицы
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger("uvicorn.error")
 
-app = FastAPI(title="Site of Sites API", version="1.0.0")
+# Таблицы создает отдельный шаг (init_db.py / migrate_db.py), а не каждый воркер при старте.
+# При старте только прогреваем пул соединений и процессы хеширования паролей
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_started = time.perf_counter()
+    await asyncio.gather(warm_up_pool(), hashing_service.warm_up())
+    ready = time.perf_counter()
+    logger.info(
+        "Воркер %s готов: от импорта %.0f мс, прогрев %.0f мс",
+        os.getpid(), (ready - IMPORT_STARTED) * 1000, (ready - warm_up_started) * 1000
+    )
+    pruning = asyncio.create_task(prune_events_periodically())
+    event_broker.start()
+    if async_engine.dialect.name != "postgresql":
+        search.load_user_index()  # индекс поиска строится в фоне сразу, а не при первом поиске
+    yield
+    pruning.cancel()
+    if search.user_index_loading is not None:
+        search.user_index_loading.cancel()
+    await event_broker.stop()
+    hashing_service.shutdown()
+    avatar_processor.shutdown()
+    await dispose_engines()
+
+# Ответы по схемам отдаются через ModelResponse (responses.py), остальные кодирует orjson
+app = FastAPI(
+    title="Site of Sites API", version="1.0.0",
+    default_response_class=ORJSONResponse, lifespan=lifespan
+)
+# Маршруты с замером фаз (зависимости, обработчик, сериализация), до объявления маршрутов
+app.router.route_class = TimedRoute
 
 # Настройка CORS
 app.add_middleware(
@@ -30,18 +92,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Dependency для получения сессии БД
-def get_db():
-    db = SessionLocal()
-    try:
+# После записи клиент какое-то время читает из основной БД, а не с отстающей реплики
+if replica_engines:
+    app.add_middleware(PrimaryPinMiddleware)
+
+# Сжатие ответов gzip/brotli, сжатые профили кэшируются по ETag (compression.py)
+app.add_middleware(CompressionMiddleware)
+
+# Метрики запросов (добавляется последним, чтобы время включало CORS)
+app.add_middleware(MetricsMiddleware)
+
+# Dependency для получения сессии БД: GET/HEAD читают с реплики (replicas.py)
+async def get_db(request: Request):
+    async with (read_session() if use_replica(request) else AsyncSessionLocal()) as db:
         yield db
-    finally:
-        db.close()
 
 # Dependency для получения текущего пользователя
-def get_current_user(
+async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Получаем токен из заголовка Authorization
     auth_header = request.headers.get("Authorization")
@@ -55,13 +124,15 @@ def get_current_user(
     token = auth_header.split(" ")[1]
     try:
         payload = verify_token(token)
-        email: str = payload.get("sub")
-        if email is None:
+        # В sub хранится id пользователя: он не меняется, в отличие от email
+        subject = payload.get("sub")
+        if subject is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Недействительный токен",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        user_id = int(subject)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -69,99 +140,116 @@ def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    from models import User
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    principal = await load_principal(db, user_id)
+    if principal is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Пользователь не найден",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
+    return principal
 
 # Валидация email
 def validate_email(email: str) -> bool:
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
-# Генерация уникального ID
-def generate_unique_id(db: Session) -> str:
-    """Генерирует уникальный ID длиной от 5 до 10 символов (только буквы и цифры)"""
-    while True:
-        length = random.randint(5, 10)
-        unique_id = ''.join(random.choices(string.ascii_letters + string.digits, k=length))
-        
-        # Проверяем, что такой ID не существует
-        if not db.query(User).filter(User.unique_id == unique_id).first():
-            return unique_id
-
 @app.get("/")
 async def root():
     return {"message": "Site of Sites API"}
 
+# Уникальность email, никнейма и unique_id проверяет сама БД (уникальные индексы users),
+# поэтому регистрация и изменение профиля - один INSERT/UPDATE ... RETURNING без
+# предварительных SELECT и без гонки между проверкой и записью.
+# Нарушенное ограничение превращается в прежнее сообщение
+USER_CONFLICTS = {
+    "email": "Пользователь с таким email уже зарегистрирован",
+    "nickname": "Пользователь с таким никнеймом уже существует",
+}
+# Колонка из сообщения БД: "UNIQUE constraint failed: users.email" (SQLite)
+# или "... unique constraint "ix_users_email"" (PostgreSQL)
+CONSTRAINT_COLUMN_RE = re.compile(r"(?:users\.|ix_users_)(\w+)")
+
+def conflict_column(error: IntegrityError) -> Optional[str]:
+    match = CONSTRAINT_COLUMN_RE.search(str(error.orig))
+    return match.group(1) if match else None
+
+def user_conflict(error: IntegrityError) -> Optional[str]:
+    """Сообщение для нарушенного ограничения уникальности или None"""
+    return USER_CONFLICTS.get(conflict_column(error))
+
 @app.post("/api/auth/register", response_model=Token)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
-    from models import User
-    
-    # Проверяем, существует ли пользователь с таким email
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Пользователь с таким email уже зарегистрирован"
-        )
-    
-    # Проверяем, существует ли пользователь с таким никнеймом
-    db_user_nickname = db.query(User).filter(User.nickname == user.nickname).first()
-    if db_user_nickname:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Пользователь с таким никнеймом уже существует"
-        )
-    
-    # Создаем нового пользователя
-    hashed_password = hash_password(user.password)
-    unique_id = generate_unique_id(db)
-    db_user = User(
-        email=user.email,
-        nickname=user.nickname,
-        password_hash=hashed_password,
-        unique_id=unique_id
-    )
-    
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    hashed_password = await hashing_service.hash(user.password)
+    for attempt in range(2):
+        unique_id = await unique_id_allocator.allocate()
+        try:
+            result = await db.execute(
+                insert(User).values(
+                    email=user.email,
+                    nickname=user.nickname,
+                    password_hash=hashed_password,
+                    unique_id=unique_id
+                ).returning(User)
+            )
+            db_user = result.scalar_one()
+            record_user_event(db, "user.created", db_user)
+            await db.commit()
+            break
+        except IntegrityError as e:
+            await db.rollback()
+            # Номера счетчика не повторяются, но ID, выданный до перехода на счетчик
+            # (случайный), может совпасть с новым - тогда один раз берем следующий
+            if attempt == 0 and conflict_column(e) == "unique_id":
+                continue
+            detail = user_conflict(e)
+            if detail is None:
+                raise
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=detail
+            )
+    event_broker.wake()
+    search.index_user(db_user)
     
     # Создаем токен
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
-        data={"sub": db_user.email}, expires_delta=access_token_expires
+        data={"sub": str(db_user.id)}, expires_delta=access_token_expires
     )
     
-    return {
+    return ModelResponse(Token, {
         "access_token": access_token,
         "token_type": "bearer",
         "user": db_user
-    }
+    })
 
 @app.post("/api/auth/login", response_model=Token)
-async def login(user: UserLogin, response: Response, db: Session = Depends(get_db)):
+async def login(user: UserLogin, response: Response, db: AsyncSession = Depends(get_db)):
     from models import User
     
     # Находим пользователя по email
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.password_hash):
+    result = await db.execute(select(User).where(User.email == user.email))
+    db_user = result.scalars().first()
+    password_ok, new_hash = False, None
+    if db_user:
+        password_ok, new_hash = await hashing_service.verify(user.password, db_user.password_hash)
+    if not db_user or not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный email или пароль",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Хеш с устаревшими параметрами Argon2 заменяем на новый
+    if new_hash:
+        db_user.password_hash = new_hash
+        await db.commit()
+    
     # Создаем токен
     access_token_expires = timedelta(minutes=30)
     access_token = create_access_token(
-        data={"sub": db_user.email}, expires_delta=access_token_expires
+        data={"sub": str(db_user.id)}, expires_delta=access_token_expires
     )
     
     # Устанавливаем HTTP-only куки
@@ -181,8 +269,11 @@ async def login(user: UserLogin, response: Response, db: Session = Depends(get_d
     }
 
 @app.get("/api/auth/me", response_model=UserResponse)
-async def get_current_user_info(current_user: UserResponse = Depends(get_current_user)):
-    return current_user
+async def get_current_user_info(
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    return ModelResponse(UserResponse, await db.get(User, current_user.id))
 
 @app.post("/api/auth/logout")
 async def logout(response: Response):
@@ -191,81 +282,337 @@ async def logout(response: Response):
 
 # Поиск пользователей
 @app.get("/api/users/search", response_model=List[UserSearchResult])
-async def search_users(q: str, db: Session = Depends(get_db)):
+async def search_users(q: str, db: AsyncSession = Depends(get_db)):
     """Поиск пользователей по имени или уникальному ID"""
-    if len(q) < 2:
-        return []
-    
-    # Поиск по никнейму или уникальному ID
-    users = db.query(User).filter(
-        (User.nickname.ilike(f"%{q}%")) | (User.unique_id.ilike(f"%{q}%"))
-    ).limit(5).all()
-    
-    return users
+    return ModelResponse(List[UserSearchResult], await search.search_cache.search(db, q))
+
+# Несколько пользователей одним запросом вместо /api/users/{user_id} на каждого
+@app.get("/api/users", response_model=Union[UserLookupLite, UserLookupFull])
+async def lookup_users_endpoint(
+    ids: List[str] = Query([]),
+    unique_ids: List[str] = Query([]),
+    view: Literal["lite", "full"] = "lite",
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Пользователи по ?ids=1,2,3 или ?unique_ids=a,b в порядке запроса.
+    view=lite - как в поиске, view=full - как в профиле, но без проектов
+    """
+    if bool(ids) == bool(unique_ids):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Укажите ids или unique_ids"
+        )
+    keys = [key.strip() for value in ids or unique_ids for key in value.split(",") if key.strip()]
+    if len(keys) > USERS_LOOKUP_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не больше {USERS_LOOKUP_MAX_IDS} пользователей в одном запросе"
+        )
+    column = User.unique_id
+    if ids:
+        column = User.id
+        try:
+            keys = [int(key) for key in keys]
+        except ValueError:
+            keys = None
+        if keys is None or any(not 0 < key < 2 ** 31 for key in keys):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="ids должны быть положительными целыми числами"
+            )
+
+    users, missing = await lookup_users(db, column, keys, lite=view == "lite")
+    return ModelResponse(UserLookupLite if view == "lite" else UserLookupFull, {"users": users, "missing": missing})
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Проверяет, есть ли etag среди значений заголовка If-None-Match (слабое сравнение, без W/)"""
+    if_none_match = request.headers.get("If-None-Match", "")
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+# Профиль меняется редко, поэтому браузер хранит его, но каждый раз сверяет ETag
+PROFILE_CACHE_CONTROL = "no-cache"
+
+async def profile_response(request: Request, db: AsyncSession, user_id: Optional[int], *criteria) -> Response:
+    """Отдает профиль из кэша или загружает его; на совпавший If-None-Match отвечает 304"""
+    entry = profile_cache.get(user_id)
+    if entry is None:
+        since = profile_cache.version
+        profile = await load_profile(db, *criteria)
+        if not profile:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Пользователь не найден"
+            )
+        entry = profile_cache.put(profile, since, reads_from_replica(db))
+
+    headers = {"ETag": entry.etag, "Cache-Control": PROFILE_CACHE_CONTROL}
+    if etag_matches(request, entry.etag):
+        profile_cache.record_not_modified(entry)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
 
 # Получение профиля пользователя
 @app.get("/api/users/{user_id}", response_model=UserWithProjects)
-async def get_user_profile(user_id: int, db: Session = Depends(get_db)):
+async def get_user_profile(user_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     """Получение профиля пользователя по ID"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Пользователь не найден"
-        )
-    return user
+    return await profile_response(request, db, user_id, User.id == user_id)
 
 # Получение профиля пользователя по уникальному ID
 @app.get("/api/users/by-unique-id/{unique_id}", response_model=UserWithProjects)
-async def get_user_profile_by_unique_id(unique_id: str, db: Session = Depends(get_db)):
+async def get_user_profile_by_unique_id(unique_id: str, request: Request, db: AsyncSession = Depends(get_db)):
     """Получение профиля пользователя по уникальному ID"""
-    user = db.query(User).filter(User.unique_id == unique_id).first()
-    if not user:
+    user_id = profile_cache.user_ids.get(unique_id)
+    return await profile_response(request, db, user_id, User.unique_id == unique_id)
+
+# Следующие страницы проектов пользователя
+@app.get("/api/users/{user_id}/projects", response_model=ProjectPage)
+async def get_user_profile_projects(
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(PROJECTS_PAGE_SIZE, ge=1, le=PROJECTS_MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """Страница проектов пользователя, cursor берется из предыдущего ответа"""
+    try:
+        projects, next_cursor = await fetch_page(
+            db, select(Project).where(Project.owner_id == user_id), Project, cursor, limit
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return ModelResponse(ProjectPage, {"items": projects, "next_cursor": next_cursor})
+
+# Аватар и сброс кэшей после изменения профиля
+async def save_avatar(db: AsyncSession, source) -> dict:
+    """Сохраняет превью картинки и возвращает значения колонок аватара пользователя"""
+    try:
+        (avatar_type, avatar_data), (thumb_type, thumb_data) = await avatar_processor.thumbnails(source)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return {
+        "avatar_hash": await store_avatar(db, avatar_type, avatar_data),
+        "avatar_thumb_hash": await store_avatar(db, thumb_type, thumb_data),
+    }
+
+async def update_user(db: AsyncSession, user_id: int, values: dict, old_nickname: Optional[str] = None) -> User:
+    """
+    Изменяет пользователя одним UPDATE ... RETURNING и записывает событие,
+    commit делает вызывающий. Занятый никнейм - 400, пользователя нет - 404
+    """
+    try:
+        result = await db.execute(update(User).where(User.id == user_id).values(**values).returning(User))
+    except IntegrityError as e:
+        await db.rollback()
+        detail = user_conflict(e)
+        if detail is None:
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=detail
+        )
+    user = result.scalars().first()
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Пользователь не найден"
         )
+    record_user_event(db, "user.updated", user, old_nickname)
     return user
 
+def profile_changed(user: User, old_nickname: str, search_changed: bool):
+    """
+    Сбрасывает кэши, в которых есть данные профиля, и рассылает событие об изменении.
+    search_changed - изменились никнейм или аватар, которые есть в результатах поиска
+    """
+    event_broker.wake()
+    invalidate_principal(user.id)
+    profile_cache.bump(user.id)
+    if search_changed:
+        search.index_user(user, old_nickname)
+
 # Обновление профиля
 @app.put("/api/users/profile", response_model=UserResponse)
 async def update_profile(
     profile_data: UserProfileUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Обновление профиля текущего пользователя"""
-    
-    # Проверяем, что никнейм не занят другим пользователем
-    if profile_data.nickname and profile_data.nickname != current_user.nickname:
-        existing_user = db.query(User).filter(
-            User.nickname == profile_data.nickname,
-            User.id != current_user.id
-        ).first()
-        if existing_user:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Пользователь с таким никнеймом уже существует"
-            )
-    
-    # Обновляем поля
+    values = {}
     if profile_data.nickname is not None:
-        current_user.nickname = profile_data.nickname
+        values["nickname"] = profile_data.nickname
     if profile_data.description is not None:
-        current_user.description = profile_data.description
-    if profile_data.avatar is not None:
-        current_user.avatar = profile_data.avatar
-    
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+        values["description"] = profile_data.description
+    # Ссылку /api/avatars/... клиент присылает обратно без изменений, картинка та же
+    if profile_data.avatar is not None and not profile_data.avatar.startswith(AVATAR_URL_PREFIX):
+        if not profile_data.avatar:
+            values["avatar_hash"] = None
+            values["avatar_thumb_hash"] = None
+        else:
+            try:
+                _, data = decode_avatar(profile_data.avatar)
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+            values.update(await save_avatar(db, io.BytesIO(data)))
+
+    if not values:
+        return ModelResponse(UserResponse, await db.get(User, current_user.id))
+
+    user = await update_user(db, current_user.id, values, current_user.nickname)
+    await db.commit()
+    profile_changed(user, current_user.nickname,
+                    user.nickname != current_user.nickname or "avatar_hash" in values)
+    return ModelResponse(UserResponse, user)
+
+# Загрузка аватара файлом: тело читается потоком с ограничением размера,
+# картинка уменьшается в пуле потоков (avatar_upload.py)
+@app.post("/api/users/avatar", response_model=UserResponse)
+async def upload_avatar(
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Загрузка аватара текущего пользователя (multipart/form-data, поле file)"""
+    # Перегруженный сервер отвечает 503 до чтения тела
+    avatar_processor.check_capacity()
+    upload = await read_avatar_upload(request)
+    try:
+        values = await save_avatar(db, upload.file)
+    finally:
+        await upload.close()
+
+    user = await update_user(db, current_user.id, values)
+    await db.commit()
+    profile_changed(user, user.nickname, True)
+    return ModelResponse(UserResponse, user)
+
+# Отдача аватаров. Содержимое по хешу никогда не меняется,
+# поэтому браузер может кэшировать его бессрочно
+AVATAR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@app.get("/api/avatars/{avatar_hash}")
+async def get_avatar(avatar_hash: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """Получение картинки аватара по её хешу"""
+    if not AVATAR_HASH_RE.match(avatar_hash):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Аватар не найден"
+        )
+
+    etag = f'"{avatar_hash}"'
+    headers = {"ETag": etag, "Cache-Control": AVATAR_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    avatar = await db.get(Avatar, avatar_hash)
+    if not avatar:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Аватар не найден"
+        )
+    return Response(content=avatar.data, media_type=avatar.content_type, headers=headers)
+
+# Метрики в формате Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(content=registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+# Статистика кэша профилей
+@app.get("/api/metrics/profile-cache")
+async def get_profile_cache_stats():
+    """Доля попаданий в кэш профилей и сколько байт сэкономили ответы 304"""
+    return profile_cache.stats()
+
+# Статистика кэша поиска
+@app.get("/api/metrics/search-cache")
+async def get_search_cache_stats():
+    """Попадания в кэш поиска и объединенные одинаковые запросы"""
+    return search.search_cache.stats()
+
+# События об изменениях профилей и проектов (events.py)
+@app.get("/api/events")
+async def events_stream(request: Request, user_id: List[int] = Query([])):
+    """
+    Поток Server-Sent Events. user_id (можно несколько) - только события этих
+    пользователей, без него - все. Сессия БД нужна только для восстановления
+    по Last-Event-ID и закрывается до начала потока
+    """
+    if len(user_id) > EVENTS_MAX_USERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не больше {EVENTS_MAX_USERS} пользователей в подписке"
+        )
+    subscriber = event_broker.subscribe(user_id)
+    backlog = b""
+    last_event_id = request.headers.get("Last-Event-ID", "")
+    if last_event_id.isdigit():
+        try:
+            async with AsyncSessionLocal() as db:
+                # События выше границы придут из подписки, когда закроются разрывы id
+                missed = await replay(db, int(last_event_id), subscriber.user_ids, EVENTS_CLIENT_BUFFER,
+                                      event_broker.published_id)
+        except BaseException:
+            event_broker.unsubscribe(subscriber)
+            raise
+        if missed is None:
+            backlog = RESET
+        else:
+            backlog = b"".join(sse_frame(event) for event in missed)
+            subscriber.last_id = missed[-1].id if missed else int(last_event_id)
+
+    async def stream():
+        try:
+            if backlog:
+                yield backlog
+            while True:
+                await subscriber.ready.wait()
+                frames = subscriber.take()
+                if frames:
+                    yield frames
+                if subscriber.overflowed:
+                    return  # клиент не успевает; переподключится с Last-Event-ID
+        finally:
+            event_broker.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx не должен буферизовать поток
+    })
+
+def projects_changed(user_id: int):
+    """Сбрасывает кэш профиля и рассылает события после изменения проектов"""
+    event_broker.wake()
+    profile_cache.bump(user_id)
+
+def apply_event(event: Event):
+    """
+    Сбрасывает кэши этого воркера по событию из outbox, в том числе записанному
+    другим воркером. В воркере, который сделал запись, кэши уже сброшены
+    (profile_changed, projects_changed), повторный сброс ничего не ломает
+    """
+    profile_cache.bump(event.user_id)
+    if event.kind in ("user.created", "user.updated"):
+        invalidate_principal(event.user_id)
+        data = json.loads(event.payload)
+        search.user_changed(event.user_id, data["nickname"], data["unique_id"], data.get("previous_nickname"))
+
+event_broker.add_listener(apply_event)
 
 # Управление проектами
 @app.post("/api/projects", response_model=ProjectResponse)
 async def create_project(
     project: ProjectCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Создание нового проекта"""
     db_project = Project(
@@ -274,31 +621,84 @@ async def create_project(
         owner_id=current_user.id
     )
     db.add(db_project)
-    db.commit()
-    db.refresh(db_project)
-    return db_project
+    # id и created_at нужны событию, которое пишется в той же транзакции
+    await db.flush()
+    await db.refresh(db_project)
+    record_event(db, "project.created", current_user.id, ProjectResponse.model_validate(db_project))
+    await db.commit()
+    projects_changed(current_user.id)
+    return ModelResponse(ProjectResponse, db_project)
+
+@app.post("/api/projects/batch", response_model=ProjectBatchResponse)
+async def batch_projects(
+    batch: ProjectBatchRequest,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Создание, изменение и удаление нескольких проектов одной транзакцией"""
+    results = await apply_project_batch(db, current_user.id, batch.operations)
+    if any(result["status"] < 300 for result in results):
+        projects_changed(current_user.id)
+    return ModelResponse(ProjectBatchResponse, {"results": results})
 
-@app.get("/api/projects", response_model=List[ProjectResponse])
+@app.get("/api/projects", response_model=ProjectPage)
 async def get_user_projects(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(PROJECTS_PAGE_SIZE, ge=1, le=PROJECTS_MAX_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Получение проектов текущего пользователя"""
-    projects = db.query(Project).filter(Project.owner_id == current_user.id).all()
-    return projects
+    """Получение проектов текущего пользователя (сначала новые, по страницам)"""
+    try:
+        projects, next_cursor = await fetch_page(
+            db, select(Project).where(Project.owner_id == current_user.id), Project, cursor, limit
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return ModelResponse(ProjectPage, {"items": projects, "next_cursor": next_cursor})
 
+# Поиск проектов по названию и описанию
+@app.get("/api/projects/search", response_model=ProjectSearchPage)
+async def search_projects_endpoint(
+    q: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(PROJECTS_PAGE_SIZE, ge=1, le=PROJECTS_MAX_PAGE_SIZE),
+    sort: Literal["relevance", "recent"] = "relevance",
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Проекты всех пользователей по релевантности (sort=recent - окнами от новых
+    к старым, см. project_search.py), cursor берется из предыдущего ответа
+    """
+    try:
+        projects, next_cursor = await search_projects(db, q, cursor, limit, sort)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return ModelResponse(ProjectSearchPage, {"items": projects, "next_cursor": next_cursor})
+
+# Изменение и удаление - один UPDATE/DELETE ... RETURNING с проверкой владельца в WHERE:
+# ни одной строки - проекта нет или он чужой, в обоих случаях 404
 @app.put("/api/projects/{project_id}", response_model=ProjectResponse)
 async def update_project(
     project_id: int,
     project: ProjectCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Обновление проекта"""
-    db_project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
+    result = await db.execute(
+        update(Project)
+        .where(Project.id == project_id, Project.owner_id == current_user.id)
+        .values(title=project.title, description=project.description)
+        .returning(Project.id, Project.title, Project.description, Project.owner_id, Project.created_at)
+    )
+    db_project = result.first()
     
     if not db_project:
         raise HTTPException(
@@ -306,32 +706,33 @@ async def update_project(
             detail="Проект не найден"
         )
     
-    db_project.title = project.title
-    db_project.description = project.description
-    db.commit()
-    db.refresh(db_project)
-    return db_project
+    record_event(db, "project.updated", current_user.id, ProjectResponse.model_validate(db_project))
+    await db.commit()
+    projects_changed(current_user.id)
+    return ModelResponse(ProjectResponse, db_project)
 
 @app.delete("/api/projects/{project_id}")
 async def delete_project(
     project_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
     """Удаление проекта"""
-    db_project = db.query(Project).filter(
-        Project.id == project_id,
-        Project.owner_id == current_user.id
-    ).first()
+    result = await db.execute(
+        delete(Project)
+        .where(Project.id == project_id, Project.owner_id == current_user.id)
+        .returning(Project.id)
+    )
     
-    if not db_project:
+    if not result.first():
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Проект не найден"
         )
     
-    db.delete(db_project)
-    db.commit()
+    record_event(db, "project.deleted", current_user.id, {"id": project_id})
+    await db.commit()
+    projects_changed(current_user.id)
     return {"message": "Проект удален"}
 
 if __name__ == "__main__":
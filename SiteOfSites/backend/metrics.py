@@ -0,0 +1,366 @@
+"""
+Метрики запросов к API и к БД в формате Prometheus.
+
+На каждый HTTP запрос MetricsMiddleware заводит RequestStats, а события движка
+SQLAlchemy добавляют в него число запросов к БД, время их выполнения и время
+ожидания соединения из пула. После ответа всё попадает в гистограммы с меткой
+маршрута, которые отдаются на /metrics.
+
+Маршруты приложения создаются классом TimedRoute, который делит время
+маршрута на фазы (http_request_phase_seconds):
+- dependencies - разбор тела и зависимости (get_db, get_current_user)
+- handler - сам обработчик без сериализации
+- serialization - ModelResponse или response_model и кодирование ответа
+
+Метрики хранятся в памяти процесса: при нескольких воркерах каждый считает свои.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from starlette.routing import request_response
+
+from config import SERVER_TIMING, SLOW_QUERY_MS
+from profiler import profiler as default_profiler
+
+logger = logging.getLogger("sql.slow")
+
+UNMATCHED_ROUTE = "<unmatched>"
+PHASES = ("dependencies", "handler", "serialization")
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_time: float = 0.0
+    pool_wait: float = 0.0
+    # Фазы маршрута (TimedRoute), время в секундах от perf_counter
+    route_started: float = 0.0
+    route_time: float = 0.0
+    handler_started: float = 0.0
+    handler_time: float = 0.0
+    serialization_time: float = 0.0  # сериализация внутри обработчика (ModelResponse)
+
+    def phases(self) -> Optional[Tuple[float, float, float]]:
+        """(dependencies, handler, serialization) или None, если маршрут не завершился ответом"""
+        if not self.route_time or not self.handler_started:
+            return None
+        dependencies = self.handler_started - self.route_started
+        after_handler = self.route_time - dependencies - self.handler_time
+        return (
+            dependencies,
+            max(self.handler_time - self.serialization_time, 0.0),
+            after_handler + self.serialization_time,
+        )
+
+
+current_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_stats", default=None)
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # число значений в каждой корзине (не накопленное, последняя - выше всех границ), сумма, общее число
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            # одна корзина вместо всех подходящих, накопленные суммы считает render
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, accumulate(counts)):
+                    bucket_labels = _format_labels(self.labelnames + ("le",), labels + (_format_value(bound),))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+                inf_labels = _format_labels(self.labelnames + ("le",), labels + ("+Inf",))
+                lines.append(f"{self.name}_bucket{inf_labels} {count}")
+                series_labels = _format_labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{series_labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{series_labels} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {_format_value(self.value)}",
+        ]
+
+
+class Gauge:
+    """Значение, которое считывается функцией в момент запроса /metrics"""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float], kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {_format_value(self.read())}",
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP запроса", TIME_BUCKETS, ("method", "route")
+))
+request_statements = registry.register(Histogram(
+    "db_statements_per_request", "Число SQL запросов на один HTTP запрос", COUNT_BUCKETS, ("method", "route")
+))
+request_db_time = registry.register(Histogram(
+    "db_time_per_request_seconds", "Суммарное время SQL запросов за HTTP запрос", TIME_BUCKETS, ("method", "route")
+))
+request_pool_wait = registry.register(Histogram(
+    "db_pool_wait_per_request_seconds", "Ожидание соединения из пула за HTTP запрос", TIME_BUCKETS, ("method", "route")
+))
+request_phase = registry.register(Histogram(
+    "http_request_phase_seconds", "Время фазы маршрута: dependencies, handler, serialization",
+    TIME_BUCKETS, ("method", "route", "phase")
+))
+slow_queries = registry.register(Counter(
+    "db_slow_queries_total", f"SQL запросы дольше {SLOW_QUERY_MS} мс"
+))
+
+
+def timed_pool_class(base):
+    """Подкласс пула, который замеряет ожидание свободного соединения"""
+
+    class TimedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                stats = current_stats.get()
+                if stats is not None:
+                    stats.pool_wait += time.perf_counter() - started
+
+    TimedPool.__name__ = f"Timed{base.__name__}"
+    return TimedPool
+
+
+def pool_class_for(url: str):
+    """Класс пула, который SQLAlchemy выбрал бы для url сам, с замером ожидания"""
+    url = make_url(url)
+    return timed_pool_class(url.get_dialect().get_pool_class(url))
+
+
+def instrument_engine(engine: Engine):
+    """Подписывается на события движка (для AsyncEngine передается engine.sync_engine)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        stats = current_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_time += elapsed
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            slow_queries.inc()
+            logger.warning("Медленный запрос (%.1f мс): %s", elapsed * 1000, " ".join(statement.split())[:1000])
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # after_cursor_execute при ошибке не вызывается, убираем время начала
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+
+def timed_endpoint(call: Callable) -> Callable:
+    """Обертка обработчика, которая пишет время его выполнения в RequestStats"""
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(**values):
+            stats = current_stats.get()
+            if stats is None:
+                return await call(**values)
+            stats.handler_started = time.perf_counter()
+            try:
+                return await call(**values)
+            finally:
+                stats.handler_time = time.perf_counter() - stats.handler_started
+    else:
+        # sync обработчик FastAPI вызывает в пуле потоков, ContextVar туда копируется
+        @functools.wraps(call)
+        def endpoint(**values):
+            stats = current_stats.get()
+            if stats is None:
+                return call(**values)
+            stats.handler_started = time.perf_counter()
+            try:
+                return call(**values)
+            finally:
+                stats.handler_time = time.perf_counter() - stats.handler_started
+    return endpoint
+
+
+class TimedRoute(APIRoute):
+    """
+    Маршрут с замером фаз: app.router.route_class = TimedRoute до объявления маршрутов.
+    Сигнатуру и зависимости FastAPI разбирает по исходному обработчику, а вызывает обертку
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        self.dependant.call = timed_endpoint(self.dependant.call)
+        self.app = request_response(self.get_route_handler())
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            stats = current_stats.get()
+            if stats is None:
+                return await handler(request)
+            stats.route_started = time.perf_counter()
+            response = await handler(request)
+            stats.route_time = time.perf_counter() - stats.route_started
+            return response
+
+        return timed_handler
+
+
+def record_serialization(started: float):
+    """Добавляет к запросу время сериализации, начатой в момент started"""
+    stats = current_stats.get()
+    if stats is not None:
+        stats.serialization_time += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: считает метрики запроса, если включено, добавляет Server-Timing
+    и профилирует выбранные запросы (profiler.py)
+    """
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING, profiler=default_profiler):
+        self.app = app
+        self.server_timing = server_timing
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        profiling = self.profiler.start(scope) if self.profiler.enabled else None
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and (self.server_timing or profiling):
+                headers = list(message.get("headers", []))
+                if self.server_timing:
+                    headers.append((b"server-timing", self._server_timing(stats, started).encode()))
+                if profiling:
+                    headers.append((b"x-profile-file", profiling[1].encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_stats.reset(token)
+            elapsed = time.perf_counter() - started
+            if profiling:
+                await self.profiler.finish(*profiling)
+            labels = (scope["method"], getattr(scope.get("route"), "path", UNMATCHED_ROUTE))
+            request_duration.observe(elapsed, *labels)
+            request_statements.observe(stats.statements, *labels)
+            request_db_time.observe(stats.db_time, *labels)
+            request_pool_wait.observe(stats.pool_wait, *labels)
+            phases = stats.phases()
+            if phases is not None:
+                for phase, seconds in zip(PHASES, phases):
+                    request_phase.observe(seconds, *labels, phase)
+
+    @staticmethod
+    def _server_timing(stats: RequestStats, started: float) -> str:
+        value = (
+            f"db;dur={stats.db_time * 1000:.2f};desc=\"{stats.statements} queries\", "
+            f"pool;dur={stats.pool_wait * 1000:.2f}, "
+            f"app;dur={(time.perf_counter() - started) * 1000:.2f}"
+        )
+        phases = stats.phases()
+        if phases is not None:
+            value += "".join(f", {phase};dur={seconds * 1000:.2f}" for phase, seconds in zip(PHASES, phases))
+        return value
@@ -2,57 +2,241 @@
 """
 Скрипт для миграции базы данных
 Добавляет новые поля в таблицу users и создает таблицу projects
+
+Заполнение данных идет порциями с отметками прогресса (см. backfill.py),
+прерванную миграцию достаточно запустить еще раз.
+
+Параметры:
+    --chunk-size N   строк в одной транзакции
+    --pause S        пауза между порциями в секундах
+    --restart        начать заполнение заново, не учитывая сохраненный прогресс
 """
 
-from sqlalchemy import create_engine, text
-from database import Base, engine, SessionLocal
-from models import User, Project
-import string
-import random
-
-def generate_unique_id(db):
-    """Генерирует уникальный ID длиной от 5 до 10 символов (только буквы и цифры)"""
-    while True:
-        length = random.randint(5, 10)
-        unique_id = ''.join(random.choices(string.ascii_letters + string.digits, k=length))
-        
-        # Проверяем, что такой ID не существует
-        if not db.query(User).filter(User.unique_id == unique_id).first():
-            return unique_id
-
-def migrate_database():
+import argparse
+import io
+
+from sqlalchemy import text, inspect
+from database import Base, engine
+from models import PROJECT_SEARCH_DDL, USER_SEARCH_DDL
+from avatars import decode_avatar, avatar_insert, make_thumbnails
+from unique_ids import allocate_unique_ids
+from backfill import Backfill, run_backfill
+from config import BACKFILL_CHUNK_SIZE, BACKFILL_PAUSE
+
+
+def move_avatars(conn, rows):
+    """Переносит base64 аватары порции в таблицу avatars"""
+    moved = 0
+    for user_id, value in rows:
+        try:
+            content_type, data = decode_avatar(value)
+        except ValueError:
+            # Битые данные оставляем на месте, чтобы их можно было разобрать вручную
+            continue
+        digest, statement = avatar_insert(conn.dialect.name, content_type, data)
+        conn.execute(statement)
+        conn.execute(
+            text("UPDATE users SET avatar_hash = :hash, avatar = NULL WHERE id = :id"),
+            {"hash": digest, "id": user_id}
+        )
+        moved += 1
+    return moved
+
+
+def make_avatar_thumbnails(conn, rows):
+    """Заменяет сохраненные оригиналы порции на превью нужных размеров"""
+    changed = 0
+    for user_id, data in rows:
+        try:
+            (avatar_type, avatar_data), (thumb_type, thumb_data) = make_thumbnails(io.BytesIO(data))
+        except ValueError:
+            continue
+        avatar_digest, avatar_statement = avatar_insert(conn.dialect.name, avatar_type, avatar_data)
+        thumb_digest, thumb_statement = avatar_insert(conn.dialect.name, thumb_type, thumb_data)
+        conn.execute(avatar_statement)
+        conn.execute(thumb_statement)
+        conn.execute(
+            text("UPDATE users SET avatar_hash = :hash, avatar_thumb_hash = :thumb WHERE id = :id"),
+            {"hash": avatar_digest, "thumb": thumb_digest, "id": user_id}
+        )
+        changed += 1
+    return changed
+
+
+def fill_unique_ids(conn, rows):
+    """Выдает unique_id всем пользователям порции одним обращением к счетчику"""
+    unique_ids = allocate_unique_ids(conn, len(rows))
+    conn.execute(
+        text("UPDATE users SET unique_id = :unique_id WHERE id = :id"),
+        [{"id": row.id, "unique_id": unique_id} for row, unique_id in zip(rows, unique_ids)]
+    )
+    return len(rows)
+
+
+AVATARS_BACKFILL = Backfill(
+    name="users_avatar_to_avatars",
+    query=(
+        "SELECT id, avatar FROM users "
+        "WHERE avatar IS NOT NULL AND avatar <> '' AND id > :last_id "
+        "ORDER BY id LIMIT :limit"
+    ),
+    process=move_avatars,
+)
+
+AVATAR_THUMBNAILS_BACKFILL = Backfill(
+    name="users_avatar_thumbnails",
+    query=(
+        "SELECT users.id, avatars.data FROM users JOIN avatars ON avatars.hash = users.avatar_hash "
+        "WHERE users.avatar_thumb_hash IS NULL AND users.id > :last_id "
+        "ORDER BY users.id LIMIT :limit"
+    ),
+    process=make_avatar_thumbnails,
+)
+
+UNIQUE_IDS_BACKFILL = Backfill(
+    name="users_unique_id",
+    query="SELECT id FROM users WHERE unique_id IS NULL AND id > :last_id ORDER BY id LIMIT :limit",
+    process=fill_unique_ids,
+)
+
+
+def migrate_avatars(**options):
+    """Переносит base64 аватары из users.avatar в таблицу avatars"""
+    columns = {column["name"] for column in inspect(engine).get_columns("users")}
+
+    if "avatar_hash" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE users ADD COLUMN avatar_hash VARCHAR(64) REFERENCES avatars(hash)"))
+        print("✓ Добавлена колонка users.avatar_hash")
+
+    if "avatar" not in columns:
+        print("✓ Старых аватаров для переноса нет")
+        return
+
+    result = run_backfill(AVATARS_BACKFILL, **options)
+    skipped = result.scanned - result.changed
+    print(f"✓ Перенесено аватаров: {result.changed}, пропущено нераспознанных: {skipped} "
+          f"({result.rows_per_second:.0f} строк/с)")
+
+    with engine.connect() as conn:
+        remaining = conn.execute(text("SELECT COUNT(*) FROM users WHERE avatar IS NOT NULL AND avatar <> ''")).scalar()
+    if not remaining:
+        print("  Колонку users.avatar теперь можно удалить: ALTER TABLE users DROP COLUMN avatar")
+
+
+def migrate_avatar_thumbnails(**options):
+    """Делает превью для аватаров, загруженных до появления users.avatar_thumb_hash"""
+    columns = {column["name"] for column in inspect(engine).get_columns("users")}
+    if "avatar_thumb_hash" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE users ADD COLUMN avatar_thumb_hash VARCHAR(64) REFERENCES avatars(hash)"))
+        print("✓ Добавлена колонка users.avatar_thumb_hash")
+
+    result = run_backfill(AVATAR_THUMBNAILS_BACKFILL, **options)
+    skipped = result.scanned - result.changed
+    print(f"✓ Превью аватаров: {result.changed}, пропущено нераспознанных: {skipped} "
+          f"({result.rows_per_second:.0f} строк/с)")
+    if result.changed:
+        print("  Оригиналы без ссылок можно удалить: DELETE FROM avatars WHERE hash NOT IN "
+              "(SELECT avatar_hash FROM users WHERE avatar_hash IS NOT NULL "
+              "UNION SELECT avatar_thumb_hash FROM users WHERE avatar_thumb_hash IS NOT NULL)")
+
+
+def migrate_unique_ids(**options):
+    """Выдает unique_id пользователям, у которых его нет"""
+    result = run_backfill(UNIQUE_IDS_BACKFILL, **options)
+    if result.changed:
+        print(f"✓ Добавлено unique_id: {result.changed} ({result.rows_per_second:.0f} строк/с)")
+    else:
+        print("✓ Все пользователи уже имеют unique_id")
+
+
+def migrate_project_search():
+    """
+    Полнотекстовый индекс проектов для уже существующей таблицы.
+    В PostgreSQL добавление генерируемой колонки переписывает таблицу под
+    блокировкой, на большой таблице это лучше делать в окно обслуживания
+    """
+    statements = PROJECT_SEARCH_DDL.get(engine.dialect.name)
+    if not statements:
+        return
+    with engine.begin() as conn:
+        fts_exists = engine.dialect.name == "sqlite" and conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'projects_fts'"
+        )).first() is not None
+        for statement in statements:
+            conn.execute(text(statement))
+        if engine.dialect.name == "sqlite" and not fts_exists:
+            # Таблица FTS5 с внешним содержимым заполняется из projects одной командой
+            conn.execute(text("INSERT INTO projects_fts (projects_fts) VALUES ('rebuild')"))
+    print("✓ Индекс для поиска проектов создан")
+
+
+def migrate_unique_nicknames():
+    """
+    Уникальный индекс ix_users_nickname вместо обычного: регистрация больше не
+    проверяет никнейм запросом, повтор отклоняет БД
+    """
+    with engine.begin() as conn:
+        indexes = {index["name"]: index for index in inspect(conn).get_indexes("users")}
+        if indexes.get("ix_users_nickname", {}).get("unique"):
+            return
+        duplicates = conn.execute(text(
+            "SELECT nickname FROM users GROUP BY nickname HAVING COUNT(*) > 1 LIMIT 10"
+        )).scalars().all()
+        if duplicates:
+            # Переименовывать пользователей автоматически нельзя - это решает администратор
+            print(f"✗ Никнеймы повторяются ({', '.join(duplicates)}), уникальный индекс не создан")
+            return
+        conn.execute(text("DROP INDEX IF EXISTS ix_users_nickname"))
+        conn.execute(text("CREATE UNIQUE INDEX ix_users_nickname ON users (nickname)"))
+    print("✓ Уникальный индекс никнеймов создан")
+
+
+def migrate_database(chunk_size: int = BACKFILL_CHUNK_SIZE, pause: float = BACKFILL_PAUSE, restart: bool = False):
     """Выполняет миграцию базы данных"""
     print("Начинаем миграцию базы данных...")
-    
+
     # Создаем все таблицы (включая новые)
     Base.metadata.create_all(bind=engine)
     print("✓ Таблицы созданы/обновлены")
-    
-    # Проверяем, нужно ли добавить unique_id для существующих пользователей
-    db = SessionLocal()
+
+    # Триграммные индексы для поиска создаются вместе с таблицей,
+    # для уже существующей таблицы users создаем их отдельно
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for statement in USER_SEARCH_DDL:
+                conn.execute(text(statement))
+        print("✓ Индексы для поиска пользователей созданы")
+
+    # create_all не добавляет индексы к уже существующим таблицам
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_projects_owner_created_id ON projects (owner_id, created_at, id)"
+        ))
+    print("✓ Индекс для страниц проектов создан")
+
+    migrate_project_search()
+    migrate_unique_nicknames()
+
+    options = {"chunk_size": chunk_size, "pause": pause, "restart": restart}
     try:
-        users_without_unique_id = db.query(User).filter(User.unique_id.is_(None)).all()
-        
-        if users_without_unique_id:
-            print(f"Найдено {len(users_without_unique_id)} пользователей без unique_id")
-            
-            for user in users_without_unique_id:
-                user.unique_id = generate_unique_id(db)
-                print(f"✓ Добавлен unique_id для пользователя {user.nickname}: {user.unique_id}")
-            
-            db.commit()
-            print("✓ Все unique_id добавлены")
-        else:
-            print("✓ Все пользователи уже имеют unique_id")
-            
+        # Аватары переносим первыми: модель User уже ожидает колонку avatar_hash
+        migrate_avatars(**options)
+        migrate_avatar_thumbnails(**options)
+        migrate_unique_ids(**options)
     except Exception as e:
+        # Обработанные порции уже сохранены, повторный запуск продолжит с места ошибки
         print(f"Ошибка при миграции: {e}")
-        db.rollback()
-    finally:
-        db.close()
-    
+        print("Запустите миграцию еще раз, она продолжится с последней сохраненной порции")
+        raise SystemExit(1)
+
     print("Миграция завершена успешно!")
 
 if __name__ == "__main__":
-    migrate_database()
-
+    parser = argparse.ArgumentParser(description="Миграция базы данных")
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE)
+    parser.add_argument("--pause", type=float, default=BACKFILL_PAUSE)
+    parser.add_argument("--restart", action="store_true")
+    args = parser.parse_args()
+    migrate_database(chunk_size=args.chunk_size, pause=args.pause, restart=args.restart)
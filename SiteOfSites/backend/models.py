@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Boolean, String, DateTime, Text, ForeignKey, LargeBinary, Sequence, Index, DDL, event
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -8,16 +8,45 @@ class User(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     unique_id = Column(String(10), index=True, unique=True, nullable=False)
-    nickname = Column(String(20), index=True, nullable=False)
+    nickname = Column(String(20), index=True, unique=True, nullable=False)
     email = Column(String(100), index=True, unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
-    avatar = Column(Text, nullable=True)  # Будем хранить base64 изображение
+    avatar_hash = Column(String(64), ForeignKey("avatars.hash"), nullable=True)  # sha256 картинки из таблицы avatars
+    avatar_thumb_hash = Column(String(64), ForeignKey("avatars.hash"), nullable=True)  # маленькое превью
     description = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Связь с проектами
     projects = relationship("Project", back_populates="owner")
 
+    @property
+    def avatar(self):
+        """Короткая ссылка на аватар вместо самой картинки"""
+        if self.avatar_hash is None:
+            return None
+        return f"/api/avatars/{self.avatar_hash}"
+
+    @property
+    def avatar_thumb(self):
+        """Ссылка на маленькое превью для поиска и списков"""
+        if self.avatar_thumb_hash is None:
+            return self.avatar
+        return f"/api/avatars/{self.avatar_thumb_hash}"
+
+# Триграммные индексы для поиска по подстроке (ILIKE '%q%') в PostgreSQL.
+# Обычные B-tree индексы для такого поиска не используются. B-tree индексы
+# выражений - для точного unique_id, префикса никнейма и обхода в порядке никнеймов
+USER_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_users_nickname_trgm ON users USING gin (lower(nickname) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_users_unique_id_trgm ON users USING gin (lower(unique_id) gin_trgm_ops)",
+    'CREATE INDEX IF NOT EXISTS ix_users_nickname_lower ON users (lower(nickname) COLLATE "C")',
+    "CREATE INDEX IF NOT EXISTS ix_users_unique_id_lower ON users (lower(unique_id))",
+]
+
+for statement in USER_SEARCH_DDL:
+    event.listen(User.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
 class Project(Base):
     __tablename__ = "projects"
 
@@ -29,3 +58,85 @@ class Project(Base):
     
     # Связь с пользователем
     owner = relationship("User", back_populates="projects")
+
+    # Страницы проектов пользователя (pagination.py) читаются по этому индексу без сортировки
+    __table_args__ = (
+        Index("ix_projects_owner_created_id", "owner_id", "created_at", "id"),
+    )
+
+
+class Avatar(Base):
+    """Картинки аватаров, адресуемые по sha256 от содержимого"""
+    __tablename__ = "avatars"
+
+    hash = Column(String(64), primary_key=True)
+    content_type = Column(String(50), nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# Счетчик номеров для unique_id (см. unique_ids.py). В PostgreSQL это последовательность,
+# в БД без последовательностей (SQLite) - строка в таблице id_counters
+user_unique_id_seq = Sequence("user_unique_id_seq", metadata=Base.metadata)
+
+
+class IdCounter(Base):
+    __tablename__ = "id_counters"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+
+class BackfillCheckpoint(Base):
+    """Прогресс пакетных миграций (см. backfill.py)"""
+    __tablename__ = "backfill_checkpoints"
+
+    name = Column(String(100), primary_key=True)
+    last_id = Column(BigInteger, nullable=False, default=0)  # последний обработанный id
+    rows_done = Column(BigInteger, nullable=False, default=0)
+    finished = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class Event(Base):
+    """Outbox событий об изменении профилей и проектов (events.py), пишется в транзакции изменения"""
+    __tablename__ = "events"
+
+    # BigInteger в SQLite не становится псевдонимом rowid и не получает автоинкремент
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    kind = Column(String(30), nullable=False)  # user.updated, project.created, project.updated, project.deleted
+    user_id = Column(Integer, nullable=False)  # чей профиль или проект изменился
+    payload = Column(Text, nullable=False)  # JSON данных события
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+# Полнотекстовый поиск проектов (project_search.py). Индекс обновляет сама БД при
+# каждом INSERT/UPDATE/DELETE, в том числе при пакетных изменениях.
+# PostgreSQL: генерируемая колонка tsvector (название с весом A, описание с весом B) и GIN индекс.
+# Конфигурация russian стеммит русские слова, латиницу - как английские
+PROJECT_SEARCH_DDL = {
+    "postgresql": [
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(description, '')), 'B')) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_projects_search_vector ON projects USING gin (search_vector)",
+    ],
+    # SQLite: FTS5 с внешним содержимым (текст хранится только в projects) и триггеры
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS projects_fts USING fts5("
+        "title, description, content='projects', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        "CREATE TRIGGER IF NOT EXISTS projects_fts_insert AFTER INSERT ON projects BEGIN "
+        "INSERT INTO projects_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS projects_fts_delete AFTER DELETE ON projects BEGIN "
+        "INSERT INTO projects_fts (projects_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS projects_fts_update AFTER UPDATE OF title, description ON projects BEGIN "
+        "INSERT INTO projects_fts (projects_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO projects_fts (rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    ],
+}
+
+for dialect, statements in PROJECT_SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(Project.__table__, "after_create", DDL(statement).execute_if(dialect=dialect))
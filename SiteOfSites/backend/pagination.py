@@ -0,0 +1,71 @@
+"""
+Постраничная выдача по ключу (keyset pagination).
+Записи идут от новых к старым в порядке (created_at, id), следующая страница
+выбирается условием (created_at, id) < последней записи, а не OFFSET,
+поэтому стоимость запроса не зависит от номера страницы.
+
+Курсор непрозрачен для клиента: это base64 от created_at и id последней записи.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import DateTime, Select, func, literal, select, tuple_
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Время из курсора в том же виде, в каком SQLite сохраняет CURRENT_TIMESTAMP
+CURSOR_TIMESTAMP = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite"
+)
+
+
+def encode_cursor(row) -> str:
+    payload = json.dumps({"c": row.created_at.isoformat(), "i": row.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Возвращает (created_at, id) из курсора или бросает ValueError"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        created_at, last_id = datetime.fromisoformat(payload["c"]), payload["i"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+        raise ValueError('Некорректный курсор')
+    if not isinstance(last_id, int):
+        raise ValueError('Некорректный курсор')
+    return created_at, last_id
+
+
+def keyset_page(statement: Select, model, cursor: Optional[str], limit: int) -> Select:
+    """Добавляет к запросу условие курсора, порядок и limit + 1 (чтобы узнать, есть ли еще)"""
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        # created_at последней записи берем из самой БД: в SQLite время хранится строкой,
+        # и значение из курсора не всегда совпадает с ней побайтно.
+        # Значение из курсора нужно, только если запись уже удалили
+        boundary = func.coalesce(
+            select(model.created_at).where(model.id == last_id).scalar_subquery(),
+            literal(created_at, CURSOR_TIMESTAMP)
+        )
+        # Сравнение строк (created_at, id) < (...) идет по диапазону индекса,
+        # в отличие от равносильного условия через OR
+        statement = statement.where(tuple_(model.created_at, model.id) < tuple_(boundary, last_id))
+    return statement.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+
+def split_page(rows: List, limit: int) -> Tuple[List, Optional[str]]:
+    """Отрезает лишнюю строку и возвращает (элементы, курсор следующей страницы)"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+
+async def fetch_page(db: AsyncSession, statement: Select, model, cursor: Optional[str], limit: int):
+    result = await db.execute(keyset_page(statement, model, cursor, limit))
+    return split_page(list(result.scalars()), limit)
@@ -0,0 +1,44 @@
+"""
+Хеширование паролей Argon2.
+
+Эти функции выполняются в процессах пула PasswordHashingService (security.py),
+а каждый процесс импортирует модуль функции заново. Поэтому здесь только
+argon2 и настройки, без FastAPI и SQLAlchemy: процесс пула стартует за
+десятки миллисекунд, а не за секунду.
+"""
+
+import os
+from typing import Optional, Tuple
+
+from argon2 import PasswordHasher, exceptions
+
+from config import ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM
+
+ph = PasswordHasher(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM
+)
+
+def hash_password(plain_password: str) -> str:
+    return ph.hash(plain_password)
+
+def verify_password(plain_password: str, password_hash: str) -> bool:
+    try:
+        return ph.verify(password_hash, plain_password)
+    except exceptions.VerifyMismatchError:
+        return False
+    except Exception:
+        return False
+
+def verify_and_rehash(plain_password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+    """Проверяет пароль и возвращает новый хеш, если параметры старого устарели"""
+    if not verify_password(plain_password, password_hash):
+        return False, None
+    if ph.check_needs_rehash(password_hash):
+        return True, ph.hash(plain_password)
+    return True, None
+
+def worker_ready() -> int:
+    """Пустая задача для запуска процессов пула заранее"""
+    return os.getpid()
@@ -0,0 +1,53 @@
+"""
+Кэш аутентифицированных пользователей.
+get_current_user берет отсюда только то, что нужно для авторизации,
+и не обращается к таблице users на каждый запрос.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+from metrics import Gauge, registry
+from models import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    nickname: str
+    unique_id: str
+
+
+principal_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+registry.register(Gauge("auth_cache_hits_total", "Пользователи, найденные в кэше авторизации",
+                        lambda: principal_cache.hits, kind="counter"))
+registry.register(Gauge("auth_cache_misses_total", "Пользователи, загруженные из БД при авторизации",
+                        lambda: principal_cache.misses, kind="counter"))
+
+
+async def load_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    result = await db.execute(
+        select(User.id, User.email, User.nickname, User.unique_id).where(User.id == user_id)
+    )
+    row = result.first()
+    if row is None:
+        return None
+
+    principal = Principal(*row)
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+def invalidate_principal(user_id: int):
+    """Вызывается при любом изменении пользователя"""
+    principal_cache.pop(user_id)
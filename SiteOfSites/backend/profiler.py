@@ -0,0 +1,69 @@
+"""
+Профилирование отдельных запросов (cProfile) по требованию.
+
+Запрос профилируется, если:
+- в нем есть заголовок X-Profile со значением PROFILER_TOKEN (пустой токен отключает заголовок)
+- или он попал в выборку PROFILER_SAMPLE_RATE (доля запросов, по умолчанию 0)
+
+Профиль пишется в PROFILER_DIR файлом .prof, имя файла возвращается в заголовке
+X-Profile-File. Смотреть: python -m pstats profiles/<файл> или snakeviz.
+
+cProfile видит всё, что выполняется в потоке event loop, пока он включен, то есть
+и другие запросы, обрабатываемые в это время, но не код в пуле потоков (sync
+зависимости, run_in_executor). Поэтому одновременно профилируется не больше
+одного запроса на процесс, а профиль лучше снимать на малонагруженном воркере.
+
+Когда профилирование выключено, MetricsMiddleware проверяет только profiler.enabled.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import os
+import random
+import re
+import time
+from typing import Optional, Tuple
+
+from config import PROFILER_DIR, PROFILER_SAMPLE_RATE, PROFILER_TOKEN
+
+PROFILE_HEADER = b"x-profile"
+UNSAFE_CHARS_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class RequestProfiler:
+    def __init__(self, directory: str, sample_rate: float, token: str):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.token = token.encode()
+        self.enabled = bool(token) or sample_rate > 0
+        self.active = False
+        self.count = 0  # номер профиля в имени файла, чтобы имена не совпадали в пределах секунды
+
+    def _requested(self, scope) -> bool:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, scope) -> Optional[Tuple[cProfile.Profile, str]]:
+        """Включает профилирование, если запрос его просит; возвращает (профиль, имя файла)"""
+        if self.active or not self._requested(scope):
+            return None
+        self.active = True
+        self.count += 1
+        path = UNSAFE_CHARS_RE.sub("_", scope["path"]).strip("_")[:80] or "root"
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{path}-{os.getpid()}-{self.count}.prof"
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile, filename
+
+    async def finish(self, profile: cProfile.Profile, filename: str):
+        profile.disable()
+        self.active = False
+        os.makedirs(self.directory, exist_ok=True)
+        await asyncio.to_thread(profile.dump_stats, os.path.join(self.directory, filename))
+
+
+profiler = RequestProfiler(PROFILER_DIR, PROFILER_SAMPLE_RATE, PROFILER_TOKEN)
@@ -0,0 +1,156 @@
+"""
+Профили пользователей для публичных страниц.
+Профиль собирается фиксированным числом запросов (всегда два):
+пользователь вместе с числом его проектов и первая страница проектов.
+
+Готовый JSON профиля кэшируется вместе с ETag, поэтому повторные просмотры
+и запросы с If-None-Match обслуживаются без обращения к БД.
+
+Несколько пользователей сразу (GET /api/users) загружает lookup_users - одним
+запросом IN вместо запроса на каждого.
+
+Профиль, прочитанный с реплики вскоре после изменения, может быть старым,
+поэтому такие ответы не кэшируются (см. replicas.py).
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from cache import TTLCache
+from metrics import Gauge, registry
+from config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL, PROJECTS_PAGE_SIZE, REPLICA_PIN_SECONDS
+from models import Project, User
+from pagination import fetch_page
+from schemas import ProjectResponse, UserResponse, UserWithProjects
+
+projects_count = (
+    select(func.count(Project.id))
+    .where(Project.owner_id == User.id)
+    .correlate(User)
+    .scalar_subquery()
+)
+
+
+async def load_profile(db: AsyncSession, *criteria) -> Optional[UserWithProjects]:
+    """Загружает профиль пользователя, подходящего под условия (например, User.id == 1)"""
+    result = await db.execute(select(User, projects_count.label("projects_count")).where(*criteria))
+    row = result.first()
+    if row is None:
+        return None
+    user, count = row
+
+    projects, next_cursor = await fetch_page(
+        db, select(Project).where(Project.owner_id == user.id), Project, None, PROJECTS_PAGE_SIZE
+    )
+    return UserWithProjects(
+        **UserResponse.model_validate(user).model_dump(),
+        projects=[ProjectResponse.model_validate(project) for project in projects],
+        projects_count=count,
+        projects_next_cursor=next_cursor,
+    )
+
+
+# Колонки для краткого вида (UserSearchResult), без описания и хеша пароля
+LITE_COLUMNS = (User.id, User.unique_id, User.nickname, User.avatar_hash, User.avatar_thumb_hash)
+
+
+async def lookup_users(db: AsyncSession, column, keys: Sequence, lite: bool = True) -> Tuple[List[User], List]:
+    """
+    Пользователи, у которых column (User.id или User.unique_id) входит в keys,
+    в порядке keys без повторов, и ключи, для которых пользователя нет
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return [], []
+    statement = select(User).where(column.in_(keys))
+    if lite:
+        statement = statement.options(load_only(*LITE_COLUMNS))
+    result = await db.execute(statement)
+    found = {getattr(user, column.key): user for user in result.scalars()}
+    return [found[key] for key in keys if key in found], [key for key in keys if key not in found]
+
+
+@dataclass(frozen=True)
+class CachedProfile:
+    user_id: int
+    etag: str
+    body: bytes
+
+
+class ProfileCache:
+    """
+    Готовые ответы профилей по id пользователя.
+
+    Любое изменение профиля или проектов вызывает bump(): запись удаляется,
+    а номер изменения запоминается. Ответ, собранный до изменения, в кэш
+    уже не попадет (put сравнивает номер, взятый перед загрузкой).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.responses = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.user_ids = TTLCache(maxsize=maxsize, ttl=ttl)  # unique_id -> id, unique_id не меняется
+        self._bumped = TTLCache(maxsize=maxsize, ttl=ttl)   # id -> номер последнего изменения
+        self._recent = TTLCache(maxsize=maxsize, ttl=REPLICA_PIN_SECONDS)  # id, измененные недавно для реплик
+        self.version = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+
+    def get(self, user_id: Optional[int]) -> Optional[CachedProfile]:
+        if user_id is None:
+            return None
+        return self.responses.get(user_id)
+
+    def put(self, profile: UserWithProjects, since: int, from_replica: bool = False) -> CachedProfile:
+        """
+        Сохраняет ответ, если с момента since профиль не менялся, а при чтении
+        с реплики - если он не менялся последние REPLICA_PIN_SECONDS
+        """
+        body = profile.model_dump_json().encode()
+        entry = CachedProfile(
+            user_id=profile.id,
+            etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"',
+            body=body,
+        )
+        self.user_ids.set(profile.unique_id, profile.id)
+        if from_replica and self._recent.get(profile.id):
+            return entry
+        if self._bumped.get(profile.id, 0) <= since:
+            self.responses.set(profile.id, entry)
+        return entry
+
+    def bump(self, user_id: int):
+        self.version += 1
+        self._bumped.set(user_id, self.version)
+        self._recent.set(user_id, True)
+        self.responses.pop(user_id)
+
+    def record_not_modified(self, entry: CachedProfile):
+        self.not_modified += 1
+        self.bytes_saved += len(entry.body)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.responses),
+            "hits": self.responses.hits,
+            "misses": self.responses.misses,
+            "hit_ratio": round(self.responses.hit_ratio, 4),
+            "not_modified": self.not_modified,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+profile_cache = ProfileCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL)
+
+registry.register(Gauge("profile_cache_hits_total", "Ответы профилей из кэша",
+                        lambda: profile_cache.responses.hits, kind="counter"))
+registry.register(Gauge("profile_cache_misses_total", "Профили, загруженные из БД",
+                        lambda: profile_cache.responses.misses, kind="counter"))
+registry.register(Gauge("profile_cache_not_modified_total", "Ответы 304 на запросы профилей",
+                        lambda: profile_cache.not_modified, kind="counter"))
+registry.register(Gauge("profile_cache_bytes_saved_total", "Байты, которые не пришлось отправлять благодаря 304",
+                        lambda: profile_cache.bytes_saved, kind="counter"))
@@ -0,0 +1,117 @@
+"""
+Пакетное изменение проектов (POST /api/projects/batch).
+
+Весь пакет выполняется фиксированным числом запросов в одной транзакции,
+сколько бы операций в нем ни было:
+1. один INSERT ... RETURNING для всех новых проектов
+2. один UPDATE ... SET title = CASE id ... RETURNING для измененных
+3. один DELETE ... WHERE id IN (...) RETURNING для удаленных
+4. один INSERT событий об изменениях (events.py)
+
+Владелец проверяется в WHERE самих UPDATE и DELETE, как в PUT и DELETE
+/api/projects/{id}: проект, которого нет в RETURNING, чужой или удален, и
+операция получает 404. Результат возвращается по каждой операции в порядке
+запроса, остальные операции применяются.
+"""
+
+from typing import List
+
+from sqlalchemy import case, delete, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from events import record_event
+from models import Project
+from schemas import ProjectBatchOperation, ProjectResponse
+
+EVENT_KINDS = {"create": "project.created", "update": "project.updated", "delete": "project.deleted"}
+
+
+def _project(project_id: int, operation: ProjectBatchOperation, owner_id: int, created_at) -> dict:
+    return {
+        "id": project_id,
+        "title": operation.title,
+        "description": operation.description,
+        "owner_id": owner_id,
+        "created_at": created_at,
+    }
+
+
+async def apply_project_batch(db: AsyncSession, owner_id: int, operations: List[ProjectBatchOperation]) -> List[dict]:
+    """Применяет операции пакета и возвращает результат по каждой"""
+    results: List[dict] = [{} for _ in operations]
+
+    creates, updates, deletes = [], [], []
+    touched = set()
+    for index, operation in enumerate(operations):
+        if operation.op == "create":
+            creates.append(index)
+            continue
+        if operation.id in touched:
+            # Операции применяются сгруппированными по типу, а не по порядку, поэтому один проект - одна операция
+            results[index] = {"op": operation.op, "id": operation.id, "status": 409,
+                              "detail": "Проект уже изменен в этом пакете"}
+            continue
+        touched.add(operation.id)
+        (updates if operation.op == "update" else deletes).append(index)
+
+    if creates:
+        values = [
+            {"title": operations[index].title, "description": operations[index].description, "owner_id": owner_id}
+            for index in creates
+        ]
+        if db.get_bind().dialect.name == "sqlite":
+            # Для SQLite SQLAlchemy не умеет сопоставлять RETURNING с параметрами и при
+            # sort_by_parameter_order вставлял бы по строке. Одна вставка в SQLite выдает
+            # id по возрастанию в порядке VALUES, поэтому достаточно отсортировать по id
+            created = await db.execute(insert(Project).returning(Project.id, Project.created_at), values)
+            created_rows = sorted(created.all())
+        else:
+            created = await db.execute(
+                insert(Project).returning(Project.id, Project.created_at, sort_by_parameter_order=True), values
+            )
+            created_rows = created.all()
+        for index, (project_id, created_at) in zip(creates, created_rows):
+            results[index] = {"op": "create", "id": project_id, "status": 201,
+                              "project": _project(project_id, operations[index], owner_id, created_at)}
+
+    if updates:
+        changes = {operations[index].id: operations[index] for index in updates}
+        updated = await db.execute(
+            update(Project)
+            .where(Project.id.in_(changes), Project.owner_id == owner_id)
+            .values(
+                title=case({project_id: change.title for project_id, change in changes.items()}, value=Project.id),
+                description=case({project_id: change.description for project_id, change in changes.items()},
+                                 value=Project.id),
+            )
+            .returning(Project.id, Project.created_at)
+        )
+        created_at = dict(updated.all())
+        for index in updates:
+            operation = operations[index]
+            if operation.id in created_at:
+                results[index] = {"op": "update", "id": operation.id, "status": 200,
+                                  "project": _project(operation.id, operation, owner_id, created_at[operation.id])}
+
+    if deletes:
+        deleted = set(await db.scalars(
+            delete(Project)
+            .where(Project.id.in_([operations[index].id for index in deletes]), Project.owner_id == owner_id)
+            .returning(Project.id)
+        ))
+        for index in deletes:
+            if operations[index].id in deleted:
+                results[index] = {"op": "delete", "id": operations[index].id, "status": 200}
+
+    for index in (*updates, *deletes):
+        if not results[index]:
+            # Ни одной строки в RETURNING - проекта нет или он чужой
+            results[index] = {"op": operations[index].op, "id": operations[index].id, "status": 404,
+                              "detail": "Проект не найден"}
+
+    for result in results:
+        if result["status"] < 300:
+            data = ProjectResponse.model_validate(result["project"]) if "project" in result else {"id": result["id"]}
+            record_event(db, EVENT_KINDS[result["op"]], owner_id, data)
+    await db.commit()
+    return results
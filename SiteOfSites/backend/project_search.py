@@ -0,0 +1,223 @@
+"""
+Полнотекстовый поиск проектов по названию и описанию (GET /api/projects/search).
+
+Индекс ведет сама БД (models.PROJECT_SEARCH_DDL), поэтому он меняется вместе
+с каждым созданием, изменением и удалением проекта:
+- PostgreSQL: колонка search_vector (tsvector) с GIN индексом, оценка ts_rank_cd
+- SQLite: таблица FTS5 projects_fts с триггерами, оценка bm25
+
+Все слова запроса должны встретиться, последнее ищется по префиксу (поиск по
+мере ввода). Страницы выбираются по ключу (оценка, id), как в pagination.py,
+без OFFSET. Владелец (nickname, unique_id) приходит тем же запросом через JOIN.
+
+Порядок выдачи (sort):
+- relevance (по умолчанию) - все совпадения по оценке. Страница - top-N
+  сортировка id и оценок с LIMIT, строки проектов читаются только для нее, но
+  оценка считается для каждого совпадения, поэтому время растет с их числом
+  (частое слово или короткий префикс)
+- recent - совпадения окнами по PROJECT_SEARCH_MAX_CANDIDATES, от новых к
+  старым, по оценке внутри окна. Когда окно пролистано, следующие страницы
+  идут из следующего окна (id меньше самого старого в предыдущем), граница
+  окна хранится в курсоре. Оценивается только окно: в SQLite FTS5 отдает
+  совпадения в порядке rowid, и ORDER BY rowid DESC LIMIT читает только его,
+  в PostgreSQL GIN индекс отдает совпадения без порядка, и окно - top-N
+  сортировка id всех совпадений, а ts_rank_cd считается только для окна
+
+bm25 в SQLite зависит от статистики всего индекса, поэтому при изменении
+проектов между страницами порядок может немного сдвинуться.
+"""
+
+import base64
+import binascii
+import json
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Integer, Select, column, func, literal_column, select, table, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import PROJECT_SEARCH_MAX_CANDIDATES
+from models import Project, User
+
+TERM_RE = re.compile(r"\w+")
+MAX_TERMS = 8
+
+# Конфигурация должна совпадать с той, что в генерируемой колонке search_vector
+TS_CONFIG = literal_column("'russian'::regconfig")
+SEARCH_VECTOR = literal_column("projects.search_vector")
+PROJECTS_FTS = table("projects_fts", column("rowid", Integer))
+FTS_TABLE = literal_column("projects_fts")  # имя таблицы как аргумент MATCH и bm25
+# Название важнее описания: в PostgreSQL вес A против B, в bm25 - веса колонок
+FTS_TITLE_WEIGHT = 2.5
+FTS_DESCRIPTION_WEIGHT = 1.0
+
+
+def query_terms(q: str) -> List[str]:
+    """Слова запроса без операторов и кавычек, чтобы пользователь не мог сломать синтаксис"""
+    return TERM_RE.findall(q.lower())[:MAX_TERMS]
+
+
+def tsquery_text(terms: List[str]) -> str:
+    return " & ".join(terms[:-1] + [terms[-1] + ":*"])
+
+
+def fts5_query_text(terms: List[str]) -> str:
+    return " ".join(f'"{term}"' for term in terms) + "*"
+
+
+def encode_cursor(row, window: Optional[int] = None, max_candidates: Optional[int] = None) -> str:
+    payload = {"s": row.score, "i": row.id}
+    if max_candidates is not None:
+        # sort=recent: w - граница окна строки, e - граница следующего окна, если окно строки заполнено целиком
+        payload["w"] = window
+        payload["e"] = row.window_start if row.window_size >= max_candidates else None
+    payload = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, windowed: bool) -> Tuple[Optional[int], Optional[int], float, int]:
+    """
+    Возвращает (граница окна, граница следующего окна, оценка, id) из курсора
+    или бросает ValueError. windowed - курсор sort=recent, с границами окон
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        score, last_id = payload["s"], payload["i"]
+        if windowed:
+            window, next_window = payload["w"], payload["e"]
+        elif "w" in payload:
+            raise ValueError  # курсор от другого порядка выдачи
+        else:
+            window, next_window = None, None
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+        raise ValueError('Некорректный курсор')
+    if (not isinstance(score, (int, float)) or not isinstance(last_id, int)
+            or not all(value is None or isinstance(value, int) for value in (window, next_window))):
+        raise ValueError('Некорректный курсор')
+    return window, next_window, float(score), last_id
+
+
+def relevance_statement(dialect: str, terms: List[str], after: Optional[Tuple[float, int]], limit: int) -> Select:
+    """
+    limit самых релевантных совпадений после ключа after (оценка, id) с
+    владельцем. Сначала top-N сортировкой выбираются только id и оценки, и
+    строки проектов и владельцев читаются для limit найденных, а не для всех
+    """
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery(TS_CONFIG, tsquery_text(terms))
+        matches = select(Project.id, (-func.ts_rank_cd(SEARCH_VECTOR, tsquery)).label("score")).where(
+            SEARCH_VECTOR.op("@@")(tsquery)
+        )
+    else:
+        matches = (
+            select(PROJECTS_FTS.c.rowid.label("id"),
+                   func.bm25(FTS_TABLE, FTS_TITLE_WEIGHT, FTS_DESCRIPTION_WEIGHT).label("score"))
+            .select_from(PROJECTS_FTS)
+            .where(FTS_TABLE.op("MATCH")(fts5_query_text(terms)))
+        )
+    matches = matches.subquery("matches")
+    ranked = select(matches.c.id, matches.c.score)
+    if after is not None:
+        ranked = ranked.where(tuple_(matches.c.score, matches.c.id) > tuple_(*after))
+    ranked = ranked.order_by(matches.c.score, matches.c.id).limit(limit).subquery("ranked")
+    return (
+        select(
+            Project.id, Project.title, Project.description, Project.owner_id, Project.created_at,
+            User.nickname.label("owner_nickname"), User.unique_id.label("owner_unique_id"), ranked.c.score,
+        )
+        .select_from(ranked)
+        .join(Project, Project.id == ranked.c.id)
+        .join(User, User.id == Project.owner_id)
+        .order_by(ranked.c.score, ranked.c.id)
+    )
+
+
+def search_statement(dialect: str, terms: List[str], max_candidates: int,
+                     window: Optional[int] = None) -> Tuple[Select, object]:
+    """
+    Запрос совпадений окна (max_candidates самых новых с id меньше window) с
+    владельцем и выражение оценки (меньше - релевантнее) для sort=recent. В каждой
+    строке также самый старый id окна (window_start) и число совпадений в нем (window_size)
+    """
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery(TS_CONFIG, tsquery_text(terms))
+        candidates = select(Project.id).where(SEARCH_VECTOR.op("@@")(tsquery))
+        candidate_id = Project.id
+    else:
+        candidates = (
+            select(PROJECTS_FTS.c.rowid.label("id"),
+                   func.bm25(FTS_TABLE, FTS_TITLE_WEIGHT, FTS_DESCRIPTION_WEIGHT).label("score"))
+            .select_from(PROJECTS_FTS)
+            .where(FTS_TABLE.op("MATCH")(fts5_query_text(terms)))
+        )
+        candidate_id = PROJECTS_FTS.c.rowid
+    if window is not None:
+        candidates = candidates.where(candidate_id < window)
+    candidates = candidates.order_by(candidate_id.desc()).limit(max_candidates).subquery("candidates")
+    # Границы окна считаются до фильтра по курсору, поэтому видны на любой странице
+    windowed = select(
+        *candidates.c,
+        func.min(candidates.c.id).over().label("window_start"),
+        func.count().over().label("window_size"),
+    ).subquery("windowed")
+
+    if dialect == "postgresql":
+        score = -func.ts_rank_cd(SEARCH_VECTOR, tsquery)
+    else:
+        score = windowed.c.score
+    statement = (
+        select(
+            Project.id, Project.title, Project.description, Project.owner_id, Project.created_at,
+            User.nickname.label("owner_nickname"), User.unique_id.label("owner_unique_id"),
+            score.label("score"), windowed.c.window_start, windowed.c.window_size,
+        )
+        .select_from(windowed)
+        .join(Project, Project.id == windowed.c.id)
+        .join(User, User.id == Project.owner_id)
+    )
+    return statement, score
+
+
+async def search_projects(
+    db: AsyncSession, q: str, cursor: Optional[str], limit: int, sort: str = "relevance",
+    max_candidates: int = PROJECT_SEARCH_MAX_CANDIDATES
+) -> Tuple[List, Optional[str]]:
+    """Страница найденных проектов и курсор следующей, sort - relevance или recent"""
+    terms = query_terms(q)
+    if not terms:
+        return [], None
+
+    dialect = db.get_bind().dialect.name
+    window, after = None, None
+    if cursor:
+        window, next_window, last_score, last_id = decode_cursor(cursor, sort == "recent")
+        after = (next_window, (last_score, last_id))
+
+    if sort == "relevance":
+        result = await db.execute(relevance_statement(
+            dialect, terms, after[1] if after is not None else None, limit + 1
+        ))
+        rows = result.all()
+        if len(rows) > limit:
+            return rows[:limit], encode_cursor(rows[limit - 1])
+        return rows, None
+
+    rows, windows = [], []  # строки страницы и окна, из которых они взяты
+    while True:
+        statement, score = search_statement(dialect, terms, max_candidates, window)
+        if after is not None:
+            statement = statement.where(tuple_(score, Project.id) > tuple_(*after[1]))
+        result = await db.execute(statement.order_by(score, Project.id).limit(limit + 1 - len(rows)))
+        found = result.all()
+        rows += found
+        windows += [window] * len(found)
+        if len(rows) > limit:
+            return rows[:limit], encode_cursor(rows[limit - 1], windows[limit - 1], max_candidates)
+        # Окно пролистано: страница продолжается следующим окном, если это окно было полным
+        if found:
+            next_window = found[0].window_start if found[0].window_size >= max_candidates else None
+        else:
+            next_window = after[0] if after is not None else None
+        if next_window is None:
+            return rows, None
+        window, after = next_window, None
@@ -0,0 +1,80 @@
+"""
+Чтение с реплик и read-your-writes.
+
+Если заданы DATABASE_REPLICA_URLS, запросы GET/HEAD получают сессию, которая
+читает с реплики (database.read_session), остальные работают с основной БД.
+
+Реплика отстает от основной БД, поэтому клиент, который только что что-то
+изменил, на REPLICA_PIN_SECONDS "прикрепляется" к основной БД: ответ на
+успешный изменяющий запрос ставит cookie db_primary_until со временем
+окончания, и GET с этой cookie читает из основной БД. Cookie видна всем
+воркерам, в отличие от состояния в памяти процесса.
+
+Кэши профилей и поиска сбрасываются при записи, но соседний запрос может
+сразу же заполнить их старыми данными с реплики. Поэтому результат, прочитанный
+с реплики, не кэшируется, если запись сбрасывалась меньше REPLICA_PIN_SECONDS назад.
+"""
+
+import time
+
+from fastapi import Request
+
+from config import REPLICA_PIN_SECONDS
+from database import replica_engines
+from metrics import Counter, registry
+
+PIN_COOKIE = "db_primary_until"
+READ_METHODS = {"GET", "HEAD"}
+
+replica_reads = registry.register(Counter(
+    "db_replica_reads_total", "Запросы, которые читали с реплики"
+))
+pinned_reads = registry.register(Counter(
+    "db_primary_pinned_reads_total", "Запросы на чтение, отправленные в основную БД после записи клиента"
+))
+
+
+def is_pinned(request: Request) -> bool:
+    """Клиент недавно писал и должен читать из основной БД"""
+    try:
+        until = float(request.cookies.get(PIN_COOKIE, 0))
+    except ValueError:
+        return False
+    now = time.time()
+    # Значение больше now + REPLICA_PIN_SECONDS не выдавалось сервером - не верим ему
+    return now < until <= now + REPLICA_PIN_SECONDS
+
+
+def use_replica(request: Request) -> bool:
+    if not replica_engines or request.method not in READ_METHODS:
+        return False
+    if is_pinned(request):
+        pinned_reads.inc()
+        return False
+    replica_reads.inc()
+    return True
+
+
+class PrimaryPinMiddleware:
+    """ASGI middleware: после успешного изменяющего запроса ставит cookie PIN_COOKIE"""
+
+    def __init__(self, app, pin_seconds: float = REPLICA_PIN_SECONDS):
+        self.app = app
+        self.pin_seconds = pin_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in READ_METHODS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.pin_seconds
+                cookie = (
+                    f"{PIN_COOKIE}={until:.3f}; Max-Age={int(self.pin_seconds) + 1}; "
+                    f"Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,46 @@
+"""
+Быстрая сериализация ответов.
+
+Стандартный путь FastAPI для response_model: проверка ORM объектов схемой,
+выгрузка в словари Python, затем json.dumps из стандартной библиотеки.
+ModelResponse проверяет данные схемой один раз (from_attributes), а JSON
+пишет pydantic-core сразу в байты, без промежуточных словарей.
+
+Остальные ответы (словари вроде {"message": ...}) кодирует ORJSONResponse,
+он задан как default_response_class приложения.
+"""
+
+import time
+from functools import lru_cache
+from typing import Any, Mapping, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from metrics import record_serialization
+
+
+@lru_cache(maxsize=None)
+def type_adapter(model: Any) -> TypeAdapter:
+    """TypeAdapter строит схему проверки при создании, поэтому один на тип"""
+    return TypeAdapter(model)
+
+
+def dump_json(model: Any, content: Any) -> bytes:
+    started = time.perf_counter()
+    adapter = type_adapter(model)
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+    record_serialization(started)  # фаза serialization в http_request_phase_seconds
+    return body
+
+
+class ModelResponse(Response):
+    """
+    JSON ответ по схеме: ModelResponse(List[ProjectResponse], projects).
+    response_model в декораторе остается для документации OpenAPI
+    """
+    media_type = "application/json"
+
+    def __init__(self, model: Any, content: Any, status_code: int = 200,
+                 headers: Optional[Mapping[str, str]] = None):
+        super().__init__(dump_json(model, content), status_code=status_code, headers=headers)
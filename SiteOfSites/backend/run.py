@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 """
-Скрипт для запуска FastAPI сервера
+Скрипт для запуска FastAPI сервера в режиме разработки (один процесс, перезапуск при изменении кода).
+В продакшене: python migrate_db.py && gunicorn -c gunicorn.conf.py
 """
 
 import uvicorn
 
+from init_db import init_db
+
 if __name__ == "__main__":
+    # Воркеры таблицы не создают, для разработки создаем их здесь
+    init_db()
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
@@ -1,7 +1,9 @@
 from pydantic import BaseModel, validator
-from typing import Optional, List
+from typing import Literal, Optional, List, Union
 from datetime import datetime
 
+from config import PROJECTS_BATCH_MAX_SIZE, AVATAR_MAX_UPLOAD_BYTES
+
 class UserBase(BaseModel):
     email: str
     nickname: str
@@ -46,6 +48,7 @@ class UserResponse(UserBase):
     id: int
     unique_id: str
     avatar: Optional[str] = None
+    avatar_thumb: Optional[str] = None
     description: Optional[str] = None
     created_at: datetime
     
@@ -55,7 +58,7 @@ class UserResponse(UserBase):
 class UserProfileUpdate(BaseModel):
     nickname: Optional[str] = None
     description: Optional[str] = None
-    avatar: Optional[str] = None
+    avatar: Optional[str] = None  # data URL; файлы лучше загружать через POST /api/users/avatar
     
     @validator('nickname')
     def validate_nickname(cls, v):
@@ -66,6 +69,13 @@ class UserProfileUpdate(BaseModel):
                 raise ValueError('Никнейм не должен превышать 20 символов')
         return v
 
+    @validator('avatar')
+    def validate_avatar_size(cls, v):
+        # base64 длиннее исходных байт в 4/3 раза, плюс префикс data URL
+        if v is not None and len(v) > AVATAR_MAX_UPLOAD_BYTES * 4 // 3 + 100:
+            raise ValueError(f'Файл больше {AVATAR_MAX_UPLOAD_BYTES // (1024 * 1024)} МБ')
+        return v
+
 class ProjectBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -81,14 +91,69 @@ class ProjectResponse(ProjectBase):
     class Config:
         from_attributes = True
 
+class ProjectPage(BaseModel):
+    items: List[ProjectResponse]
+    next_cursor: Optional[str] = None
+
+class ProjectSearchResult(ProjectResponse):
+    owner_nickname: str
+    owner_unique_id: str
+
+class ProjectSearchPage(BaseModel):
+    items: List[ProjectSearchResult]
+    next_cursor: Optional[str] = None
+
+class ProjectBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+
+    @validator('id', always=True)
+    def id_required(cls, v, values):
+        if values.get('op') in ('update', 'delete') and v is None:
+            raise ValueError('Для update и delete нужен id проекта')
+        return v
+
+    @validator('title', always=True)
+    def title_required(cls, v, values):
+        if values.get('op') in ('create', 'update') and not v:
+            raise ValueError('Для create и update нужно название проекта')
+        return v
+
+class ProjectBatchRequest(BaseModel):
+    operations: List[ProjectBatchOperation]
+
+    @validator('operations')
+    def validate_size(cls, v):
+        if not v:
+            raise ValueError('Пакет не содержит операций')
+        if len(v) > PROJECTS_BATCH_MAX_SIZE:
+            raise ValueError(f'В пакете не больше {PROJECTS_BATCH_MAX_SIZE} операций')
+        return v
+
+class ProjectBatchResult(BaseModel):
+    op: str
+    id: Optional[int] = None
+    status: int  # 201 создан, 200 изменен/удален, 404 не найден, 409 повтор в пакете
+    project: Optional[ProjectResponse] = None
+    detail: Optional[str] = None
+
+class ProjectBatchResponse(BaseModel):
+    results: List[ProjectBatchResult]
+
 class UserWithProjects(UserResponse):
+    # Только первая страница проектов, остальные - через /api/users/{id}/projects
     projects: List[ProjectResponse] = []
+    projects_count: int = 0
+    projects_next_cursor: Optional[str] = None
 
 class UserSearchResult(BaseModel):
     id: int
     unique_id: str
     nickname: str
     avatar: Optional[str] = None
+    avatar_thumb: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -100,3 +165,12 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+
+# GET /api/users: пользователи в порядке запроса и запрошенные id (или unique_id), которых нет
+class UserLookupLite(BaseModel):
+    users: List[UserSearchResult]
+    missing: List[Union[int, str]] = []
+
+class UserLookupFull(BaseModel):
+    users: List[UserResponse]
+    missing: List[Union[int, str]] = []
@@ -0,0 +1,409 @@
+"""
+Поиск пользователей по никнейму и уникальному ID.
+
+В PostgreSQL поиск по подстроке идет через триграммные GIN индексы (pg_trgm).
+Для остальных БД (SQLite в тестах) используется индекс n-грамм в памяти процесса.
+Он строится в фоне при первом поиске, до его готовности ищем тем же запросом,
+что и в PostgreSQL (search_statement).
+
+Порядок результатов:
+1. точное совпадение unique_id
+2. никнейм начинается с запроса
+3. совпадение по подстроке
+
+Результаты кэшируются на несколько секунд по нормализованному запросу
+(SearchCache): при поиске "по мере ввода" многие набирают одни и те же
+популярные префиксы. Одновременные одинаковые запросы объединяются,
+в БД идет только первый. Результат, прочитанный с реплики, не кэшируется,
+если запрос сбрасывался меньше REPLICA_PIN_SECONDS назад (см. replicas.py).
+"""
+
+import asyncio
+import bisect
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, literal_column, or_, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import TTLCache
+from config import REPLICA_PIN_SECONDS, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+from database import AsyncSessionLocal, reads_from_replica
+from metrics import Gauge, registry
+from models import User
+from schemas import UserSearchResult
+
+SEARCH_LIMIT = 5
+MIN_QUERY_LENGTH = 2
+LIKE_ESCAPE = "/"
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def normalize_query(q: str) -> str:
+    return q.strip().lower()
+
+
+def escape_like(value: str) -> str:
+    """Экранирует спецсимволы LIKE, чтобы '%' и '_' в запросе искались буквально"""
+    return value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace("%", LIKE_ESCAPE + "%").replace("_", LIKE_ESCAPE + "_")
+
+
+class NgramIndex:
+    """
+    Индекс никнеймов и unique_id в памяти процесса.
+
+    Каждый уровень ранжирования обслуживается своей структурой и обход
+    останавливается, как только набрано limit результатов, поэтому время
+    запроса не растет вместе с числом пользователей:
+    - словарь unique_id -> id для точных совпадений
+    - отсортированный список никнеймов для совпадений по префиксу
+    - списки n-грамм (биграммы и триграммы) для совпадений по подстроке
+
+    Все списки хранят пары (никнейм, id) в порядке никнеймов, поэтому каждый
+    уровень отдает результаты в том же порядке, что и search_statement,
+    и одинаково во всех воркерах.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+        self._by_unique_id: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+        self._nicknames: List[Tuple[str, int]] = []
+        self._docs: Dict[int, Tuple[str, str]] = {}
+        self._pending: Optional[List[Tuple[int, str, str]]] = None  # изменения во время построения
+        self.loaded = False
+
+    @staticmethod
+    def _grams(text: str, n: int) -> Set[str]:
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def _doc_grams(self, nickname: str, unique_id: str) -> Set[str]:
+        grams = set()
+        for text in (nickname, unique_id):
+            grams |= self._grams(text, 2)
+            grams |= self._grams(text, 3)
+        return grams
+
+    async def load(self, session_factory):
+        """
+        Строит индекс по всем пользователям (только нужные колонки). Индекс
+        строится в потоке (на 1 млн пользователей - десятки секунд) в отдельном
+        объекте, который затем заменяет текущий; изменения, пришедшие за это
+        время, применяются после замены.
+        """
+        self._pending = []
+        try:
+            async with session_factory() as db:
+                result = await db.execute(select(User.id, User.nickname, User.unique_id))
+                rows = result.all()
+            fresh = NgramIndex()
+            await asyncio.to_thread(fresh.build, rows)
+        except BaseException:
+            self._pending = None
+            raise
+        pending = self._pending
+        self.__dict__.update(fresh.__dict__)
+        for change in pending:
+            self.add(*change)
+
+    def changed(self, user_id: int, nickname: str, unique_id: str):
+        """Регистрация или изменение пользователя; во время построения откладывается"""
+        if self.loaded:
+            self.add(user_id, nickname, unique_id)
+        elif self._pending is not None:
+            self._pending.append((user_id, nickname, unique_id))
+
+    def build(self, rows: Iterable[Tuple[int, str, str]]):
+        """Строит индекс заново по строкам (id, nickname, unique_id)"""
+        self.__init__()
+        for user_id, nickname, unique_id in rows:
+            self._docs[user_id] = (nickname.lower(), unique_id.lower())
+        # Документы добавляются в порядке никнеймов - списки получаются отсортированными
+        self._nicknames = sorted((nickname, user_id) for user_id, (nickname, _) in self._docs.items())
+        for key in self._nicknames:
+            unique_id = self._docs[key[1]][1]
+            self._by_unique_id[unique_id].append(key)
+            for gram in self._doc_grams(key[0], unique_id):
+                self._postings[gram].append(key)
+        self.loaded = True
+
+    def add(self, user_id: int, nickname: str, unique_id: str):
+        if user_id in self._docs:
+            self.remove(user_id)
+        nickname, unique_id = nickname.lower(), unique_id.lower()
+        key = (nickname, user_id)
+        self._docs[user_id] = (nickname, unique_id)
+        bisect.insort(self._by_unique_id[unique_id], key)
+        for gram in self._doc_grams(nickname, unique_id):
+            bisect.insort(self._postings[gram], key)
+        bisect.insort(self._nicknames, key)
+
+    @staticmethod
+    def _discard(entries: List[Tuple[str, int]], key: Tuple[str, int]):
+        position = bisect.bisect_left(entries, key)
+        if position < len(entries) and entries[position] == key:
+            del entries[position]
+
+    def remove(self, user_id: int):
+        doc = self._docs.pop(user_id, None)
+        if doc is None:
+            return
+        nickname, unique_id = doc
+        key = (nickname, user_id)
+        self._discard(self._by_unique_id[unique_id], key)
+        if not self._by_unique_id[unique_id]:
+            del self._by_unique_id[unique_id]
+        for gram in self._doc_grams(nickname, unique_id):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                self._discard(posting, key)
+                if not posting:
+                    del self._postings[gram]
+        self._discard(self._nicknames, key)
+
+    def search(self, q: str, limit: int = SEARCH_LIMIT) -> List[int]:
+        """Возвращает id пользователей в порядке ранжирования"""
+        found: List[int] = []
+        seen: Set[int] = set()
+
+        def take(user_id: int) -> bool:
+            if user_id not in seen:
+                seen.add(user_id)
+                found.append(user_id)
+            return len(found) >= limit
+
+        # 1. Точное совпадение unique_id
+        for _, user_id in self._by_unique_id.get(q, ()):
+            if take(user_id):
+                return found
+
+        # 2. Никнейм начинается с запроса
+        position = bisect.bisect_left(self._nicknames, (q,))
+        while position < len(self._nicknames):
+            nickname, user_id = self._nicknames[position]
+            if not nickname.startswith(q):
+                break
+            if take(user_id):
+                return found
+            position += 1
+
+        # 3. Подстрока: обходим самый короткий список n-грамм в порядке никнеймов
+        # и проверяем кандидатов
+        n = 3 if len(q) >= 3 else 2
+        postings = [self._postings.get(gram) for gram in self._grams(q, n)]
+        if not all(postings):
+            return found
+        for nickname, user_id in min(postings, key=len):
+            if q in nickname or q in self._docs[user_id][1]:
+                if take(user_id):
+                    break
+        return found
+
+
+user_index = NgramIndex()
+user_index_loading: Optional[asyncio.Task] = None
+
+
+def load_user_index():
+    """Запускает построение индекса n-грамм в фоне, если оно еще не идет"""
+    global user_index_loading
+    if user_index_loading is None or user_index_loading.done():
+        user_index_loading = asyncio.create_task(user_index.load(AsyncSessionLocal))
+        user_index_loading.add_done_callback(_index_loaded)
+
+
+def _index_loaded(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        # Следующий поиск запустит построение заново
+        logger.error("Не удалось построить индекс поиска", exc_info=task.exception())
+
+
+def uses_trigram_index(db: AsyncSession) -> bool:
+    return db.bind.dialect.name == "postgresql"
+
+
+def search_statement(dialect: str, q: str, limit: int):
+    """
+    Поиск запросом к БД: каждый уровень ранжирования - отдельный запрос со
+    своим LIMIT, поэтому сортируется не больше limit строк на уровень, а не все
+    совпадения '%q%'. Пользователь может попасть в несколько уровней, лишние
+    строки отбрасывает search_users.
+
+    В PostgreSQL точное совпадение unique_id и префикс никнейма идут по B-tree
+    индексам выражений (ix_users_unique_id_lower, ix_users_nickname_lower) и
+    для префикса сразу в порядке никнеймов. Подстрока из 3 и более символов
+    ищется через триграммный GIN индекс. В запросе из 2 символов нет ни одной
+    полной триграммы, и GIN индекс вернул бы всех пользователей, поэтому
+    выражение записано так, чтобы индекс не подходил: план идет по
+    ix_users_nickname_lower в порядке никнеймов и останавливается на limit
+    совпадениях.
+
+    В остальных БД запрос нужен, только пока строится индекс n-грамм, и
+    читает таблицу целиком. Порядок никнеймов там двоичный, как COLLATE "C".
+    """
+    sort_key = func.lower(User.nickname)
+    if dialect == "postgresql":
+        sort_key = sort_key.collate("C")
+    pattern = escape_like(q)
+    haystacks = [func.lower(User.nickname), func.lower(User.unique_id)]
+    if len(q) < 3:
+        haystacks = [haystack.concat("") for haystack in haystacks]
+    levels = [
+        func.lower(User.unique_id) == q,
+        sort_key.like(f"{pattern}%", escape=LIKE_ESCAPE),
+        or_(*(haystack.like(f"%{pattern}%", escape=LIKE_ESCAPE) for haystack in haystacks)),
+    ]
+    # Каждый уровень - подзапрос: SQLite не допускает LIMIT у частей UNION
+    ranked = union_all(*(
+        select(select(User.id, literal_column(str(rank)).label("rank"), sort_key.label("sort_key"))
+               .where(condition).order_by(sort_key).limit(limit).subquery())
+        for rank, condition in enumerate(levels)
+    )).subquery("ranked")
+    return (
+        select(User).join(ranked, User.id == ranked.c.id)
+        .order_by(ranked.c.rank, ranked.c.sort_key, ranked.c.id)
+    )
+
+
+async def search_users(db: AsyncSession, q: str, limit: int = SEARCH_LIMIT) -> List[User]:
+    q = normalize_query(q)
+    if len(q) < MIN_QUERY_LENGTH:
+        return []
+
+    if not uses_trigram_index(db):
+        if user_index.loaded:
+            ids = user_index.search(q, limit)
+            if not ids:
+                return []
+            result = await db.execute(select(User).where(User.id.in_(ids)))
+            users = {user.id: user for user in result.scalars()}
+            return [users[user_id] for user_id in ids if user_id in users]
+        load_user_index()  # пока индекс строится, ищем запросом к БД
+
+    result = await db.execute(search_statement(db.bind.dialect.name, q, limit))
+    found: List[User] = []
+    for user in result.scalars():
+        if user not in found:
+            found.append(user)
+    return found[:limit]
+
+
+def substrings(text: str) -> Set[str]:
+    """Все запросы, по которым text может найтись (подстроки не короче MIN_QUERY_LENGTH)"""
+    text = text.lower()
+    return {
+        text[start:end]
+        for start in range(len(text))
+        for end in range(start + MIN_QUERY_LENGTH, len(text) + 1)
+    }
+
+
+class SearchCache:
+    """
+    Результаты поиска по нормализованному запросу.
+
+    Пользователь может появиться или измениться только в результатах запросов,
+    которые являются подстроками его никнейма или unique_id, поэтому при
+    изменении сбрасываются именно эти записи (никнейм до 20 символов - не
+    больше пары сотен ключей). Номер изменения, как в ProfileCache, не дает
+    сохранить результат, собранный до сброса.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.results = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._recent = TTLCache(maxsize=maxsize, ttl=REPLICA_PIN_SECONDS)  # недавно сброшенные запросы
+        self._inflight: Dict[Tuple[str, bool], asyncio.Future] = {}
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def search(self, db: AsyncSession, q: str) -> List[UserSearchResult]:
+        q = normalize_query(q)
+        if len(q) < MIN_QUERY_LENGTH:
+            return []
+
+        cached = self.results.get(q)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        # Запросы к реплике и к основной БД не объединяются: прикрепленный
+        # после записи клиент не должен получить старый результат с реплики
+        from_replica = reads_from_replica(db)
+        key = (q, from_replica)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # Такой же запрос уже выполняется - ждем его результат.
+            # shield: отмена одного ожидающего не должна отменять запрос для остальных
+            self.coalesced += 1
+            found = await asyncio.shield(inflight)
+            if found is not None:
+                return found
+            # Ведущий запрос отменили - повторяем поиск: первый повторивший
+            # выполнит запрос в своей сессии, остальные дождутся его
+            return await self.search(db, q)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        since = self.version
+        try:
+            users = await search_users(db, q)
+            found = [UserSearchResult.model_validate(user) for user in users]
+        except asyncio.CancelledError:
+            # Клиент ведущего запроса отключился: ожидающие получают не отмену, а None
+            future.set_result(None)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # ожидающих может не быть, не пишем "exception was never retrieved"
+            raise
+        finally:
+            del self._inflight[key]
+
+        if self.version == since and not (from_replica and self._recent.get(q)):
+            self.results.set(q, found)
+        future.set_result(found)
+        return found
+
+    def invalidate(self, *texts: Optional[str]):
+        """Сбрасывает результаты запросов, в которые может попасть пользователь с этими никнеймами/ID"""
+        self.version += 1
+        for text in texts:
+            if text:
+                for key in substrings(text):
+                    self.results.pop(key)
+                    self._recent.set(key, True)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.results),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+search_cache = SearchCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+
+registry.register(Gauge("search_cache_hits_total", "Результаты поиска из кэша",
+                        lambda: search_cache.hits, kind="counter"))
+registry.register(Gauge("search_cache_misses_total", "Запросы поиска, выполненные в БД",
+                        lambda: search_cache.misses, kind="counter"))
+registry.register(Gauge("search_cache_coalesced_total", "Запросы поиска, дождавшиеся такого же выполняющегося",
+                        lambda: search_cache.coalesced, kind="counter"))
+
+
+def user_changed(user_id: int, nickname: str, unique_id: str, old_nickname: Optional[str] = None):
+    """
+    Обновляет запись пользователя в индексе и сбрасывает затронутые результаты поиска
+    после регистрации или изменения никнейма/аватара (в том числе в другом воркере)
+    """
+    user_index.changed(user_id, nickname, unique_id)
+    search_cache.invalidate(old_nickname, nickname, unique_id)
+
+
+def index_user(user: User, old_nickname: Optional[str] = None):
+    user_changed(user.id, user.nickname, user.unique_id, old_nickname)
@@ -1,27 +1,80 @@
-from argon2 import PasswordHasher, exceptions
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import multiprocessing
 import os
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import HTTPException, status
 
-ph = PasswordHasher()
+from config import HASH_WORKERS, HASH_QUEUE_SIZE
+# Функции хеширования выполняются в процессах пула и вынесены в легкий модуль:
+# процесс пула импортирует только его, а не FastAPI
+from passwords import hash_password, verify_and_rehash, worker_ready
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "@37!34Hif77+UIfgE22&&1#eee2EC1#$")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-def hash_password(plain_password: str) -> str:
-    return ph.hash(plain_password)
+class PasswordHashingService:
+    """
+    Выполняет Argon2 в отдельном пуле процессов, чтобы хеширование
+    не занимало event loop. Если свободных процессов и мест в очереди нет,
+    запрос сразу получает 503 вместо бесконечного ожидания.
+    """
 
-def verify_password(plain_password: str, password_hash: str) -> bool:
-    try:
-        return ph.verify(password_hash, plain_password)
-    except exceptions.VerifyMismatchError:
-        return False
-    except Exception:
-        return False
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.pending >= self.workers + self.queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, попробуйте позже",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+
+    async def warm_up(self):
+        """
+        Запускает все процессы пула при старте воркера, а не на первых входах:
+        каждый процесс (spawn) заново импортирует Python и argon2.
+        Пул создает процессы по одному на задачу, пока нет свободных,
+        поэтому достаточно отправить по задаче на процесс
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, worker_ready) for _ in range(self.workers)))
+
+    async def hash(self, plain_password: str) -> str:
+        return await self._run(hash_password, plain_password)
+
+    async def verify(self, plain_password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(verify_and_rehash, plain_password, password_hash)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+hashing_service = PasswordHashingService(HASH_WORKERS, HASH_QUEUE_SIZE)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -43,4 +96,4 @@ def verify_token(token: str) -> dict:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Недействительный токен",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
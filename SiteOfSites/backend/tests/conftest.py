@@ -0,0 +1,139 @@
+"""
+Общие фикстуры тестов: приложение на временной SQLite базе и счетчик SQL запросов.
+
+Запуск из SiteOfSites/backend:
+    python -m pytest tests
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="siteofsites-tests-"), "test.db")
+
+# До импорта config: модули приложения читают настройки при импорте
+os.environ["DATABASE_URL"] = "sqlite:///" + DATABASE_PATH
+os.environ.setdefault("HASH_WORKERS", "1")
+os.environ.setdefault("DB_POOL_WARMUP", "1")
+sys.path.insert(0, BACKEND_DIR)
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event, func, select  # noqa: E402
+
+from database import Base, async_engine, engine  # noqa: E402
+from events import event_broker  # noqa: E402
+from models import Event  # noqa: E402
+
+PASSWORD = "secret-password"
+_numbers = itertools.count(1)
+
+
+def wait_for_events(timeout: float = 5):
+    """Ждет, пока фоновый цикл событий применит все записанные события (сбросит кэши)"""
+    with engine.connect() as conn:
+        last_id = conn.scalar(select(func.coalesce(func.max(Event.id), 0)))
+    deadline = time.monotonic() + timeout
+    while (event_broker.last_id or 0) < last_id:
+        assert time.monotonic() < deadline, "цикл событий не дочитал outbox"
+        time.sleep(0.01)
+
+
+class StatementCounter:
+    """
+    SQL запросы и COMMIT, отправленные в БД внутри блока with. Чтение outbox
+    фоновым циклом событий (events.py) идет параллельно запросам и не считается
+    """
+
+    def __init__(self):
+        self.statements = []
+        self._active = False
+
+    def _execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self._active and not (statement.startswith("SELECT") and "FROM events" in statement):
+            self.statements.append(statement)
+
+    def _commit(self, conn):
+        if self._active:
+            self.statements.append("COMMIT")
+
+    def __enter__(self):
+        self.statements = []
+        self._active = True
+        return self
+
+    def __exit__(self, *exc):
+        self._active = False
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture(scope="session")
+def database():
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@pytest.fixture(scope="session")
+def client(database):
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def events_applied():
+    """Функция, которая ждет применения записанных событий (wait_for_events)"""
+    return wait_for_events
+
+
+@pytest.fixture
+def statements():
+    counter = StatementCounter()
+    sync_engine = async_engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", counter._execute)
+    event.listen(sync_engine, "commit", counter._commit)
+    yield counter
+    event.remove(sync_engine, "before_cursor_execute", counter._execute)
+    event.remove(sync_engine, "commit", counter._commit)
+
+
+@pytest.fixture
+def register(client):
+    """Регистрирует нового пользователя, возвращает (заголовки авторизации, пользователь)"""
+
+    def register_user():
+        number = next(_numbers)
+        response = client.post("/api/auth/register", json={
+            "email": f"user{number}@tests.example.com", "nickname": f"user{number}",
+            "password": PASSWORD, "confirm_password": PASSWORD,
+        })
+        assert response.status_code == 200, response.text
+        data = response.json()
+        wait_for_events()
+        return {"Authorization": f"Bearer {data['access_token']}"}, data["user"]
+
+    return register_user
+
+
+@pytest.fixture
+def create_projects(client):
+    """Создает count проектов одним POST /api/projects/batch, возвращает их id"""
+
+    def create(headers: dict, count: int) -> list:
+        if not count:
+            return []
+        response = client.post("/api/projects/batch", headers=headers, json={"operations": [
+            {"op": "create", "title": f"Проект {n}", "description": "Описание"} for n in range(count)
+        ]})
+        assert response.status_code == 200, response.text
+        wait_for_events()
+        return [result["id"] for result in response.json()["results"]]
+
+    return create
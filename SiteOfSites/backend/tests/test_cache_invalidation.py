@@ -0,0 +1,61 @@
+"""
+Кэши воркера сбрасываются по событиям outbox, а не только в обработчике, который
+сделал запись: изменения из другого воркера (здесь - запись в БД мимо API, как ее
+делает другой процесс) видны в профилях и поиске сразу после чтения outbox.
+"""
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from database import engine
+from events import record_event, record_user_event
+from models import Project, User
+from schemas import ProjectResponse
+
+
+def test_profile_sees_project_created_in_another_worker(client, register, events_applied):
+    _, user = register()
+    assert client.get(f"/api/users/{user['id']}").json()["projects_count"] == 0  # профиль в кэше
+
+    with Session(engine) as db:
+        project = Project(title="Из другого воркера", description="Описание", owner_id=user["id"])
+        db.add(project)
+        db.flush()
+        db.refresh(project)
+        record_event(db, "project.created", user["id"], ProjectResponse.model_validate(project))
+        db.commit()
+    events_applied()
+
+    profile = client.get(f"/api/users/{user['id']}").json()
+    assert profile["projects_count"] == 1
+    assert profile["projects"][0]["title"] == "Из другого воркера"
+
+
+def search(client, q: str) -> list:
+    response = client.get("/api/users/search", params={"q": q})
+    assert response.status_code == 200
+    return [found["nickname"] for found in response.json()]
+
+
+def test_search_sees_users_registered_and_renamed_in_another_worker(client, events_applied):
+    assert search(client, "remote_") == []  # пустой результат в кэше
+
+    with Session(engine) as db:
+        user = User(email="remote@tests.example.com", nickname="remote_alice", password_hash="-",
+                    unique_id="remote01")
+        db.add(user)
+        db.flush()
+        record_user_event(db, "user.created", user)
+        db.commit()
+    events_applied()
+    assert search(client, "remote_") == ["remote_alice"]
+
+    with Session(engine) as db:
+        user = db.execute(
+            update(User).where(User.nickname == "remote_alice").values(nickname="remote_bob").returning(User)
+        ).scalar_one()
+        record_user_event(db, "user.updated", user, "remote_alice")
+        db.commit()
+    events_applied()
+    assert search(client, "remote_") == ["remote_bob"]
+    assert search(client, "alice") == []
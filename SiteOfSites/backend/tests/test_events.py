@@ -0,0 +1,78 @@
+"""
+Поток событий (events.py): строка с меньшим id, зафиксированная позже
+(PostgreSQL выдает id до commit), приходит подписчикам раньше больших id и не
+теряется при восстановлении по Last-Event-ID.
+"""
+
+import asyncio
+import re
+import time
+
+from sqlalchemy.orm import Session
+
+from database import AsyncSessionLocal, engine
+from events import EventBroker, replay
+from models import Event
+
+USER_ID = 10 ** 6 + 21  # событий этого пользователя нет в других тестах
+
+
+def commit_event(event_id: int):
+    with Session(engine) as db:
+        db.add(Event(id=event_id, kind="user.updated", user_id=USER_ID, payload="{}"))
+        db.commit()
+
+
+async def received(subscriber, timeout: float = 2) -> list:
+    """id событий, пришедших подписчику за timeout секунд"""
+    frames = b""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        frames += subscriber.take()
+        await asyncio.sleep(0.02)
+    return [int(event_id) for event_id in re.findall(rb"^id: (\d+)$", frames, re.M)]
+
+
+async def replayed(after_id: int, up_to: int) -> list:
+    async with AsyncSessionLocal() as db:
+        return [event.id for event in await replay(db, after_id, {USER_ID}, 100, up_to)]
+
+
+def test_late_commit_is_delivered_in_id_order(database):
+    async def run():
+        broker = EventBroker(poll_interval=0.02, heartbeat=60, buffer=100, gap_timeout=10)
+        subscriber = broker.subscribe([USER_ID])
+        while broker.published_id is None:
+            await asyncio.sleep(0.01)
+        base = broker.published_id
+
+        commit_event(base + 2)  # вторая транзакция зафиксирована первой
+        assert await received(subscriber, 0.3) == []  # придержано до закрытия разрыва
+        assert broker.last_id == base + 2
+        assert broker.published_id == base
+        # Клиент, переподключившийся сейчас, получит base + 1 и base + 2 из подписки
+        assert await replayed(base, broker.published_id) == []
+
+        commit_event(base + 1)
+        assert await received(subscriber, 0.3) == [base + 1, base + 2]
+        assert broker.published_id == base + 2
+        assert await replayed(base, broker.published_id) == [base + 1, base + 2]
+        await broker.stop()
+
+    asyncio.run(run())
+
+
+def test_expired_gap_releases_held_events(database):
+    async def run():
+        broker = EventBroker(poll_interval=0.02, heartbeat=60, buffer=100, gap_timeout=0.2)
+        subscriber = broker.subscribe([USER_ID])
+        while broker.published_id is None:
+            await asyncio.sleep(0.01)
+        base = broker.published_id
+
+        commit_event(base + 2)  # base + 1 откатилась
+        assert await received(subscriber, 0.6) == [base + 2]
+        assert broker.published_id == base + 2
+        await broker.stop()
+
+    asyncio.run(run())
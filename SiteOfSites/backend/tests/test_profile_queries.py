@@ -0,0 +1,58 @@
+"""
+Число запросов к БД при загрузке профиля (profiles.load_profile): пользователь со
+счетчиком проектов и первая страница проектов - два запроса при любом числе
+проектов, каждая следующая страница - один.
+"""
+
+import pytest
+
+from config import PROJECTS_PAGE_SIZE
+from profiles import profile_cache
+
+
+@pytest.mark.parametrize("projects", [0, 1, 45])
+def test_profile_by_id_and_unique_id(client, register, create_projects, statements, projects):
+    headers, user = register()
+    create_projects(headers, projects)
+
+    for url in (f"/api/users/{user['id']}", f"/api/users/by-unique-id/{user['unique_id']}"):
+        profile_cache.bump(user["id"])  # без готового ответа в кэше
+        with statements:
+            response = client.get(url)
+        assert response.status_code == 200
+        assert len(statements) == 2, statements.statements
+        profile = response.json()
+        assert profile["projects_count"] == projects
+        assert len(profile["projects"]) == min(projects, PROJECTS_PAGE_SIZE)
+
+
+def test_cached_profile_makes_no_queries(client, register, statements):
+    _, user = register()
+    client.get(f"/api/users/{user['id']}")
+
+    with statements:
+        response = client.get(f"/api/users/{user['id']}")
+    assert response.status_code == 200
+    assert len(statements) == 0, statements.statements
+
+
+def test_each_further_projects_page_is_one_query(client, register, create_projects, statements):
+    headers, user = register()
+    created = create_projects(headers, 45)
+
+    profile = client.get(f"/api/users/{user['id']}").json()
+    seen = [project["id"] for project in profile["projects"]]
+    cursor = profile["projects_next_cursor"]
+    pages = 0
+    while cursor:
+        with statements:
+            response = client.get(f"/api/users/{user['id']}/projects", params={"cursor": cursor})
+        assert response.status_code == 200
+        assert len(statements) == 1, statements.statements
+        page = response.json()
+        seen += [project["id"] for project in page["items"]]
+        cursor = page["next_cursor"]
+        pages += 1
+
+    assert pages == 2
+    assert sorted(seen) == sorted(created)
@@ -0,0 +1,112 @@
+"""
+Поиск проектов (project_search.py): по умолчанию все совпадения идут по
+релевантности, с sort=recent - окнами по max_candidates самых новых. В обоих
+случаях листание по курсору доходит до всех совпадений.
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from database import AsyncSessionLocal
+from project_search import query_terms, relevance_statement, search_projects, search_statement
+
+
+def collect(q: str, limit: int, sort: str = "relevance", max_candidates: int = 500):
+    """Все страницы запроса: размеры страниц и id в порядке выдачи"""
+
+    async def run():
+        sizes, ids, cursor = [], [], None
+        async with AsyncSessionLocal() as db:
+            while True:
+                rows, cursor = await search_projects(db, q, cursor, limit, sort, max_candidates)
+                sizes.append(len(rows))
+                ids += [row.id for row in rows]
+                if cursor is None:
+                    return sizes, ids
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def matching(client, register, create_projects):
+    headers, _ = register()
+    return create_projects(headers, 23)  # у всех в названии "Проект"
+
+
+@pytest.mark.parametrize("limit", [1, 5, 50])
+def test_relevance_paging_reaches_every_match(client, matching, limit):
+    _, everything = collect("проект", 1000)
+    assert set(matching) <= set(everything)
+
+    sizes, ids = collect("проект", limit)
+    assert ids == everything
+    assert all(size == limit for size in sizes[:-1])
+
+
+def test_relevance_ranks_all_matches(client, register):
+    headers, _ = register()
+    best = client.post("/api/projects", headers=headers,
+                       json={"title": "Квазар", "description": "квазар квазар"}).json()["id"]
+    newer = [
+        client.post("/api/projects", headers=headers,
+                    json={"title": f"Заметка {n}", "description": "где-то упомянут квазар"}).json()["id"]
+        for n in range(5)
+    ]
+
+    _, ids = collect("квазар", 2)
+    assert ids[0] == best and set(ids) == {best, *newer}
+    # Окнами по 3 самых новых старый проект доступен только после них
+    _, recent = collect("квазар", 2, "recent", 3)
+    assert recent.index(best) >= 3 and set(recent) == set(ids)
+
+
+@pytest.mark.parametrize("limit, max_candidates", [(5, 7), (4, 4), (10, 3), (50, 7)])
+def test_recent_paging_reaches_every_match(client, matching, limit, max_candidates):
+    # Другие тесты тоже создают проекты, поэтому сравниваем с полной выдачей одним окном
+    _, everything = collect("проект", 1000, "recent", 10 ** 6)
+    assert set(matching) <= set(everything)
+
+    sizes, ids = collect("проект", limit, "recent", max_candidates)
+    assert sorted(ids) == sorted(everything)
+    assert all(size == limit for size in sizes[:-1])
+    # Окна идут от новых к старым: любое id окна больше любого id следующего
+    windows = [ids[start:start + max_candidates] for start in range(0, len(ids), max_candidates)]
+    assert all(min(newer) > max(older) for newer, older in zip(windows, windows[1:]))
+
+
+def test_cursor_is_validated(client, matching):
+    async def run(cursor, sort="relevance"):
+        async with AsyncSessionLocal() as db:
+            return await search_projects(db, "проект", cursor, 5, sort)
+
+    for cursor in ("not-a-cursor", "eyJzIjoxfQ"):
+        for sort in ("relevance", "recent"):
+            with pytest.raises(ValueError):
+                asyncio.run(run(cursor, sort))
+    # Курсор одного порядка выдачи не подходит для другого
+    _, relevance_cursor = asyncio.run(run(None))
+    _, recent_cursor = asyncio.run(run(None, "recent"))
+    with pytest.raises(ValueError):
+        asyncio.run(run(relevance_cursor, "recent"))
+    with pytest.raises(ValueError):
+        asyncio.run(run(recent_cursor))
+    assert client.get("/api/projects/search", params={"q": "проект", "cursor": "xyz"}).status_code == 400
+    assert client.get("/api/projects/search", params={"q": "проект", "sort": "oldest"}).status_code == 422
+
+
+def test_postgresql_recent_ranks_only_the_window():
+    statement, _ = search_statement("postgresql", query_terms("проект"), 500)
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    candidates = sql[sql.index("FROM (SELECT projects.id"):sql.index(") AS candidates")]
+    assert "ts_rank_cd" not in candidates
+    assert "ts_rank_cd" in sql
+
+
+def test_postgresql_relevance_reads_projects_only_for_the_page():
+    statement = relevance_statement("postgresql", query_terms("проект"), (-0.5, 10), 21)
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    ranked = sql[sql.index("FROM (SELECT matches.id"):sql.index(") AS ranked")]
+    assert "ts_rank_cd" in ranked and "LIMIT" in ranked
+    assert "projects.title" not in ranked and "window_start" not in sql
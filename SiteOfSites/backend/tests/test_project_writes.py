@@ -0,0 +1,91 @@
+"""
+Изменение и удаление проекта - один UPDATE/DELETE ... RETURNING с проверкой
+владельца, событие в outbox и COMMIT. Чужой или несуществующий проект - один
+запрос и 404.
+"""
+
+import pytest
+
+
+@pytest.fixture
+def owner(client, register, create_projects):
+    headers, user = register()
+    client.get("/api/auth/me", headers=headers)  # пользователь токена уже в кэше (principals.py)
+    return headers, create_projects(headers, 1)[0]
+
+
+def test_update_project(client, owner, statements):
+    headers, project_id = owner
+    with statements:
+        response = client.put(f"/api/projects/{project_id}", headers=headers,
+                              json={"title": "Новое название", "description": "Новое описание"})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Новое название"
+    assert len(statements) == 3, statements.statements
+    update, outbox, commit = statements.statements
+    assert update.startswith("UPDATE projects") and "RETURNING" in update
+    assert outbox.startswith("INSERT INTO events")
+    assert commit == "COMMIT"
+
+
+def test_delete_project(client, owner, statements):
+    headers, project_id = owner
+    with statements:
+        response = client.delete(f"/api/projects/{project_id}", headers=headers)
+    assert response.status_code == 200
+    assert len(statements) == 3, statements.statements
+    delete, outbox, commit = statements.statements
+    assert delete.startswith("DELETE FROM projects") and "RETURNING" in delete
+    assert outbox.startswith("INSERT INTO events")
+    assert commit == "COMMIT"
+
+    assert client.delete(f"/api/projects/{project_id}", headers=headers).status_code == 404
+
+
+@pytest.mark.parametrize("method", ["put", "delete"])
+def test_foreign_or_missing_project(client, register, owner, statements, method):
+    _, project_id = owner
+    stranger, _ = register()
+    client.get("/api/auth/me", headers=stranger)
+    kwargs = {"json": {"title": "Чужой", "description": "Проект"}} if method == "put" else {}
+
+    for target in (project_id, project_id + 10 ** 6):
+        with statements:
+            response = client.request(method.upper(), f"/api/projects/{target}", headers=stranger, **kwargs)
+        assert response.status_code == 404
+        assert len(statements) == 1, statements.statements
+
+    # проект владельца не изменился
+    owner_headers, _ = owner
+    projects = client.get("/api/projects", headers=owner_headers).json()["items"]
+    assert [(project["id"], project["title"]) for project in projects] == [(project_id, "Проект 0")]
+
+
+def test_batch_checks_owner_in_update_and_delete(client, register, create_projects, statements):
+    headers, _ = register()
+    client.get("/api/auth/me", headers=headers)
+    own_updated, own_deleted = create_projects(headers, 2)
+    stranger, _ = register()
+    foreign_updated, foreign_deleted = create_projects(stranger, 2)
+
+    with statements:
+        response = client.post("/api/projects/batch", headers=headers, json={"operations": [
+            {"op": "update", "id": own_updated, "title": "Новое название"},
+            {"op": "update", "id": foreign_updated, "title": "Чужой"},
+            {"op": "delete", "id": own_deleted},
+            {"op": "delete", "id": foreign_deleted},
+            {"op": "delete", "id": foreign_deleted + 10 ** 6},
+        ]})
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == [200, 404, 200, 404, 404]
+    assert response.json()["results"][0]["project"]["title"] == "Новое название"
+    update, delete, *outbox, commit = statements.statements
+    for statement in (update, delete):
+        assert "projects.owner_id = " in statement and "RETURNING" in statement
+    assert outbox and all(statement.startswith("INSERT INTO events") for statement in outbox)
+    assert commit == "COMMIT"
+
+    # чужой проект не изменился и не удален
+    projects = client.get("/api/projects", headers=stranger).json()["items"]
+    assert sorted((project["id"], project["title"]) for project in projects) == [
+        (foreign_updated, "Проект 0"), (foreign_deleted, "Проект 1")]
@@ -0,0 +1,57 @@
+"""
+Регистрация: занятые email и никнейм - 400, занятый unique_id (выданный до
+перехода на счетчик) - повтор со следующим ID.
+"""
+
+import pytest
+
+import main
+
+PASSWORD = "secret-password"
+
+
+@pytest.fixture
+def allocated(monkeypatch):
+    """Подменяет выдачу unique_id заданной последовательностью и запоминает выданные ID"""
+    issued = []
+
+    def use(*unique_ids):
+        pending = list(unique_ids)
+
+        async def allocate():
+            issued.append(pending.pop(0))
+            return issued[-1]
+
+        monkeypatch.setattr(main.unique_id_allocator, "allocate", allocate)
+        return issued
+
+    return use
+
+
+def register_user(client, email: str, nickname: str):
+    return client.post("/api/auth/register", json={
+        "email": email, "nickname": nickname, "password": PASSWORD, "confirm_password": PASSWORD,
+    })
+
+
+def test_taken_unique_id_is_retried_with_the_next_one(client, register, allocated):
+    _, existing = register()
+    issued = allocated(existing["unique_id"], "fresh001")
+
+    response = register_user(client, "retry@tests.example.com", "retry_user")
+    assert response.status_code == 200, response.text
+    assert response.json()["user"]["unique_id"] == "fresh001"
+    assert issued == [existing["unique_id"], "fresh001"]
+
+
+@pytest.mark.parametrize("field", ["email", "nickname"])
+def test_taken_email_or_nickname_is_400_without_retry(client, register, allocated, field):
+    _, existing = register()
+    issued = allocated("fresh002", "fresh003")
+    email = existing["email"] if field == "email" else "other@tests.example.com"
+    nickname = existing["nickname"] if field == "nickname" else "other_user"
+
+    response = register_user(client, email, nickname)
+    assert response.status_code == 400
+    assert response.json()["detail"] == main.USER_CONFLICTS[field]
+    assert issued == ["fresh002"]
@@ -0,0 +1,44 @@
+"""
+Кэш поиска (SearchCache): одинаковые одновременные запросы объединяются, и
+отмена ведущего запроса не отменяет ожидающих - они повторяют поиск.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import search
+from search import SearchCache
+
+
+def session():
+    return SimpleNamespace(info={})  # reads_from_replica читает только db.info
+
+
+def test_cancelled_leader_does_not_cancel_waiters(monkeypatch):
+    calls = []
+
+    async def search_users(db, q):
+        calls.append(db)
+        await asyncio.sleep(0.05)
+        return []
+
+    monkeypatch.setattr(search, "search_users", search_users)
+    cache = SearchCache(maxsize=10, ttl=10)
+    leader_db, waiter_db = session(), session()
+
+    async def run():
+        leader = asyncio.create_task(cache.search(leader_db, "alice"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.search(waiter_db, "alice"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(run()) == []
+    assert calls == [leader_db, waiter_db]  # запрос повторен в сессии ожидавшего
+    assert cache.coalesced == 1
+    assert cache.results.get("alice") == []
@@ -0,0 +1,86 @@
+"""
+unique_id (unique_ids.py): перестановка номеров взаимно однозначна, а номера,
+зарезервированные разными процессами и разными путями выдачи (пакетная выдача
+миграций и блоки UniqueIdAllocator), не пересекаются.
+"""
+
+import asyncio
+import multiprocessing
+import random
+
+import pytest
+
+from database import engine
+from unique_ids import (
+    ALPHABET, DOMAIN, ID_LENGTH, UniqueIdAllocator, allocate_unique_ids, encode_unique_id, permute, reserve_numbers
+)
+
+
+def test_permute_is_a_bijection_on_samples():
+    rng = random.Random(1)
+    numbers = [*range(20000), *range(DOMAIN - 2000, DOMAIN), *rng.sample(range(DOMAIN), 20000)]
+    numbers = list(dict.fromkeys(numbers))
+    values = [permute(number) for number in numbers]
+    assert all(0 <= value < DOMAIN for value in values)
+    assert len(set(values)) == len(numbers)
+
+
+def test_permute_depends_on_key():
+    assert [permute(n, b"one") for n in range(100)] != [permute(n, b"two") for n in range(100)]
+
+
+@pytest.mark.parametrize("number", [-1, DOMAIN])
+def test_permute_rejects_numbers_outside_domain(number):
+    with pytest.raises(ValueError):
+        permute(number)
+
+
+def test_encoded_ids_have_fixed_length():
+    for number in (0, 1, DOMAIN - 1):
+        unique_id = encode_unique_id(number)
+        assert len(unique_id) == ID_LENGTH
+        assert set(unique_id) <= set(ALPHABET)
+
+
+def _reserve_blocks(args) -> list:
+    """Процесс-воркер: резервирует блоки номеров, каждый своей транзакцией"""
+    blocks, size = args
+    from database import engine as process_engine
+
+    numbers = []
+    for _ in range(blocks):
+        with process_engine.begin() as conn:
+            numbers.extend(reserve_numbers(conn, size))
+    process_engine.dispose()
+    return numbers
+
+
+def test_processes_reserve_disjoint_blocks(database):
+    processes, blocks, size = 4, 25, 10
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        results = pool.map(_reserve_blocks, [(blocks, size)] * processes)
+
+    numbers = [number for result in results for number in result]
+    assert len(numbers) == processes * blocks * size
+    assert len(set(numbers)) == len(numbers)
+
+
+def test_batch_and_per_request_allocation_do_not_overlap(database):
+    allocators = [UniqueIdAllocator(block_size=7) for _ in range(3)]  # как в разных воркерах
+
+    async def allocate(allocator, count):
+        return [await allocator.allocate() for _ in range(count)]
+
+    async def run():
+        ids = []
+        for round_number in range(5):
+            results = await asyncio.gather(*(allocate(allocator, 10) for allocator in allocators))
+            ids += [unique_id for result in results for unique_id in result]
+            # Пакетная выдача миграции между блоками воркеров
+            with engine.begin() as conn:
+                ids += allocate_unique_ids(conn, 25)
+        return ids
+
+    ids = asyncio.run(run())
+    assert len(ids) == 5 * (3 * 10 + 25)
+    assert len(set(ids)) == len(ids)
@@ -0,0 +1,106 @@
+"""
+Поиск пользователей (search.py): порядок уровней ранжирования и запрос для
+PostgreSQL, в котором каждый уровень ограничен своим LIMIT.
+"""
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from search import NgramIndex, search_statement
+
+
+def test_ngram_index_ranks_exact_id_then_prefix_then_substring():
+    index = NgramIndex()
+    index.build([(1, "xx_ab", "id000001"), (2, "abzz", "id000002"), (3, "abaa", "id000003"), (4, "zzzz", "ab")])
+    assert index.search("ab") == [4, 3, 2, 1]
+    assert index.search("ab", limit=2) == [4, 3]
+
+
+def test_ngram_index_substring_matches_are_first_by_nickname():
+    nicknames = [f"{prefix}_xy" for prefix in ("dd", "aa", "ee", "bb", "cc", "ff", "gg")]
+    rows = [(user_id, nickname, f"id{user_id:06d}") for user_id, nickname in zip([7, 3, 9, 1, 5, 2, 8], nicknames)]
+    index = NgramIndex()
+    index.build(rows)
+    expected = [3, 1, 5, 7, 9]  # aa, bb, cc, dd, ee
+    assert index.search("_xy") == expected
+
+    # Тот же результат при добавлении по одному в другом порядке
+    incremental = NgramIndex()
+    for row in reversed(rows):
+        incremental.add(*row)
+    assert incremental.search("_xy") == expected
+    incremental.remove(1)
+    assert incremental.search("_xy") == [3, 5, 7, 9, 2]
+
+
+def compile_postgresql(q: str) -> str:
+    statement = search_statement("postgresql", q, 5)
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.mark.parametrize("q", ["ab", "abc"])
+def test_postgresql_levels_are_limited_separately(q):
+    sql = compile_postgresql(q)
+    assert sql.count("LIMIT 5") == 3
+    assert sql.count('ORDER BY lower(users.nickname) COLLATE "C"') == 3
+
+
+def test_postgresql_two_char_substring_does_not_use_trigram_index():
+    # Без полной триграммы GIN индекс отдал бы всех пользователей
+    assert "lower(users.nickname) || ''" in compile_postgresql("ab")
+    assert "lower(users.nickname) LIKE" in compile_postgresql("abc")
+
+
+def test_sql_search_matches_ngram_index(database):
+    from sqlalchemy import select
+    from sqlalchemy.orm import Session
+
+    from database import engine
+    from models import User
+
+    with Session(engine) as db:
+        nicknames = ["qz_one", "one_qz", "aqzb", "Qzeta", "zzqz", "bqz", "qz", "oneqz_two"]
+        db.add_all(User(email=f"{nickname}@search.example.com", nickname=nickname, password_hash="-",
+                        unique_id=f"qzid{index:04d}") for index, nickname in enumerate(nicknames))
+        db.add(User(email="uid@search.example.com", nickname="by_unique_id", password_hash="-", unique_id="qz"))
+        db.commit()
+
+        index = NgramIndex()
+        index.build(db.execute(select(User.id, User.nickname, User.unique_id)).all())
+        for q in ("qz", "qz_", "one", "zet", "qzid"):
+            found = []
+            for user in db.execute(search_statement("sqlite", q, 5)).scalars():
+                if user.id not in found:
+                    found.append(user.id)
+            assert found[:5] == index.search(q, 5), q
+
+
+def test_changes_during_load_are_applied(database, monkeypatch):
+    import asyncio
+    import threading
+
+    from database import AsyncSessionLocal
+
+    started, release = threading.Event(), threading.Event()
+    build = NgramIndex.build
+
+    def slow_build(self, rows):
+        started.set()
+        release.wait(5)
+        build(self, rows)
+
+    monkeypatch.setattr(NgramIndex, "build", slow_build)
+    index = NgramIndex()
+
+    async def run():
+        loading = asyncio.create_task(index.load(AsyncSessionLocal))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        assert not index.loaded
+        index.changed(10 ** 6, "late_arrival", "late0001")  # событие во время построения
+        release.set()
+        await loading
+
+    asyncio.run(run())
+    assert index.loaded
+    assert index.search("late_arr") == [10 ** 6]
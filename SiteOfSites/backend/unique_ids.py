@@ -0,0 +1,117 @@
+"""
+Выдача unique_id без проверочных запросов к БД.
+
+Каждый пользователь получает новый номер из счетчика в БД
+(последовательность в PostgreSQL, таблица id_counters в остальных БД).
+Номер пропускается через ключевую перестановку (сеть Фейстеля) и кодируется
+в base62 фиксированной длины. Перестановка взаимно однозначна, поэтому разные
+номера всегда дают разные ID, а без ключа соседние ID не угадать.
+
+Номера резервируются блоками, так что большинство регистраций вообще
+не обращается к БД за ID.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import string
+from collections import deque
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from config import UNIQUE_ID_KEY, UNIQUE_ID_BLOCK_SIZE
+from database import async_engine
+
+ALPHABET = string.digits + string.ascii_letters
+ID_LENGTH = 8
+DOMAIN = len(ALPHABET) ** ID_LENGTH  # 62^8 ≈ 2.2 * 10^14 возможных ID
+
+HALF_BITS = 24  # 2^48 > 62^8, лишние значения отсекаются повторным шифрованием
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+SEQUENCE_NAME = "user_unique_id_seq"
+COUNTER_NAME = "user_unique_id"
+
+
+def _round(key: bytes, round_number: int, value: int) -> int:
+    digest = hmac.new(key, bytes([round_number]) + value.to_bytes(4, "big"), hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], "big") & HALF_MASK
+
+
+def _feistel(value: int, key: bytes) -> int:
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for round_number in range(ROUNDS):
+        left, right = right, left ^ _round(key, round_number, right)
+    return (left << HALF_BITS) | right
+
+
+def permute(number: int, key: bytes = UNIQUE_ID_KEY.encode()) -> int:
+    """Взаимно однозначно отображает [0, DOMAIN) на себя (cycle walking)"""
+    if not 0 <= number < DOMAIN:
+        raise ValueError("Номер вне допустимого диапазона")
+    value = _feistel(number, key)
+    while value >= DOMAIN:
+        value = _feistel(value, key)
+    return value
+
+
+def encode_unique_id(number: int) -> str:
+    value = permute(number)
+    chars = []
+    for _ in range(ID_LENGTH):
+        value, remainder = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+
+def reserve_numbers(conn: Connection, count: int) -> List[int]:
+    """Резервирует count номеров одним запросом к счетчику"""
+    if conn.dialect.name == "postgresql":
+        result = conn.execute(
+            text(f"SELECT nextval('{SEQUENCE_NAME}') FROM generate_series(1, :count)"),
+            {"count": count}
+        )
+        return list(result.scalars())
+
+    conn.execute(
+        text("INSERT INTO id_counters (name, value) SELECT :name, 0 "
+             "WHERE NOT EXISTS (SELECT 1 FROM id_counters WHERE name = :name)"),
+        {"name": COUNTER_NAME}
+    )
+    conn.execute(
+        text("UPDATE id_counters SET value = value + :count WHERE name = :name"),
+        {"name": COUNTER_NAME, "count": count}
+    )
+    last = conn.execute(
+        text("SELECT value FROM id_counters WHERE name = :name"), {"name": COUNTER_NAME}
+    ).scalar_one()
+    return list(range(last - count + 1, last + 1))
+
+
+def allocate_unique_ids(conn: Connection, count: int) -> List[str]:
+    """Пакетная выдача ID для миграций и массового импорта"""
+    return [encode_unique_id(number) for number in reserve_numbers(conn, count)]
+
+
+class UniqueIdAllocator:
+    """Раздает ID из заранее зарезервированного блока номеров"""
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self._numbers = deque()
+        self._lock = asyncio.Lock()
+
+    async def allocate(self) -> str:
+        async with self._lock:
+            if not self._numbers:
+                # Отдельная короткая транзакция, чтобы не держать счетчик
+                # заблокированным до конца запроса регистрации
+                async with async_engine.begin() as conn:
+                    self._numbers.extend(await conn.run_sync(reserve_numbers, self.block_size))
+            return encode_unique_id(self._numbers.popleft())
+
+
+unique_id_allocator = UniqueIdAllocator(UNIQUE_ID_BLOCK_SIZE)
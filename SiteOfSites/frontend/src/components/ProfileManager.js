@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { subscribeToUser, applyProjectEvent } from '../events';
 import './ProfileManager.css';
 
 const ProfileManager = ({ user, onUpdate, onClose }) => {
@@ -9,6 +10,7 @@ const ProfileManager = ({ user, onUpdate, onClose }) => {
     avatar: ''
   });
   const [projects, setProjects] = useState([]);
+  const [projectsCursor, setProjectsCursor] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
@@ -29,13 +31,27 @@ const ProfileManager = ({ user, onUpdate, onClose }) => {
     }
   }, [user]);
 
-  const fetchProjects = async () => {
+  // Проекты, измененные в другой вкладке или на другом устройстве
+  useEffect(() => {
+    if (!user) {
+      return undefined;
+    }
+    return subscribeToUser(
+      user.id,
+      (event) => setProjects(prev => applyProjectEvent(prev, event)),
+      () => fetchProjects()
+    );
+  }, [user?.id]);
+
+  const fetchProjects = async (cursor = null) => {
     try {
       const token = localStorage.getItem('access_token');
       const response = await axios.get('/api/projects', {
-        headers: { 'Authorization': `Bearer ${token}` }
+        headers: { 'Authorization': `Bearer ${token}` },
+        params: cursor ? { cursor } : {}
       });
-      setProjects(response.data);
+      setProjects(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+      setProjectsCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Ошибка загрузки проектов:', error);
     }
@@ -87,13 +103,13 @@ const ProfileManager = ({ user, onUpdate, onClose }) => {
 
     try {
       const token = localStorage.getItem('access_token');
-      await axios.post('/api/projects', projectForm, {
+      const response = await axios.post('/api/projects', projectForm, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       
       setProjectForm({ title: '', description: '' });
       setShowProjectForm(false);
-      fetchProjects();
+      setProjects(prev => [response.data, ...prev]);
       setSuccess('Проект создан');
     } catch (error) {
       setError(error.response?.data?.detail || 'Ошибка создания проекта');
@@ -113,24 +129,39 @@ const ProfileManager = ({ user, onUpdate, onClose }) => {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       
-      fetchProjects();
+      setProjects(prev => prev.filter(project => project.id !== projectId));
       setSuccess('Проект удален');
     } catch (error) {
       setError(error.response?.data?.detail || 'Ошибка удаления проекта');
     }
   };
 
-  const handleAvatarUpload = (e) => {
+  const handleAvatarUpload = async (e) => {
     const file = e.target.files[0];
-    if (file) {
-      const reader = new FileReader();
-      reader.onload = (event) => {
-        setFormData(prev => ({
-          ...prev,
-          avatar: event.target.result
-        }));
-      };
-      reader.readAsDataURL(file);
+    if (!file) {
+      return;
+    }
+    setError('');
+    setSuccess('');
+
+    // Файл уходит как есть (multipart), сервер сам уменьшает его до нужных размеров
+    const body = new FormData();
+    body.append('file', file);
+    try {
+      const token = localStorage.getItem('access_token');
+      const response = await axios.post('/api/users/avatar', body, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      setFormData(prev => ({
+        ...prev,
+        avatar: response.data.avatar
+      }));
+      setSuccess('Аватар обновлен');
+      if (onUpdate) {
+        onUpdate(response.data);
+      }
+    } catch (error) {
+      setError(error.response?.data?.detail || 'Ошибка загрузки аватара');
     }
   };
 
@@ -257,6 +288,14 @@ const ProfileManager = ({ user, onUpdate, onClose }) => {
                 </div>
               ))}
             </div>
+            {projectsCursor && (
+              <button
+                className="btn btn-secondary load-more-btn"
+                onClick={() => fetchProjects(projectsCursor)}
+              >
+                Показать еще
+              </button>
+            )}
           </div>
         </div>
       </div>
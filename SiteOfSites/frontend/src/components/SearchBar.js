@@ -95,7 +95,7 @@ const SearchBar = ({ onUserSelect }) => {
               >
                 <div className="search-result-avatar">
                   {user.avatar ? (
-                    <img src={user.avatar} alt={user.nickname} />
+                    <img src={user.avatar_thumb || user.avatar} alt={user.nickname} />
                   ) : (
                     <div className="default-avatar">
                       {user.nickname.charAt(0).toUpperCase()}
@@ -6,6 +6,7 @@ const UserProfile = ({ userId, uniqueId, onClose }) => {
   const [user, setUser] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     if (userId || uniqueId) {
@@ -34,6 +35,24 @@ const UserProfile = ({ userId, uniqueId, onClose }) => {
     }
   };
 
+  const loadMoreProjects = async () => {
+    try {
+      setLoadingMore(true);
+      const response = await axios.get(`/api/users/${user.id}/projects`, {
+        params: { cursor: user.projects_next_cursor }
+      });
+      setUser({
+        ...user,
+        projects: [...user.projects, ...response.data.items],
+        projects_next_cursor: response.data.next_cursor
+      });
+    } catch (err) {
+      console.error('Ошибка загрузки проектов:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleDateString('ru-RU', {
       year: 'numeric',
@@ -111,7 +130,7 @@ const UserProfile = ({ userId, uniqueId, onClose }) => {
           )}
 
           <div className="profile-projects">
-            <h4>Проекты ({user.projects.length})</h4>
+            <h4>Проекты ({user.projects_count})</h4>
             {user.projects.length > 0 ? (
               <div className="projects-list">
                 {user.projects.map((project) => (
@@ -129,6 +148,15 @@ const UserProfile = ({ userId, uniqueId, onClose }) => {
             ) : (
               <p className="no-projects">У пользователя пока нет проектов</p>
             )}
+            {user.projects_next_cursor && (
+              <button
+                className="btn btn-secondary load-more-btn"
+                onClick={loadMoreProjects}
+                disabled={loadingMore}
+              >
+                {loadingMore ? 'Загрузка...' : 'Показать еще'}
+              </button>
+            )}
           </div>
         </div>
       </div>
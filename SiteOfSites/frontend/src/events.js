@@ -0,0 +1,28 @@
+// События об изменении профилей и проектов (GET /api/events, Server-Sent Events).
+// EventSource сам переподключается с Last-Event-ID, и сервер досылает пропущенные события.
+// Если пропущено слишком много, приходит reset - данные нужно загрузить заново
+const EVENT_TYPES = ['user.updated', 'project.created', 'project.updated', 'project.deleted'];
+
+export const subscribeToUser = (userId, onEvent, onReset) => {
+  const source = new EventSource(`/api/events?user_id=${userId}`);
+  EVENT_TYPES.forEach(type => {
+    source.addEventListener(type, (e) => onEvent(JSON.parse(e.data)));
+  });
+  source.addEventListener('reset', () => onReset && onReset());
+  return () => source.close();
+};
+
+// Применяет событие о проекте к списку. Событие о собственном изменении,
+// уже примененном по ответу сервера, список не меняет
+export const applyProjectEvent = (projects, event) => {
+  switch (event.type) {
+    case 'project.created':
+      return projects.some(project => project.id === event.data.id) ? projects : [event.data, ...projects];
+    case 'project.updated':
+      return projects.map(project => project.id === event.data.id ? event.data : project);
+    case 'project.deleted':
+      return projects.filter(project => project.id !== event.data.id);
+    default:
+      return projects;
+  }
+};
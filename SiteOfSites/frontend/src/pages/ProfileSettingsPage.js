@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import { subscribeToUser, applyProjectEvent } from '../events';
 import './ProfileSettingsPage.css';
 
 const ProfileSettingsPage = ({ user, onUpdate }) => {
@@ -11,6 +12,7 @@ const ProfileSettingsPage = ({ user, onUpdate }) => {
     avatar: ''
   });
   const [projects, setProjects] = useState([]);
+  const [projectsCursor, setProjectsCursor] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
@@ -31,13 +33,27 @@ const ProfileSettingsPage = ({ user, onUpdate }) => {
     }
   }, [user]);
 
-  const fetchProjects = async () => {
+  // Проекты, измененные в другой вкладке или на другом устройстве
+  useEffect(() => {
+    if (!user) {
+      return undefined;
+    }
+    return subscribeToUser(
+      user.id,
+      (event) => setProjects(prev => applyProjectEvent(prev, event)),
+      () => fetchProjects()
+    );
+  }, [user?.id]);
+
+  const fetchProjects = async (cursor = null) => {
     try {
       const token = localStorage.getItem('access_token');
       const response = await axios.get('/api/projects', {
-        headers: { 'Authorization': `Bearer ${token}` }
+        headers: { 'Authorization': `Bearer ${token}` },
+        params: cursor ? { cursor } : {}
       });
-      setProjects(response.data);
+      setProjects(prev => cursor ? [...prev, ...response.data.items] : response.data.items);
+      setProjectsCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Ошибка загрузки проектов:', error);
     }
@@ -89,13 +105,13 @@ const ProfileSettingsPage = ({ user, onUpdate }) => {
 
     try {
       const token = localStorage.getItem('access_token');
-      await axios.post('/api/projects', projectForm, {
+      const response = await axios.post('/api/projects', projectForm, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       
       setProjectForm({ title: '', description: '' });
       setShowProjectForm(false);
-      fetchProjects();
+      setProjects(prev => [response.data, ...prev]);
       setSuccess('Проект создан');
     } catch (error) {
       setError(error.response?.data?.detail || 'Ошибка создания проекта');
@@ -115,7 +131,7 @@ const ProfileSettingsPage = ({ user, onUpdate }) => {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       
-      fetchProjects();
+      setProjects(prev => prev.filter(project => project.id !== projectId));
       setSuccess('Проект удален');
     } catch (error) {
       setError(error.response?.data?.detail || 'Ошибка удаления проекта');
@@ -275,6 +291,14 @@ const ProfileSettingsPage = ({ user, onUpdate }) => {
                 </div>
               ))}
             </div>
+            {projectsCursor && (
+              <button
+                className="btn btn-secondary load-more-btn"
+                onClick={() => fetchProjects(projectsCursor)}
+              >
+                Показать еще
+              </button>
+            )}
           </div>
         </div>
       </div>
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import axios from 'axios';
+import { subscribeToUser, applyProjectEvent } from '../events';
 import './UserProfilePage.css';
 
 const UserProfilePage = ({ user }) => {
@@ -9,11 +10,36 @@ const UserProfilePage = ({ user }) => {
   const [profileUser, setProfileUser] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchUserProfile();
   }, [uniqueId]);
 
+  // Изменения профиля и проектов приходят без перезагрузки страницы
+  useEffect(() => {
+    if (!profileUser) {
+      return undefined;
+    }
+    return subscribeToUser(profileUser.id, applyEvent, fetchUserProfile);
+  }, [profileUser?.id]);
+
+  const applyEvent = (event) => {
+    setProfileUser(prev => {
+      if (event.type === 'user.updated') {
+        return { ...prev, ...event.data };
+      }
+      const projects = applyProjectEvent(prev.projects, event);
+      let projectsCount = prev.projects_count;
+      if (event.type === 'project.created' && projects !== prev.projects) {
+        projectsCount += 1;
+      } else if (event.type === 'project.deleted') {
+        projectsCount -= 1;
+      }
+      return { ...prev, projects, projects_count: projectsCount };
+    });
+  };
+
   const fetchUserProfile = async () => {
     try {
       setLoading(true);
@@ -29,6 +55,24 @@ const UserProfilePage = ({ user }) => {
     }
   };
 
+  const loadMoreProjects = async () => {
+    try {
+      setLoadingMore(true);
+      const response = await axios.get(`/api/users/${profileUser.id}/projects`, {
+        params: { cursor: profileUser.projects_next_cursor }
+      });
+      setProfileUser({
+        ...profileUser,
+        projects: [...profileUser.projects, ...response.data.items],
+        projects_next_cursor: response.data.next_cursor
+      });
+    } catch (err) {
+      console.error('Ошибка загрузки проектов:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleDateString('ru-RU', {
       year: 'numeric',
@@ -112,7 +156,7 @@ const UserProfilePage = ({ user }) => {
           )}
 
           <div className="profile-projects">
-            <h3>Проекты ({profileUser.projects.length})</h3>
+            <h3>Проекты ({profileUser.projects_count})</h3>
             {profileUser.projects.length > 0 ? (
               <div className="projects-list">
                 {profileUser.projects.map((project) => (
@@ -130,6 +174,15 @@ const UserProfilePage = ({ user }) => {
             ) : (
               <p className="no-projects">У пользователя пока нет проектов</p>
             )}
+            {profileUser.projects_next_cursor && (
+              <button
+                className="btn btn-secondary load-more-btn"
+                onClick={loadMoreProjects}
+                disabled={loadingMore}
+              >
+                {loadingMore ? 'Загрузка...' : 'Показать еще'}
+              </button>
+            )}
           </div>
         </div>
       </div>
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Память воркера SiteOfSites при одновременной загрузке аватаров.
+
+    python benchmarks/avatar_upload.py --clients 20
+
+Для каждого способа загрузки запускается отдельный сервер (gunicorn.conf.py,
+один воркер, временная SQLite база), clients пользователей одновременно
+загружают одну и ту же фотографию (JPEG 6 Мп, около 3 МБ), а RSS воркера
+читается из /proc каждые 10 мс (только Linux):
+- json - data URL в теле PUT /api/users/profile (как раньше)
+- multipart - файл в POST /api/users/avatar
+
+В результате RSS до загрузок, пик и прирост, время всех загрузок и статусы ответов.
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+import httpx
+from PIL import Image
+
+from startup import Server
+
+MODES = ("json", "multipart")
+SAMPLE_INTERVAL = 0.01
+
+
+def photo() -> bytes:
+    """Шумная картинка, которая плохо сжимается, как настоящая фотография"""
+    image = Image.merge("RGB", [Image.effect_noise((3000, 2000), 80) for _ in range(3)])
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=75)
+    return buffer.getvalue()
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+async def register(http: httpx.AsyncClient, index: int) -> dict:
+    email = f"avatar{index}@bench.local"
+    response = await http.post("/api/auth/register", json={
+        "email": email, "nickname": f"avatar{index}", "password": "secret1", "confirm_password": "secret1",
+    })
+    response.raise_for_status()
+    return {"Authorization": "Bearer " + response.json()["access_token"]}
+
+
+async def upload(http: httpx.AsyncClient, mode: str, headers: dict, data: bytes) -> int:
+    if mode == "json":
+        body = {"avatar": "data:image/jpeg;base64," + base64.b64encode(data).decode()}
+        response = await http.put("/api/users/profile", json=body, headers=headers)
+    else:
+        response = await http.post("/api/users/avatar", files={"file": ("photo.jpg", data, "image/jpeg")},
+                                   headers=headers)
+    return response.status_code
+
+
+async def run_mode(mode: str, clients: int, data: bytes) -> dict:
+    server = Server("siteofsites", 1)
+    server.start()
+    try:
+        await asyncio.to_thread(server.wait_first_response)
+        await asyncio.to_thread(server.wait_ready, 1)
+        [pid] = server.ready
+        async with httpx.AsyncClient(base_url=server.url, timeout=120) as http:
+            headers = await asyncio.gather(*(register(http, index) for index in range(clients)))
+            baseline = rss_bytes(pid)
+            peak = baseline
+            done = asyncio.Event()
+
+            async def sample():
+                nonlocal peak
+                while not done.is_set():
+                    peak = max(peak, rss_bytes(pid))
+                    await asyncio.sleep(SAMPLE_INTERVAL)
+
+            sampler = asyncio.create_task(sample())
+            started = time.perf_counter()
+            statuses = await asyncio.gather(*(upload(http, mode, item, data) for item in headers))
+            elapsed = time.perf_counter() - started
+            done.set()
+            await sampler
+        return {
+            "mode": mode,
+            "rss_before_mb": round(baseline / 2 ** 20, 1),
+            "rss_peak_mb": round(peak / 2 ** 20, 1),
+            "rss_growth_mb": round((peak - baseline) / 2 ** 20, 1),
+            "seconds": round(elapsed, 2),
+            "statuses": dict(Counter(statuses)),
+        }
+    finally:
+        server.stop()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--mode", choices=MODES, nargs="+", default=list(MODES))
+    args = parser.parse_args(argv)
+
+    data = photo()
+    results = []
+    for mode in args.mode:
+        results.append(asyncio.run(run_mode(mode, args.clients, data)))
+        print(f"  {mode}: {results[-1]}", file=sys.stderr)
+    print(json.dumps({"clients": args.clients, "upload_bytes": len(data), "cpu_count": os.cpu_count(),
+                      "runs": results}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
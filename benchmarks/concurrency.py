@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность и задержки SiteOfSites под множеством одновременных клиентов.
+
+    python benchmarks/concurrency.py --clients 200
+    python benchmarks/concurrency.py --app-dir /tmp/before/SiteOfSites/backend --clients 200
+    python benchmarks/concurrency.py --clients 200 --db-latency-ms 2
+
+Приложение из --app-dir (по умолчанию текущее SiteOfSites/backend) запускается
+одним процессом uvicorn на временной SQLite базе или на --database-url. После
+заполнения (seed из siteofsites.py: пользователи и проекты) --clients клиентов
+одновременно выполняют по --iterations итераций: профиль по id, поиск по первым
+трем символам никнейма и список своих проектов. Печатаются общая пропускная
+способность и p50/p95/p99 по каждому endpoint.
+
+Локальная SQLite отвечает за микросекунды, и блокирующий вызов почти не мешает
+другим запросам. --db-latency-ms добавляет задержку к каждому запросу к SQLite,
+как сетевой round trip до PostgreSQL.
+
+--app-dir позволяет сравнить до и после изменения: каталог backend из git
+worktree нужного коммита (см. README).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+APP_DIR = os.path.join(ROOT_DIR, "SiteOfSites", "backend")
+START_TIMEOUT = 60
+
+
+def serve(port: int, db_latency_ms: float):
+    """
+    Дочерний процесс: uvicorn с приложением из текущего каталога. db_latency_ms
+    добавляется к каждому запросу SQLite, как сетевой round trip до PostgreSQL:
+    задержка выполняется там же, где драйвер ждал бы сеть (в потоке aiosqlite или
+    в потоке цикла событий при синхронной Session в async обработчике).
+    """
+    import sqlite3
+    import uvicorn
+
+    if db_latency_ms:
+        delay = db_latency_ms / 1000
+
+        class Cursor(sqlite3.Cursor):
+            def execute(self, *args):
+                time.sleep(delay)
+                return super().execute(*args)
+
+            def executemany(self, *args):
+                time.sleep(delay)
+                return super().executemany(*args)
+
+        class Connection(sqlite3.Connection):
+            def cursor(self, factory=Cursor):
+                return super().cursor(factory)
+
+        connect = sqlite3.connect
+        # pysqlite берет connect из sqlite3.dbapi2, aiosqlite - из sqlite3
+        sqlite3.connect = sqlite3.dbapi2.connect = lambda *a, **kw: connect(*a, factory=Connection, **kw)
+
+    sys.path.insert(0, os.getcwd())
+    uvicorn.run("main:app", host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_server(app_dir: str, database_url: str, db_latency_ms: float) -> tuple:
+    from startup import free_port
+
+    port = free_port()
+    env = {**os.environ, "DATABASE_URL": database_url}
+    subprocess.run([sys.executable, "init_db.py"], cwd=app_dir, env=env, check=True, stdout=subprocess.DEVNULL)
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(port), "--db-latency-ms", str(db_latency_ms)],
+        cwd=app_dir, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/", timeout=1).status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("сервер не ответил")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=START_TIMEOUT)
+    except subprocess.TimeoutExpired:  # цикл событий заблокирован синхронным вызовом
+        process.kill()
+        process.wait()
+
+
+async def get(client, rec, name: str, url: str, **kwargs):
+    """GET, в котором обрыв соединения или таймаут - ошибка в отчете, а не конец прогона"""
+    started = time.perf_counter()
+    try:
+        await rec.call(client, name, "GET", url, **kwargs)
+    except httpx.TransportError:
+        rec.latencies[name].append(time.perf_counter() - started)
+        rec.errors[name] += 1
+
+
+async def reads(client, rec, rng, context):
+    """Профиль, поиск и свои проекты - запросы, которые ждут БД"""
+    user = rng.choice(context["users"])
+    await get(client, rec, "GET /api/users/{user_id}", f"/api/users/{user['id']}")
+    await get(client, rec, "GET /api/users/search", "/api/users/search", params={"q": user["nickname"][:3]})
+    await get(client, rec, "GET /api/projects", "/api/projects", headers=user["headers"])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=APP_DIR, help="каталог backend SiteOfSites")
+    parser.add_argument("--database-url", help="пустая база; по умолчанию временная SQLite")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0,
+                        help="задержка на каждый запрос к SQLite, имитирует сеть до БД")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)  # порт, запуск сервера
+    args = parser.parse_args(argv)
+    if args.serve:
+        serve(args.serve, args.db_latency_ms)
+        return 0
+
+    sys.path.insert(0, BENCHMARKS_DIR)
+    from harness import Scenario, Target, database_kind, run_scenario
+    from siteofsites import seed
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(prefix="bench-concurrency-"), "bench.db")
+    process, url = start_server(os.path.abspath(args.app_dir), database_url, args.db_latency_ms)
+    scenario = Scenario("reads", reads, users=args.clients, iterations=args.iterations, setup=seed)
+    try:
+        async def run() -> dict:
+            async with Target(url=url).client() as client:
+                return await run_scenario(client, scenario, {}, args.seed)
+
+        result = asyncio.run(run())
+    finally:
+        stop_server(process)
+    print(json.dumps({"app_dir": args.app_dir, "database": database_kind(database_url),
+                      "clients": args.clients,
+                      "db_latency_ms": args.db_latency_ms, **result}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Раздача событий GET /api/events (SiteOfSites, events.py) большому числу подписчиков.
+
+    python benchmarks/events_fanout.py --clients 1000 5000 --events 20
+
+Для каждого числа клиентов запускается сервер (gunicorn.conf.py, один воркер,
+временная SQLite база) и открывается clients соединений SSE. Клиенты - простые
+сокеты asyncio, чтобы сам бенчмарк не был узким местом. Затем --events раз
+создается проект, и каждый клиент отмечает, когда получил событие о нем.
+
+В результате:
+- rss_per_connection_kb - прирост RSS воркера на одно простаивающее соединение (только Linux)
+- connect_seconds - время открытия всех соединений
+- latency_ms - от отправки POST /api/projects до получения события клиентом (p50/p99/max)
+- delivered / expected - сколько событий дошло
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from avatar_upload import rss_bytes
+from startup import Server
+
+MARKER_RE = re.compile(rb'"title":"bench-(\d+)"')
+CONNECT_BATCH = 200
+
+
+class Client:
+    def __init__(self):
+        self.received = {}  # номер события -> время получения
+
+    async def connect(self, host: str, port: int):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(f"GET /api/events HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+        await self.writer.drain()
+        headers = await self.reader.readuntil(b"\r\n\r\n")
+        if not headers.startswith(b"HTTP/1.1 200"):
+            raise RuntimeError(headers.decode(errors="replace"))
+
+    async def listen(self):
+        tail = b""
+        while True:
+            chunk = await self.reader.read(65536)
+            if not chunk:
+                return
+            now = time.perf_counter()
+            data = tail + chunk
+            for match in MARKER_RE.finditer(data):
+                self.received.setdefault(int(match.group(1)), now)
+            tail = data[-64:]
+
+    def close(self):
+        self.writer.close()
+
+
+async def run(clients_count: int, events: int, interval: float) -> dict:
+    server = Server("siteofsites", 1)
+    server.start()
+    try:
+        await asyncio.to_thread(server.wait_first_response)
+        await asyncio.to_thread(server.wait_ready, 1)
+        [pid] = server.ready
+        address = urlsplit(server.url)
+        async with httpx.AsyncClient(base_url=server.url, timeout=60) as http:
+            response = await http.post("/api/auth/register", json={
+                "email": "writer@bench.local", "nickname": "writer", "password": "secret1", "confirm_password": "secret1",
+            })
+            response.raise_for_status()
+            headers = {"Authorization": "Bearer " + response.json()["access_token"]}
+
+            rss_before = rss_bytes(pid)
+            clients = [Client() for _ in range(clients_count)]
+            started = time.perf_counter()
+            for offset in range(0, clients_count, CONNECT_BATCH):
+                await asyncio.gather(*(
+                    client.connect(address.hostname, address.port) for client in clients[offset:offset + CONNECT_BATCH]
+                ))
+            connect_seconds = time.perf_counter() - started
+            listeners = [asyncio.create_task(client.listen()) for client in clients]
+            await asyncio.sleep(1)
+            rss_after = rss_bytes(pid)
+
+            sent = {}
+            for number in range(events):
+                sent[number] = time.perf_counter()
+                response = await http.post("/api/projects", json={"title": f"bench-{number}"}, headers=headers)
+                response.raise_for_status()
+                await asyncio.sleep(interval)
+            await asyncio.sleep(2)
+
+            latencies = [
+                (received - sent[number]) * 1000
+                for client in clients for number, received in client.received.items()
+            ]
+            metrics = (await http.get("/metrics")).text
+            dropped = re.search(r"^events_dropped_subscribers_total (\S+)", metrics, re.M).group(1)
+            for listener in listeners:
+                listener.cancel()
+            for client in clients:
+                client.close()
+        latencies.sort()
+        return {
+            "clients": clients_count,
+            "rss_per_connection_kb": round((rss_after - rss_before) / clients_count / 1024, 1),
+            "connect_seconds": round(connect_seconds, 2),
+            "expected": clients_count * events,
+            "delivered": len(latencies),
+            "dropped_subscribers": float(dropped),
+            "latency_ms": {
+                "p50": round(statistics.median(latencies), 1),
+                "p99": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 1),
+                "max": round(latencies[-1], 1),
+            } if latencies else None,
+        }
+    finally:
+        server.stop()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.2, help="пауза между событиями, с")
+    args = parser.parse_args(argv)
+
+    results = []
+    for clients in args.clients:
+        results.append(asyncio.run(run(clients, args.events, args.interval)))
+        print(f"  {clients} клиентов: {results[-1]}", file=sys.stderr)
+    print(json.dumps({"events": args.events, "cpu_count": os.cpu_count(), "runs": results},
+                     ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
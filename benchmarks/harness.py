@@ -0,0 +1,190 @@
+"""
+Общая часть нагрузочных тестов: запуск сценариев, сбор задержек,
+отчет в JSON и сравнение с сохраненным базовым результатом.
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, nullcontext, redirect_stdout
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+import httpx
+
+# Метка запуска в email и никнеймах, чтобы повторный прогон против того же сервера
+# не упирался в уже зарегистрированных пользователей
+RUN_ID = format(int(time.time()) % 16 ** 6, "06x")
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Процентиль по ближайшему рангу, sorted_values уже отсортирован"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class Recorder:
+    """Задержки и ошибки по каждому endpoint внутри одного сценария"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str,
+                   expected: Iterable[int] = (200,), **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[name].append(time.perf_counter() - started)
+        if response.status_code not in expected:
+            self.errors[name] += 1
+        return response
+
+    @asynccontextmanager
+    async def timed(self, name: str):
+        """Общее время группы запросов (например, импорт из многих вызовов) как отдельная строка отчета"""
+        started = time.perf_counter()
+        errors = sum(self.errors.values())
+        yield
+        self.latencies[name].append(time.perf_counter() - started)
+        if sum(self.errors.values()) > errors:
+            self.errors[name] += 1
+
+    def summary(self, wall_time: float) -> dict:
+        endpoints = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            endpoints[name] = {
+                "requests": len(values),
+                "errors": self.errors.get(name, 0),
+                "throughput_rps": round(len(values) / wall_time, 2) if wall_time else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p95_ms": round(percentile(values, 95) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        return {
+            "wall_time_s": round(wall_time, 3),
+            "requests": total,
+            "throughput_rps": round(total / wall_time, 2) if wall_time else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+# Шаг сценария: один "пользователь" выполняет одну итерацию
+Step = Callable[[httpx.AsyncClient, Recorder, random.Random, dict], Awaitable[None]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    step: Step
+    users: int = 10           # одновременных клиентов
+    iterations: int = 20      # итераций на клиента
+    setup: Optional[Callable[[httpx.AsyncClient, dict], Awaitable[None]]] = None
+
+
+@dataclass
+class Target:
+    """Приложение под нагрузкой: ASGI app в этом процессе или адрес запущенного сервера"""
+    app: object = None
+    url: Optional[str] = None
+    info: dict = field(default_factory=dict)
+
+    def client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        if self.url:
+            return httpx.AsyncClient(base_url=self.url, timeout=60, limits=limits)
+        # Необработанное исключение в приложении считаем ответом 500, а не падением прогона
+        transport = httpx.ASGITransport(app=self.app, raise_app_exceptions=False)
+        return httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60, limits=limits)
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, context: dict, seed: int) -> dict:
+    if scenario.setup is not None:
+        await scenario.setup(client, context)
+
+    recorder = Recorder()
+
+    async def user(index: int):
+        rng = random.Random(f"{seed}:{scenario.name}:{index}")
+        for _ in range(scenario.iterations):
+            await scenario.step(client, recorder, rng, context)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(scenario.users)))
+    return recorder.summary(time.perf_counter() - started)
+
+
+async def run_target(target: Target, scenarios: List[Scenario], seed: int = 1) -> dict:
+    # lifespan приложения (прогрев и остановка) выполняем сами: ASGITransport его не вызывает
+    async with (target.app.router.lifespan_context(target.app) if target.app else nullcontext()):
+        context: dict = {}
+        results = {}
+        async with target.client() as client:
+            for scenario in scenarios:
+                results[scenario.name] = await run_scenario(client, scenario, context, seed)
+                print(f"  {scenario.name}: {results[scenario.name]['throughput_rps']} rps", file=sys.stderr)
+        return {**target.info, "scenarios": results}
+
+
+def load_app(app_dir: str, database_url: Optional[str]):
+    """
+    Создает таблицы (init_db.py) и импортирует main.py приложения с нужной БД.
+    Модули обоих приложений называются одинаково (main, models, database),
+    поэтому в одном процессе загружается только одно приложение.
+    """
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = database_url
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+    import init_db
+    with redirect_stdout(sys.stderr):  # stdout занят JSON результатом
+        init_db.init_db()
+    import main
+    return main.app, database_url
+
+
+def database_kind(database_url: str) -> str:
+    return database_url.split(":", 1)[0].split("+", 1)[0]
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Возвращает список регрессий: p95 вырос или пропускная способность упала
+    больше чем на tolerance (0.25 = 25%) относительно базового результата
+    """
+    regressions = []
+    for scenario_name, base_scenario in baseline.get("scenarios", {}).items():
+        scenario = result.get("scenarios", {}).get(scenario_name)
+        if scenario is None:
+            continue
+        for endpoint, base in base_scenario["endpoints"].items():
+            current = scenario["endpoints"].get(endpoint)
+            if current is None:
+                regressions.append(f"{scenario_name} / {endpoint}: endpoint пропал из результата")
+                continue
+            where = f"{scenario_name} / {endpoint}"
+            if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{where}: p95 {current['p95_ms']} мс, было {base['p95_ms']} мс")
+            if base["throughput_rps"] and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{where}: {current['throughput_rps']} rps, было {base['throughput_rps']} rps"
+                )
+            if current["errors"] > base["errors"]:
+                regressions.append(f"{where}: ошибок {current['errors']}, было {base['errors']}")
+    return regressions
+
+
+def write_json(path: str, data: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Задержка обычных запросов SiteOfSites во время волны входов (Argon2).
+
+    python benchmarks/login_storm.py --logins 100
+    python benchmarks/login_storm.py --app-dir /tmp/before/SiteOfSites/backend --logins 100
+
+Приложение из --app-dir (по умолчанию текущее SiteOfSites/backend) запускается
+одним процессом uvicorn на временной SQLite базе, как в concurrency.py. После
+заполнения (seed из siteofsites.py) --probes клиентов непрерывно запрашивают
+GET /api/users/search по префиксам никнеймов, сначала --quiet секунд без другой
+нагрузки, затем пока выполняются --logins одновременных POST /api/auth/login.
+
+Печатаются p50/p95/p99 поиска в тишине и во время волны, время волны и число
+ошибок входа. Сравнение до и после - через --app-dir (см. README).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+APP_DIR = os.path.join(ROOT_DIR, "SiteOfSites", "backend")
+PROBE_INTERVAL = 0.005
+
+
+async def storm(url: str, args) -> dict:
+    from harness import Recorder, Target
+    from siteofsites import PASSWORD, seed
+
+    rng = random.Random(args.seed)
+    context = {}
+    async with Target(url=url).client() as client:
+        await seed(client, context)
+        users = context["users"]
+
+        async def probe(recorder: Recorder, stop: asyncio.Event):
+            while not stop.is_set():
+                nickname = rng.choice(users)["nickname"]
+                await recorder.call(client, "search", "GET", "/api/users/search",
+                                    params={"q": nickname[:rng.randint(2, 4)]})
+                await asyncio.sleep(PROBE_INTERVAL)
+
+        async def probing(recorder: Recorder, load) -> float:
+            stop = asyncio.Event()
+            probes = [asyncio.create_task(probe(recorder, stop)) for _ in range(args.probes)]
+            started = time.perf_counter()
+            await load()
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await asyncio.gather(*probes)
+            return elapsed
+
+        quiet = Recorder()
+        await probing(quiet, lambda: asyncio.sleep(args.quiet))
+
+        logins = Recorder()
+
+        async def login_wave():
+            await asyncio.gather(*(
+                logins.call(client, "login", "POST", "/api/auth/login",
+                            json={"email": users[i % len(users)]["email"], "password": PASSWORD})
+                for i in range(args.logins)
+            ))
+
+        during = Recorder()
+        storm_seconds = await probing(during, login_wave)
+
+    login = logins.summary(storm_seconds)["endpoints"]["login"]
+    return {
+        "search_quiet": quiet.summary(args.quiet)["endpoints"]["search"],
+        "search_during_logins": during.summary(storm_seconds)["endpoints"]["search"],
+        "logins": {"count": args.logins, "errors": login["errors"], "wall_time_s": round(storm_seconds, 2),
+                   "p50_ms": login["p50_ms"], "p99_ms": login["p99_ms"]},
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=APP_DIR, help="каталог backend SiteOfSites")
+    parser.add_argument("--database-url", help="пустая база; по умолчанию временная SQLite")
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--probes", type=int, default=4, help="клиентов, запрашивающих поиск")
+    parser.add_argument("--quiet", type=float, default=3.0, help="секунд замера без входов")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BENCHMARKS_DIR)
+    from concurrency import start_server, stop_server
+    from harness import database_kind
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(
+        tempfile.mkdtemp(prefix="bench-login-storm-"), "bench.db")
+    process, url = start_server(os.path.abspath(args.app_dir), database_url, 0)
+    try:
+        result = asyncio.run(storm(url, args))
+    finally:
+        stop_server(process)
+    print(json.dumps({"app_dir": args.app_dir, "database": database_kind(database_url), **result},
+                     ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Время полнотекстового поиска проектов SiteOfSites (project_search.py) на большой таблице.
+
+    python benchmarks/project_search.py --projects 1000000
+    python benchmarks/project_search.py --database-url postgresql://... --projects 1000000
+
+Таблица заполняется синтетическими проектами: слова из словаря --vocabulary
+выбираются по закону Ципфа, как в обычном тексте (несколько слов встречаются
+почти везде, большинство - редко). Самые частые слова (--skip-common) в
+запросы не берутся - это аналог стоп-слов, которые PostgreSQL выбрасывает сам.
+
+Запросы по группам (частота слова определяет число совпадений):
+- rare / medium / common - одно слово из редких, средних и частых
+- two_words - два слова из частых и средних
+- prefix - префикс из 3 букв (поиск по мере ввода)
+- next_page - вторая страница запроса medium по курсору
+- next_window - только для sort=recent: первая страница после
+  PROJECT_SEARCH_MAX_CANDIDATES самых новых совпадений запроса common
+  (листание переходит в следующее окно)
+
+Группы измеряются для каждого порядка выдачи из --sort: relevance (все
+совпадения по оценке, по умолчанию в API) и recent (окна от новых к старым).
+Каждый запрос - отдельная сессия, как в обработчике, время включает разбор
+строк результата. Печатаются p50/p95/p99 в миллисекундах и медиана числа совпадений.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from itertools import accumulate
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+APP_DIR = os.path.join(ROOT_DIR, "SiteOfSites", "backend")
+BATCH_SIZE = 20000
+USERS = 10000
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    syllables = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def fill(projects: int, vocabulary: list, seed: int):
+    """Пользователи и проекты через синхронный движок, порциями по BATCH_SIZE"""
+    from sqlalchemy import insert
+    from database import engine
+    from models import Project, User
+
+    rng = random.Random(seed)
+    weights = list(accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+
+    def text(low: int, high: int) -> str:
+        return " ".join(rng.choices(vocabulary, cum_weights=weights, k=rng.randint(low, high)))
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"unique_id": f"u{index:07d}", "nickname": f"user{index}", "email": f"user{index}@bench.local",
+             "password_hash": "-"} for index in range(USERS)
+        ])
+    started = time.perf_counter()
+    for offset in range(0, projects, BATCH_SIZE):
+        rows = [
+            {"title": text(2, 6)[:100], "description": text(10, 40), "owner_id": rng.randint(1, USERS)}
+            for _ in range(min(BATCH_SIZE, projects - offset))
+        ]
+        with engine.begin() as conn:
+            conn.execute(insert(Project), rows)
+        print(f"  {offset + len(rows)} проектов, {time.perf_counter() - started:.0f} с", file=sys.stderr)
+
+
+def query_groups(vocabulary: list, skip_common: int, queries: int, rng: random.Random) -> dict:
+    def pick(low: int, high: int) -> str:
+        return vocabulary[rng.randrange(low, min(high, len(vocabulary)))]
+
+    return {
+        "rare": [pick(len(vocabulary) // 2, len(vocabulary)) for _ in range(queries)],
+        "medium": [pick(1000, 5000) for _ in range(queries)],
+        "common": [pick(skip_common, skip_common * 4) for _ in range(queries)],
+        "two_words": [f"{pick(skip_common, 1000)} {pick(skip_common, 1000)}" for _ in range(queries)],
+        "prefix": [pick(skip_common, len(vocabulary))[:3] for _ in range(queries)],
+    }
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def measure(groups: dict, limit: int, sort: str) -> dict:
+    from sqlalchemy import func, select
+    from database import AsyncSessionLocal
+    from config import PROJECT_SEARCH_MAX_CANDIDATES
+    from project_search import query_terms, search_projects, search_statement
+
+    async def timed(q: str, cursor=None):
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            rows, next_cursor = await search_projects(db, q, cursor, limit, sort)
+            return (time.perf_counter() - started) * 1000, next_cursor
+
+    async def matches(q: str) -> int:
+        async with AsyncSessionLocal() as db:
+            # все совпадения, без ограничения числа ранжируемых
+            statement, _ = search_statement(db.get_bind().dialect.name, query_terms(q), sys.maxsize)
+            return await db.scalar(select(func.count()).select_from(statement.subquery()))
+
+    results = {}
+    cursors = []
+    for name, queries in groups.items():
+        for q in queries[:5]:  # прогрев кэша страниц БД
+            await timed(q)
+        times = []
+        for q in queries:
+            elapsed, next_cursor = await timed(q)
+            times.append(elapsed)
+            if name == "medium" and next_cursor:
+                cursors.append((q, next_cursor))
+        results[name] = {
+            "p50_ms": round(statistics.median(times), 2),
+            "p95_ms": round(percentile(times, 0.95), 2),
+            "p99_ms": round(percentile(times, 0.99), 2),
+            "matches_median": statistics.median([await matches(q) for q in queries[:20]]),
+        }
+    if cursors:
+        times = [(await timed(q, cursor))[0] for q, cursor in cursors]
+        results["next_page"] = {
+            "p50_ms": round(statistics.median(times), 2),
+            "p95_ms": round(percentile(times, 0.95), 2),
+            "p99_ms": round(percentile(times, 0.99), 2),
+        }
+
+    if sort != "recent":
+        return results
+    times = []
+    for q in groups["common"][:20]:
+        cursor, seen = None, 0
+        while True:
+            elapsed, cursor = await timed(q, cursor)
+            seen += limit
+            if seen > PROJECT_SEARCH_MAX_CANDIDATES or cursor is None:
+                break
+        if seen > PROJECT_SEARCH_MAX_CANDIDATES:
+            times.append(elapsed)
+    if times:
+        results["next_window"] = {
+            "p50_ms": round(statistics.median(times), 2),
+            "p95_ms": round(percentile(times, 0.95), 2),
+            "p99_ms": round(percentile(times, 0.99), 2),
+        }
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="пустая база; по умолчанию временная SQLite")
+    parser.add_argument("--projects", type=int, default=1000000)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--skip-common", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--sort", nargs="+", choices=["relevance", "recent"], default=["relevance", "recent"])
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BENCHMARKS_DIR)
+    from harness import database_kind, load_app
+    _, database_url = load_app(APP_DIR, args.database_url)
+
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    fill(args.projects, vocabulary, args.seed)
+    groups = query_groups(vocabulary, args.skip_common, args.queries, rng)
+    results = {sort: asyncio.run(measure(groups, args.limit, sort)) for sort in args.sort}
+    print(json.dumps({"database": database_kind(database_url), "projects": args.projects,
+                      "limit": args.limit, "queries": results}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Сценарии нагрузки для PythonProject.
+"""
+
+import asyncio
+import itertools
+import os
+from typing import List
+
+from harness import RUN_ID, Scenario, Target, database_kind, load_app
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "PythonProject")
+
+PASSWORD = "benchmark-password"
+SEED_USERS = 30
+SEED_POSTS = 10            # постов у каждого пользователя
+REGISTER_CONCURRENCY = 8   # регистрации упираются в пул Argon2, не переполняем его очередь
+# Обработчики PythonProject объявлены async, но работают с синхронной Session:
+# если свободных соединений в пуле (5 + 10) нет, ожидание блокирует event loop,
+# и запросы, которые могли бы вернуть соединения, встают. Поэтому одновременных
+# клиентов меньше, чем соединений в пуле
+MAX_CLIENTS = 10
+
+_sequence = itertools.count()
+
+
+async def _login(client, email: str) -> dict:
+    response = await client.post("/login", json={"email": email, "password": PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def seed(client, context: dict):
+    """Пользователи и посты, с которыми работают сценарии чтения"""
+    if "users" in context:
+        return
+    semaphore = asyncio.Semaphore(REGISTER_CONCURRENCY)
+
+    async def register(i: int):
+        email = f"seed{RUN_ID}{i}@bench.example.com"
+        async with semaphore:
+            response = await client.post("/register", json={
+                "name": f"seed{i}", "age": 20, "email": email, "password": PASSWORD
+            })
+            response.raise_for_status()
+            headers = await _login(client, email)
+            for n in range(SEED_POSTS):
+                response = await client.post("/posts/", json={"content": f"Пост {n} " * 20}, headers=headers)
+                response.raise_for_status()
+        return {"headers": headers}
+
+    context["users"] = await asyncio.gather(*(register(i) for i in range(SEED_USERS)))
+
+
+async def auth_storm(client, rec, rng, context):
+    """Регистрация нового пользователя и вход под ним"""
+    number = next(_sequence)
+    email = f"storm{RUN_ID}{number}@bench.example.com"
+    await rec.call(client, "POST /register", "POST", "/register", json={
+        "name": f"storm{number}", "age": 20, "email": email, "password": PASSWORD
+    })
+    await rec.call(client, "POST /login", "POST", "/login", json={"email": email, "password": PASSWORD})
+
+
+async def post_feed(client, rec, rng, context):
+    """Чтение общей ленты и своих постов"""
+    headers = rng.choice(context["users"])["headers"]
+    await rec.call(client, "GET /posts/", "GET", "/posts/", headers=headers)
+    await rec.call(client, "GET /posts/my", "GET", "/posts/my", headers=headers)
+
+
+async def post_crud(client, rec, rng, context):
+    """Публикация и удаление поста"""
+    headers = rng.choice(context["users"])["headers"]
+    response = await rec.call(client, "POST /posts/", "POST", "/posts/", json={"content": "Новый пост"},
+                              headers=headers)
+    await rec.call(client, "DELETE /posts/{post_id}", "DELETE", f"/posts/{response.json()['id']}",
+                   headers=headers)
+
+
+def scenarios(scale: float = 1.0) -> List[Scenario]:
+    def n(value: int) -> int:
+        return max(1, int(value * scale))
+
+    return [
+        Scenario("auth_storm", auth_storm, users=min(n(8), MAX_CLIENTS), iterations=n(8)),
+        Scenario("post_feed", post_feed, users=min(n(10), MAX_CLIENTS), iterations=n(40), setup=seed),
+        Scenario("post_crud", post_crud, users=min(n(10), MAX_CLIENTS), iterations=n(10), setup=seed),
+    ]
+
+
+def target(database_url: str = None, url: str = None) -> Target:
+    if url:
+        return Target(url=url, info={"app": "pythonproject", "transport": "http"})
+
+    app, database_url = load_app(APP_DIR, database_url)
+    return Target(
+        app=app,
+        info={"app": "pythonproject", "transport": "asgi", "database": database_kind(database_url)},
+    )
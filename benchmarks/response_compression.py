@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Сжатие ответов SiteOfSites (compression.py): размер и время сжатия на запрос.
+
+    python benchmarks/response_compression.py --projects 20 --requests 200
+
+Приложение запускается в процессе (временная SQLite), создается пользователь с
+--projects проектами. Каждый endpoint запрашивается --requests раз с
+Accept-Encoding: identity, gzip и br:
+- profile - GET /api/users/by-unique-id/{id}, ответ с ETag: сжимается один раз, дальше из кэша
+- projects - GET /api/projects, сжимается на каждый запрос
+- login - POST /api/auth/login: ответ с пользователем, со ссылками на аватары он меньше COMPRESSION_MIN_SIZE
+
+В результате для каждого endpoint и кодировки:
+- bytes - размер тела ответа на проводе
+- saved_percent - экономия относительно identity
+- compress_us_per_request - время сжатия на запрос по метрике http_compression_seconds_total
+- p50_ms - время ответа целиком
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+APP_DIR = os.path.join(ROOT_DIR, "SiteOfSites", "backend")
+ENCODINGS = ("identity", "gzip", "br")
+WORDS = (
+    "сайт портфолио каталог работ поиск по тегам темная тема адаптивная верстка заказчик образование "
+    "личный кабинет загрузка материалов уведомления комментарии интеграция оплата аналитика дизайн "
+    "лендинг магазин блог галерея отзывы команда сроки бюджет прототип тестирование запуск поддержка"
+).split()
+
+
+def description(rng: random.Random) -> str:
+    """Описание из случайных слов, чтобы тексты проектов не повторяли друг друга"""
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 40))).capitalize() + "."
+
+
+async def measure(app, projects: int, requests: int) -> dict:
+    import compression
+
+    rng = random.Random(1)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        password = "secret1"
+        response = await client.post("/api/auth/register", json={
+            "email": "owner@bench.local", "nickname": "owner", "password": password, "confirm_password": password,
+        })
+        response.raise_for_status()
+        token = response.json()
+        headers = {"Authorization": "Bearer " + token["access_token"]}
+        for index in range(projects):
+            response = await client.post("/api/projects", headers=headers, json={
+                "title": f"Портфолио {index}", "description": description(rng),
+            })
+            response.raise_for_status()
+
+        endpoints = {
+            "profile": ("GET", f"/api/users/by-unique-id/{token['user']['unique_id']}", {}),
+            "projects": ("GET", "/api/projects", {"headers": headers}),
+            "login": ("POST", "/api/auth/login", {"json": {"email": "owner@bench.local", "password": password}}),
+        }
+        results = {}
+        for name, (method, url, kwargs) in endpoints.items():
+            results[name] = {}
+            count = requests if name != "login" else max(requests // 10, 1)  # вход - это в основном хеш пароля
+            for encoding in ENCODINGS:
+                request_headers = {**kwargs.get("headers", {}), "Accept-Encoding": encoding}
+                seconds_before = compression.compression_seconds.value
+                times, sizes = [], []
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = await client.request(method, url, json=kwargs.get("json"), headers=request_headers)
+                    times.append((time.perf_counter() - started) * 1000)
+                    response.raise_for_status()
+                    sizes.append(response.num_bytes_downloaded)
+                results[name][encoding] = {
+                    "bytes": round(statistics.median(sizes)),
+                    "compress_us_per_request": round((compression.compression_seconds.value - seconds_before)
+                                                     / count * 1e6, 1),
+                    "p50_ms": round(statistics.median(times), 3),
+                }
+            identity = results[name]["identity"]["bytes"]
+            for encoding in ENCODINGS[1:]:
+                results[name][encoding]["saved_percent"] = round(
+                    100 * (1 - results[name][encoding]["bytes"] / identity), 1
+                )
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BENCHMARKS_DIR)
+    from harness import load_app
+    app, _ = load_app(APP_DIR, None)
+
+    results = asyncio.run(measure(app, args.projects, args.requests))
+    print(json.dumps({"projects": args.projects, "requests": args.requests, "endpoints": results},
+                     ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк сериализации списков: стандартный путь FastAPI для response_model
+(проверка схемой, словари, json.dumps) против ModelResponse из responses.py.
+
+    python benchmarks/serialization.py --app pythonproject --rows 10000
+    python benchmarks/serialization.py --app siteofsites
+
+Объекты ORM создаются в памяти, БД не нужна. Печатается лучшее время из --repeat
+прогонов для каждого способа.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+APP_DIRS = {
+    "siteofsites": os.path.join(ROOT_DIR, "SiteOfSites", "backend"),
+    "pythonproject": os.path.join(ROOT_DIR, "PythonProject"),
+}
+
+
+def rows_for(app: str, count: int):
+    """Тип ответа списка и объекты ORM для него"""
+    started = datetime(2024, 1, 1, 12, 0, 0, 123456)
+    if app == "siteofsites":
+        from models import Project
+        from schemas import ProjectResponse
+        return List[ProjectResponse], [
+            Project(id=i, title=f"Проект {i}", description="Описание проекта " * 5, owner_id=i % 100,
+                    created_at=started + timedelta(seconds=i))
+            for i in range(count)
+        ]
+
+    from models import Post, User
+    from schemas import PostResponse
+    authors = [User(id=i, name=f"user{i}", age=20 + i % 50, email=f"user{i}@bench.example.com") for i in range(100)]
+    return List[PostResponse], [
+        Post(id=i, content="Текст поста " * 10, author_id=i % 100, author=authors[i % 100],
+             created_at=started + timedelta(seconds=i))
+        for i in range(count)
+    ]
+
+
+def fastapi_default(response_type, rows) -> bytes:
+    """То, что делает APIRoute с response_model и JSONResponse"""
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+
+    field = create_response_field(name="Response", type_=response_type, mode="serialization")
+    content = asyncio.run(serialize_response(field=field, response_content=rows))
+    return JSONResponse(content).body
+
+
+def model_response(response_type, rows) -> bytes:
+    from responses import ModelResponse
+    return ModelResponse(response_type, rows).body
+
+
+def best_of(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=sorted(APP_DIRS), default="pythonproject")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BENCHMARKS_DIR)
+    from harness import load_app
+    load_app(APP_DIRS[args.app], None)
+
+    response_type, rows = rows_for(args.app, args.rows)
+    default_body = fastapi_default(response_type, rows)
+    fast_body = model_response(response_type, rows)
+    if json.loads(default_body) != json.loads(fast_body):
+        sys.exit("Ответы различаются")
+
+    default_time = best_of(lambda: fastapi_default(response_type, rows), args.repeat)
+    fast_time = best_of(lambda: model_response(response_type, rows), args.repeat)
+    print(json.dumps({
+        "app": args.app,
+        "rows": args.rows,
+        "bytes": len(fast_body),
+        "fastapi_default_ms": round(default_time * 1000, 1),
+        "model_response_ms": round(fast_time * 1000, 1),
+        "speedup": round(default_time / fast_time, 2),
+    }, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
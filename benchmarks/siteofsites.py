@@ -0,0 +1,158 @@
+"""
+Сценарии нагрузки для SiteOfSites/backend.
+"""
+
+import asyncio
+import itertools
+import os
+from typing import List
+
+from harness import RUN_ID, Scenario, Target, database_kind, load_app
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SiteOfSites", "backend")
+
+PASSWORD = "benchmark-password"
+NICKNAME_WORDS = ["alex", "maria", "ivan", "olga", "steve", "nina", "pavel", "sofia", "dmitry", "elena"]
+SEED_USERS = 60
+SEED_PROJECTS = 5          # проектов у каждого из первых SEED_PROJECT_OWNERS пользователей
+SEED_PROJECT_OWNERS = 20
+REGISTER_CONCURRENCY = 8   # регистрации упираются в пул Argon2, не переполняем его очередь
+IMPORT_SIZE = 50           # проектов в одном импорте портфолио
+
+_sequence = itertools.count()
+
+
+def _credentials(prefix: str):
+    number = next(_sequence)
+    return f"{prefix}{RUN_ID}{number}@bench.example.com", f"{prefix[0]}{RUN_ID}{number}"
+
+
+async def _register(client, email: str, nickname: str) -> dict:
+    response = await client.post("/api/auth/register", json={
+        "email": email, "nickname": nickname, "password": PASSWORD, "confirm_password": PASSWORD
+    })
+    response.raise_for_status()
+    data = response.json()
+    return {"headers": {"Authorization": f"Bearer {data['access_token']}"}, **data["user"]}
+
+
+async def seed(client, context: dict):
+    """Пользователи и проекты, с которыми работают сценарии чтения"""
+    if "users" in context:
+        return
+    semaphore = asyncio.Semaphore(REGISTER_CONCURRENCY)
+
+    async def register(i: int):
+        async with semaphore:
+            word = NICKNAME_WORDS[i % len(NICKNAME_WORDS)]
+            return await _register(client, f"seed{RUN_ID}{i}@bench.example.com", f"{word}_{RUN_ID}{i}")
+
+    context["users"] = await asyncio.gather(*(register(i) for i in range(SEED_USERS)))
+    for user in context["users"][:SEED_PROJECT_OWNERS]:
+        for n in range(SEED_PROJECTS):
+            response = await client.post("/api/projects", json={
+                "title": f"Проект {n}", "description": "Описание проекта " * 10
+            }, headers=user["headers"])
+            response.raise_for_status()
+
+
+async def auth_storm(client, rec, rng, context):
+    """Регистрация нового пользователя и вход под ним"""
+    email, nickname = _credentials("storm")
+    await rec.call(client, "POST /api/auth/register", "POST", "/api/auth/register", json={
+        "email": email, "nickname": nickname, "password": PASSWORD, "confirm_password": PASSWORD
+    })
+    await rec.call(client, "POST /api/auth/login", "POST", "/api/auth/login", json={
+        "email": email, "password": PASSWORD
+    })
+
+
+async def search_as_you_type(client, rec, rng, context):
+    """Запрос на каждый набранный символ никнейма, как делает SearchBar"""
+    nickname = rng.choice(context["users"])["nickname"]
+    for length in range(2, len(nickname) + 1):
+        await rec.call(client, "GET /api/users/search", "GET", "/api/users/search",
+                       params={"q": nickname[:length]})
+
+
+async def profile_views(client, rec, rng, context):
+    """Просмотр профиля по id и по unique_id, затем повторная проверка браузером (If-None-Match)"""
+    user = rng.choice(context["users"][:SEED_PROJECT_OWNERS * 2])
+    response = await rec.call(client, "GET /api/users/{user_id}", "GET", f"/api/users/{user['id']}")
+    await rec.call(client, "GET /api/users/by-unique-id/{unique_id}", "GET",
+                   f"/api/users/by-unique-id/{user['unique_id']}")
+    etag = response.headers.get("ETag")
+    if etag:
+        await rec.call(client, "GET /api/users/{user_id} (If-None-Match)", "GET", f"/api/users/{user['id']}",
+                       expected=(304,), headers={"If-None-Match": etag})
+    await rec.call(client, "GET /api/users/{user_id}/projects", "GET", f"/api/users/{user['id']}/projects")
+
+
+async def project_crud(client, rec, rng, context):
+    """Создание, список, изменение и удаление проекта"""
+    headers = rng.choice(context["users"])["headers"]
+    response = await rec.call(client, "POST /api/projects", "POST", "/api/projects",
+                              json={"title": "Новый проект", "description": "Описание"}, headers=headers)
+    project_id = response.json()["id"]
+    await rec.call(client, "GET /api/projects", "GET", "/api/projects", headers=headers)
+    await rec.call(client, "PUT /api/projects/{project_id}", "PUT", f"/api/projects/{project_id}",
+                   json={"title": "Измененный проект", "description": "Описание"}, headers=headers)
+    await rec.call(client, "DELETE /api/projects/{project_id}", "DELETE", f"/api/projects/{project_id}",
+                   headers=headers)
+
+
+def _portfolio(rng) -> List[dict]:
+    return [{"title": f"Импорт {n}", "description": "Описание проекта " * rng.randint(1, 10)}
+            for n in range(IMPORT_SIZE)]
+
+
+async def project_import(client, rec, rng, context):
+    """Импорт портфолио по одному проекту и удаление по одному"""
+    headers = rng.choice(context["users"])["headers"]
+    async with rec.timed(f"import {IMPORT_SIZE} via POST /api/projects"):
+        ids = []
+        for project in _portfolio(rng):
+            response = await rec.call(client, "POST /api/projects", "POST", "/api/projects",
+                                      json=project, headers=headers)
+            ids.append(response.json()["id"])
+    async with rec.timed(f"delete {IMPORT_SIZE} via DELETE /api/projects/{{project_id}}"):
+        for project_id in ids:
+            await rec.call(client, "DELETE /api/projects/{project_id}", "DELETE", f"/api/projects/{project_id}",
+                           headers=headers)
+
+
+async def project_import_batch(client, rec, rng, context):
+    """Тот же импорт и удаление через POST /api/projects/batch"""
+    headers = rng.choice(context["users"])["headers"]
+    response = await rec.call(client, f"import {IMPORT_SIZE} via POST /api/projects/batch", "POST",
+                              "/api/projects/batch", headers=headers,
+                              json={"operations": [{"op": "create", **project} for project in _portfolio(rng)]})
+    ids = [result["id"] for result in response.json()["results"]]
+    await rec.call(client, f"delete {IMPORT_SIZE} via POST /api/projects/batch", "POST",
+                   "/api/projects/batch", headers=headers,
+                   json={"operations": [{"op": "delete", "id": project_id} for project_id in ids]})
+
+
+def scenarios(scale: float = 1.0) -> List[Scenario]:
+    def n(value: int) -> int:
+        return max(1, int(value * scale))
+
+    return [
+        Scenario("auth_storm", auth_storm, users=n(16), iterations=n(4)),
+        Scenario("search_as_you_type", search_as_you_type, users=n(20), iterations=n(10), setup=seed),
+        Scenario("profile_views", profile_views, users=n(20), iterations=n(25), setup=seed),
+        Scenario("project_crud", project_crud, users=n(10), iterations=n(10), setup=seed),
+        Scenario("project_import", project_import, users=n(4), iterations=n(3), setup=seed),
+        Scenario("project_import_batch", project_import_batch, users=n(4), iterations=n(3), setup=seed),
+    ]
+
+
+def target(database_url: str = None, url: str = None) -> Target:
+    if url:
+        return Target(url=url, info={"app": "siteofsites", "transport": "http"})
+
+    app, database_url = load_app(APP_DIR, database_url)
+    return Target(
+        app=app,
+        info={"app": "siteofsites", "transport": "asgi", "database": database_kind(database_url)},
+    )
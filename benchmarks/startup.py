@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Время старта продакшен-сервера (gunicorn.conf.py) в зависимости от числа воркеров.
+
+    python benchmarks/startup.py --app siteofsites --workers 1 2 4 8
+    python benchmarks/startup.py --app pythonproject --workers 4 --reload-test
+
+Для каждого числа воркеров на временной SQLite базе (схема создается заранее
+через init_db.py) запускается gunicorn и измеряется:
+- first_response_ms - от запуска мастера до первого ответа 200
+- all_ready_ms - до строки "готов"/"ready" от каждого воркера
+- import_to_ready_ms - время от импорта main.py до готовности, по воркерам (медиана и максимум)
+
+--reload-test: под нагрузкой мастеру отправляется SIGHUP (перезапуск всех
+воркеров), в результате число запросов, повторов после закрытых keep-alive
+соединений и ошибок за время перезапуска.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+APPS = {
+    "siteofsites": (os.path.join(ROOT_DIR, "SiteOfSites", "backend"), "/"),
+    "pythonproject": (os.path.join(ROOT_DIR, "PythonProject"), "/metrics"),
+}
+# "Воркер 123 готов: от импорта 850 мс, прогрев 300 мс" / "Worker 123 ready: 850 ms since import, warm-up 300 ms"
+READY_RE = re.compile(r"(?:Воркер|Worker) (\d+) \D+(\d+) \D+(\d+) (?:мс|ms)")
+START_TIMEOUT = 60
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """gunicorn с нужным числом воркеров, строки журнала читаются в фоне"""
+
+    def __init__(self, app: str, workers: int):
+        self.app_dir, self.probe_path = APPS[app]
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        database = os.path.join(tempfile.mkdtemp(prefix="bench-startup-"), "startup.db")
+        self.env = {**os.environ, "DATABASE_URL": "sqlite:///" + database,
+                    "WEB_CONCURRENCY": str(workers), "BIND": f"127.0.0.1:{self.port}"}
+        self.ready = {}
+        self.lines = []
+
+    def start(self):
+        subprocess.run([sys.executable, "init_db.py"], cwd=self.app_dir, env=self.env, check=True,
+                       stdout=subprocess.DEVNULL)
+        self.started = time.perf_counter()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+            cwd=self.app_dir, env=self.env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+        )
+        threading.Thread(target=self._read_log, daemon=True).start()
+
+    def _read_log(self):
+        for line in self.process.stdout:
+            self.lines.append(line)
+            match = READY_RE.search(line)
+            if match:
+                pid, import_ms, warm_up_ms = map(int, match.groups())
+                self.ready[pid] = (time.perf_counter(), import_ms, warm_up_ms)
+
+    def wait_first_response(self) -> float:
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(self.url + self.probe_path, timeout=1).status_code == 200:
+                    return time.perf_counter() - self.started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("сервер не ответил:\n" + "".join(self.lines[-20:]))
+
+    def wait_ready(self, count: int, since: float = 0.0) -> list:
+        """Ждет count строк готовности, записанных после момента since"""
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            ready = [item for item in self.ready.values() if item[0] >= since]
+            if len(ready) >= count:
+                return ready
+            time.sleep(0.01)
+        raise RuntimeError("воркеры не стартовали:\n" + "".join(self.lines[-20:]))
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        self.process.wait(timeout=START_TIMEOUT)
+
+
+async def load_during_reload(server: Server, workers: int, clients: int = 20) -> dict:
+    """
+    Непрерывные запросы, в середине - SIGHUP мастеру.
+    Старый воркер при остановке закрывает простаивающие keep-alive соединения, и
+    запрос, отправленный в этот момент, получает разрыв без ответа (FIN или RST). Браузеры такие
+    GET повторяют на новом соединении, здесь тоже: повтор считается в retried,
+    ошибкой считается только неудачный повтор
+    """
+    counts = {"requests": 0, "retried": 0, "errors": 0}
+    stop = asyncio.Event()
+
+    async def client():
+        async with httpx.AsyncClient(base_url=server.url, timeout=30) as http:
+            while not stop.is_set():
+                try:
+                    try:
+                        response = await http.get(server.probe_path)
+                    except (httpx.RemoteProtocolError, httpx.ReadError):
+                        counts["retried"] += 1
+                        response = await http.get(server.probe_path)
+                    counts["requests"] += 1
+                    counts["errors"] += response.status_code != 200
+                except httpx.TransportError:
+                    counts["errors"] += 1
+
+    tasks = [asyncio.create_task(client()) for _ in range(clients)]
+    await asyncio.sleep(1)
+    reload_started = time.perf_counter()
+    server.process.send_signal(signal.SIGHUP)
+    await asyncio.to_thread(server.wait_ready, workers, reload_started)
+    counts["reload_ms"] = round((time.perf_counter() - reload_started) * 1000)
+    await asyncio.sleep(1)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return counts
+
+
+def measure(app: str, workers: int, reload_test: bool) -> dict:
+    server = Server(app, workers)
+    server.start()
+    try:
+        first_response = server.wait_first_response()
+        ready = server.wait_ready(workers)
+        import_ms = [item[1] for item in ready]
+        result = {
+            "workers": workers,
+            "first_response_ms": round(first_response * 1000),
+            "all_ready_ms": round((max(item[0] for item in ready) - server.started) * 1000),
+            "import_to_ready_ms": {"median": statistics.median(import_ms), "max": max(import_ms)},
+            "warm_up_ms": {"median": statistics.median(item[2] for item in ready)},
+        }
+        if reload_test:
+            result["reload"] = asyncio.run(load_during_reload(server, workers))
+        return result
+    finally:
+        server.stop()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=sorted(APPS), default="siteofsites")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--reload-test", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = []
+    for workers in args.workers:
+        results.append(measure(args.app, workers, args.reload_test))
+        print(f"  {workers} воркеров: {results[-1]}", file=sys.stderr)
+    print(json.dumps({"app": args.app, "cpu_count": os.cpu_count(), "runs": results}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Время поиска пользователей SiteOfSites (search.py) по мере роста таблицы users.
+
+    python benchmarks/user_search.py --users 10000 100000 1000000
+    python benchmarks/user_search.py --database-url postgresql://... --users 10000 100000 1000000
+
+Таблица заполняется синтетическими пользователями до каждого размера из --users
+по очереди (никнейм - 2-3 слога и номер, unique_id - как при регистрации). На
+SQLite поиск идет через индекс n-грамм в памяти процесса, который строится
+заново для каждого размера; на PostgreSQL - через pg_trgm и B-tree индексы
+выражений (после заполнения выполняется ANALYZE). Для SQLite отдельно
+измеряется запрос к БД, которым поиск обслуживается, пока индекс строится
+(sql_while_building, --sql-queries запросов каждой группы).
+
+Запросы по группам:
+- two_chars - 2 символа из никнеймов (минимальная длина запроса, полных триграмм нет)
+- two_chars_rare - случайные пары букв, многие не встречаются ни в одном никнейме
+- prefix - первые 3-6 символов никнейма (поиск по мере ввода)
+- substring - 3-4 символа из середины никнейма
+- unique_id - точный unique_id
+- miss - 5 случайных букв, совпадений нет
+
+Кэш результатов (SearchCache) не участвует: каждый запрос - search_users в
+отдельной сессии, как при промахе кэша. Печатаются p50/p95/p99 в миллисекундах
+по каждому размеру и время построения индекса.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+APP_DIR = os.path.join(ROOT_DIR, "SiteOfSites", "backend")
+BATCH_SIZE = 20000
+SYLLABLES = [c + v for c in "bcdfghklmnprstvz" for v in "aeiou"]
+
+
+def nickname(index: int, rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) + str(index)
+
+
+def fill(start: int, stop: int, seed: int) -> list:
+    """Пользователи с номерами [start, stop) через синхронный движок, порциями по BATCH_SIZE"""
+    from sqlalchemy import insert
+    from database import engine
+    from models import User
+    from unique_ids import encode_unique_id
+
+    rng = random.Random(seed + start)
+    nicknames = []
+    started = time.perf_counter()
+    for offset in range(start, stop, BATCH_SIZE):
+        rows = []
+        for index in range(offset, min(offset + BATCH_SIZE, stop)):
+            rows.append({"nickname": nickname(index, rng), "unique_id": encode_unique_id(index),
+                         "email": f"user{index}@bench.local", "password_hash": "-"})
+        with engine.begin() as conn:
+            conn.execute(insert(User), rows)
+        nicknames += [row["nickname"] for row in rows]
+        print(f"  {offset + len(rows)} пользователей, {time.perf_counter() - started:.0f} с", file=sys.stderr)
+    return nicknames
+
+
+def query_groups(nicknames: list, users: int, queries: int, rng: random.Random) -> dict:
+    from unique_ids import encode_unique_id
+
+    def part(low: int, high: int, from_start: bool = False) -> str:
+        text = rng.choice(nicknames)
+        length = min(rng.randint(low, high), len(text))
+        start = 0 if from_start else rng.randint(0, len(text) - length)
+        return text[start:start + length]
+
+    return {
+        "two_chars": [part(2, 2) for _ in range(queries)],
+        "two_chars_rare": ["".join(rng.choices(string.ascii_lowercase, k=2)) for _ in range(queries)],
+        "prefix": [part(3, 6, from_start=True) for _ in range(queries)],
+        "substring": [part(3, 4) for _ in range(queries)],
+        "unique_id": [encode_unique_id(rng.randrange(users)) for _ in range(queries)],
+        "miss": ["".join(rng.choices("qwxyj", k=5)) for _ in range(queries)],
+    }
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def measure(groups: dict, sql_queries: int) -> dict:
+    from sqlalchemy import text
+    from database import AsyncSessionLocal
+    import search
+
+    async with AsyncSessionLocal() as db:
+        dialect = db.bind.dialect.name
+        started = time.perf_counter()
+        if search.uses_trigram_index(db):
+            await db.execute(text("ANALYZE users"))
+            await db.commit()
+    if dialect != "postgresql":
+        await search.user_index.load(AsyncSessionLocal)  # индекс n-грамм строится в потоке
+    build_seconds = time.perf_counter() - started
+
+    async def timed(q: str) -> float:
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await search.search_users(db, q)
+            return (time.perf_counter() - started) * 1000
+
+    async def timed_sql(q: str) -> float:
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            await db.execute(search.search_statement(dialect, q, search.SEARCH_LIMIT))
+            return (time.perf_counter() - started) * 1000
+
+    def summary(times: list) -> dict:
+        return {
+            "p50_ms": round(statistics.median(times), 2),
+            "p95_ms": round(percentile(times, 0.95), 2),
+            "p99_ms": round(percentile(times, 0.99), 2),
+        }
+
+    results = {"index_build_s": round(build_seconds, 1)}
+    for name, queries in groups.items():
+        for q in queries[:5]:  # прогрев кэша страниц БД
+            await timed(q)
+        results[name] = summary([await timed(q) for q in queries])
+    if dialect != "postgresql" and sql_queries:
+        # Пока индекс строится, поиск идет запросом к БД
+        results["sql_while_building"] = {
+            name: summary([await timed_sql(q) for q in queries[:sql_queries]])
+            for name, queries in groups.items()
+        }
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="пустая база; по умолчанию временная SQLite")
+    parser.add_argument("--users", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--sql-queries", type=int, default=20,
+                        help="запросов каждой группы через SQL, пока индекс n-грамм строится")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BENCHMARKS_DIR)
+    from harness import database_kind, load_app
+    _, database_url = load_app(APP_DIR, args.database_url)
+
+    async def run() -> dict:
+        rng = random.Random(args.seed)
+        nicknames, sizes = [], {}
+        for users in sorted(args.users):
+            nicknames += fill(len(nicknames), users, args.seed)
+            sizes[users] = await measure(query_groups(nicknames, users, args.queries, rng), args.sql_queries)
+        return sizes
+
+    sizes = asyncio.run(run())
+    print(json.dumps({"database": database_kind(database_url), "users": sizes}, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())